@@ -0,0 +1,155 @@
+import threading
+
+import numpy as np
+
+from face_engine import top_k_cosine
+
+
+def _pad_results(user_ids, scores, k):
+    """Pad per-query results to a fixed (Q, k) shape with -1 / -inf"""
+    out_ids = np.full((len(user_ids), k), -1, dtype=np.int64)
+    out_scores = np.full((len(scores), k), -np.inf, dtype=np.float32)
+    for i, (ids, sc) in enumerate(zip(user_ids, scores)):
+        out_ids[i, :len(ids)] = ids
+        out_scores[i, :len(sc)] = sc
+    return out_ids, out_scores
+
+
+def spherical_kmeans(data, clusters, iterations=10, seed=0):
+    """Cosine k-means on unit vectors; returns unit-length centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(data @ centroids.T, axis=1)
+        # Sum members per cluster with one sort + reduceat instead of np.add.at
+        order = np.argsort(assignment, kind='stable')
+        present, starts = np.unique(assignment[order], return_index=True)
+        sums = np.zeros_like(centroids)
+        sums[present] = np.add.reduceat(data[order], starts, axis=0)
+        empty = ~sums.any(axis=1)
+        # Re-seed empty clusters with random points so every list stays usable
+        sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+        centroids = sums / (np.linalg.norm(sums, axis=1, keepdims=True) + 1e-12)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """Inverted-file ANN index over an EmbeddingStore.
+
+    Rows are clustered into ``nlist`` coarse cells; a query scores only the
+    rows in its ``nprobe`` nearest cells. Raising ``nprobe`` trades speed for
+    recall. Galleries smaller than ``min_rows`` are scanned exactly.
+    """
+
+    def __init__(self, store, nlist=0, nprobe=8, min_rows=20000, retrain_growth=2.0,
+                 train_sample=64):
+        self.store = store
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_rows = min_rows
+        self.retrain_growth = retrain_growth
+        self.train_sample = train_sample
+        self.centroids = None
+        self._lists = []
+        self._indexed_rows = 0
+        self._trained_rows = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self._subset_cache = {}
+
+    def sync(self):
+        """Bring the index up to date with the store.
+
+        New rows are assigned to their nearest existing cell; tombstones are
+        filtered at query time. The cells are only retrained once the
+        gallery has grown by ``retrain_growth`` since the last training.
+        """
+        self.store.refresh()
+        with self._lock:
+            if self.store.version == self._version:
+                return
+            rows = self.store.rows
+            if rows < self._indexed_rows:
+                # The store was compacted; row numbers changed underneath us
+                self.centroids = None
+            if self.store.rows < self.min_rows:
+                self.centroids = None
+            elif self.centroids is None or rows >= self._trained_rows * self.retrain_growth:
+                self._train()
+            else:
+                self._assign(self._indexed_rows, rows)
+            self._version = self.store.version
+            self._subset_cache.clear()
+
+    def _train(self):
+        rows = self.store.rows
+        live = np.flatnonzero(self.store.valid)
+        nlist = self.nlist or max(1, int(np.sqrt(len(live))))
+        nlist = min(nlist, len(live))
+        rng = np.random.default_rng(0)
+        sample = live if len(live) <= nlist * self.train_sample else \
+            rng.choice(live, nlist * self.train_sample, replace=False)
+        self.centroids = spherical_kmeans(np.asarray(self.store.matrix[sample]), nlist)
+        self._lists = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self._indexed_rows = 0
+        self._assign(0, rows)
+        self._trained_rows = rows
+
+    def _assign(self, start, end, chunk=8192):
+        for lo in range(start, end, chunk):
+            hi = min(lo + chunk, end)
+            cells = np.argmax(self.store.matrix[lo:hi] @ self.centroids.T, axis=1)
+            order = np.argsort(cells, kind='stable')
+            bounds = np.searchsorted(cells[order], np.arange(len(self._lists) + 1))
+            for cell in np.unique(cells):
+                new_rows = lo + order[bounds[cell]:bounds[cell + 1]]
+                self._lists[cell] = np.concatenate([self._lists[cell], new_rows])
+        self._indexed_rows = end
+
+    def match(self, embeddings, k=1):
+        """Return (user_ids, scores) shaped (Q, k), like EmbeddingStore.match"""
+        self.sync()
+        if self.centroids is None:
+            return self.store.match(embeddings, k)
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        matrix, user_ids, valid = self.store.matrix, self.store.user_ids, self.store.valid
+        nprobe = min(self.nprobe, len(self._lists))
+        coarse = embeddings @ self.centroids.T
+        probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+
+        found_ids, found_scores = [], []
+        for query, cells in zip(embeddings, probes):
+            rows = np.concatenate([self._lists[cell] for cell in cells])
+            rows = rows[valid[rows]]
+            indices, scores = top_k_cosine(query[None], matrix[rows], k)
+            found_ids.append(user_ids[rows[indices[0]]])
+            found_scores.append(scores[0])
+        return _pad_results(found_ids, found_scores, k)
+
+    def for_candidates(self, candidate_ids):
+        """Exact matcher restricted to a small candidate set (e.g. a course roster)"""
+        return _SubsetMatcher(self, tuple(sorted(candidate_ids)))
+
+    def _candidate_rows(self, candidates):
+        self.sync()
+        rows = self._subset_cache.get(candidates)
+        if rows is None:
+            mask = np.isin(self.store.user_ids, candidates) & self.store.valid
+            rows = np.flatnonzero(mask)
+            if len(self._subset_cache) > 256:
+                self._subset_cache.clear()
+            self._subset_cache[candidates] = rows
+        return rows
+
+
+class _SubsetMatcher:
+    def __init__(self, index, candidates):
+        self.index = index
+        self.candidates = candidates
+
+    def match(self, embeddings, k=1):
+        rows = self.index._candidate_rows(self.candidates)
+        store = self.index.store
+        indices, scores = top_k_cosine(embeddings, store.matrix[rows], k)
+        return _pad_results(store.user_ids[rows[indices]], scores, k)
@@ -0,0 +1,179 @@
+import atexit
+import contextlib
+import logging
+import os
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+UPSERT_ATTENDANCE_SQL = '''
+    INSERT INTO attendance (student_id, course_id, date, status, timestamp, recognized_confidence, method)
+    VALUES (?, ?, ?, 'present', ?, ?, ?)
+    ON CONFLICT(student_id, course_id, date) DO UPDATE SET
+        status = 'present',
+        timestamp = excluded.timestamp,
+        recognized_confidence = excluded.recognized_confidence,
+        method = excluded.method
+'''
+
+
+class AttendanceRecorder:
+    """Buffers check-ins and writes them in one UPSERT transaction.
+
+    Repeated check-ins for the same (student, course, date) collapse in the
+    buffer, keeping the latest. A background thread flushes every
+    ``flush_interval`` seconds, or as soon as ``max_batch`` distinct rows
+    are waiting; the first ``record()`` in a process starts it, so every
+    server (``flask run``, forked workers) writes without extra setup, and
+    it is flushed at exit. ``flush()`` writes synchronously and is what
+    shutdown and tests call; after ``stop()``, records are written at once.
+    ``write_hook(conn, keys)`` runs inside the flush transaction and
+    ``on_flush(keys)`` after it commits; both receive the set of
+    (course_id, date) pairs that were just written. ``timer``, if given,
+    is called as timer('db_write') to time each flush transaction.
+    """
+
+    def __init__(self, connect, flush_interval=0.5, max_batch=256, write_hook=None, on_flush=None,
+                 timer=None):
+        self.connect = connect
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.write_hook = write_hook
+        self.on_flush = on_flush
+        self.timer = timer or (lambda stage: contextlib.nullcontext())
+        self._buffer = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._exit_flush = False
+
+    def start(self):
+        """Start this process's flush thread; a no-op while it is running"""
+        with self._lock:
+            # Threads do not survive fork; each worker starts its own
+            if self._pid == os.getpid():
+                return
+            if not self._exit_flush:
+                atexit.register(self.stop)
+                self._exit_flush = True
+            self._stopped.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread and write whatever is still buffered"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join()
+        self._thread = None
+        self._pid = None
+        self.flush()
+
+    def pending(self):
+        return len(self._buffer)
+
+    def record(self, student_id, course_id, confidence=None, method='auto', when=None):
+        when = when or datetime.now()
+        key = (int(student_id), int(course_id), when.strftime('%Y-%m-%d'))
+        with self._lock:
+            self._buffer[key] = (when.strftime('%H:%M:%S'), confidence, method)
+            full = len(self._buffer) >= self.max_batch
+        if self._stopped.is_set():
+            self.flush()
+            return
+        if self._pid != os.getpid():
+            self.start()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write every buffered check-in in a single transaction"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, {}
+            if not batch:
+                return 0
+
+            rows = [(student_id, course_id, date, timestamp, confidence, method)
+                    for (student_id, course_id, date), (timestamp, confidence, method) in batch.items()]
+            keys = {(course_id, date) for _, course_id, date in batch}
+            conn = self.connect()
+            try:
+                with self.timer('db_write'), conn:
+                    conn.executemany(UPSERT_ATTENDANCE_SQL, rows)
+                    if self.write_hook is not None:
+                        self.write_hook(conn, keys)
+            except Exception:
+                # Put the rows back (newer check-ins win) so the next flush retries them
+                with self._lock:
+                    for key, value in batch.items():
+                        self._buffer.setdefault(key, value)
+                raise
+            finally:
+                conn.close()
+
+        if self.on_flush is not None:
+            self.on_flush(keys)
+        return len(rows)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Attendance flush failed; %d check-ins stay buffered', self.pending())
+
+
+class SessionPresence:
+    """Students already marked present per course for the current day.
+
+    ``load(course_id, date)`` returns the ids already present in the
+    database and is called once per course and day. ``claim`` then hands
+    back only the students not seen before, so repeat sightings of a
+    settled room never reach the recorder.
+    """
+
+    def __init__(self, load):
+        self.load = load
+        self._date = None
+        self._present = {}
+        self._lock = threading.Lock()
+        self.skipped = 0
+
+    def _course(self, course_id, date):
+        with self._lock:
+            if date != self._date:
+                self._date = date
+                self._present = {}
+            present = self._present.get(course_id)
+        if present is None:
+            loaded = set(self.load(course_id, date))
+            with self._lock:
+                if date == self._date:
+                    present = self._present.setdefault(course_id, loaded)
+                else:
+                    present = loaded
+        return present
+
+    def claim(self, course_id, student_ids, when=None):
+        """Return the student_ids that are new check-ins and remember them"""
+        date = (when or datetime.now()).strftime('%Y-%m-%d')
+        course_id = int(course_id)
+        present = self._course(course_id, date)
+        new = []
+        with self._lock:
+            for student_id in student_ids:
+                if student_id in present:
+                    self.skipped += 1
+                else:
+                    present.add(student_id)
+                    new.append(student_id)
+        return new
@@ -0,0 +1,129 @@
+"""Cold-start time of importing and bootstrapping the app against a large database.
+
+Builds (or reuses) a synthetic attendance database, then imports the app
+and runs ``bootstrap()`` (migrations plus face model and gallery warmup)
+in fresh interpreters and reports how long that took. The first
+run applies any pending migrations; later runs should find the schema
+current and leave the data alone, which is checked by comparing row
+counts before and after.
+
+    python benchmarks/cold_start.py --students 20000 --days 180
+    python benchmarks/cold_start.py --db /path/to/attendance.db --max-ms 2000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from migrations import migrate  # noqa: E402
+
+IMPORT_SNIPPET = '''
+import time
+started = time.perf_counter()
+from main import bootstrap
+bootstrap()
+print(time.perf_counter() - started)
+'''
+
+
+def build_database(path, students, courses, days, instructors=1, seed=7):
+    """Fill a fresh database with students, enrollments and daily attendance.
+
+    Instructors are users 1..instructors and teach the courses round-robin;
+    students follow them.
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    migrate(conn)
+    with conn:
+        conn.executemany('''
+            INSERT INTO users (username, password, role, name) VALUES (?, 'password', 'instructor', ?)
+        ''', ((f'professor{i}', f'Instructor {i}') for i in range(1, instructors + 1)))
+        conn.executemany('''
+            INSERT INTO users (username, password, role, name, student_id) VALUES (?, 'password', 'student', ?, ?)
+        ''', ((f's{i}', f'Student {i}', f'S{i:06d}') for i in range(students)))
+        conn.executemany('INSERT INTO courses (code, name, instructor_id) VALUES (?, ?, ?)',
+                         ((f'C{c:04d}', f'Course {c}', 1 + c % instructors) for c in range(courses)))
+        # Every student takes three courses
+        first_student = instructors + 1
+        enrollments = sorted({(first_student + s, 1 + rng.randrange(courses))
+                              for s in range(students) for _ in range(3)})
+        conn.executemany('INSERT INTO enrollments (student_id, course_id) VALUES (?, ?)', enrollments)
+    first = date.today() - timedelta(days=days)
+    for day in range(days):
+        current = (first + timedelta(days=day)).isoformat()
+        with conn:
+            conn.executemany('''
+                INSERT INTO attendance (student_id, course_id, date, status, timestamp, method)
+                VALUES (?, ?, ?, 'present', '09:00:00', 'auto')
+            ''', ((student, course, current) for student, course in enrollments if rng.random() < 0.85))
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+
+
+def row_counts(path):
+    conn = sqlite3.connect(path)
+    counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+              for table in ('users', 'enrollments', 'attendance')}
+    conn.close()
+    return counts
+
+
+def time_import(path, index_path):
+    env = dict(os.environ, ATTENDANCE_DB=path, FACE_INDEX_PATH=index_path)
+    result = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='Existing database to start against (default: build a synthetic one)')
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--courses', type=int, default=50)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, help='Exit non-zero if the median warm start is slower')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cold_start_')
+    path = args.db
+    if path is None:
+        path = os.path.join(workdir, 'attendance.db')
+        started = time.perf_counter()
+        build_database(path, args.students, args.courses, args.days)
+        print(f"Built {os.path.getsize(path) / 1e6:.1f} MB database in {time.perf_counter() - started:.1f}s")
+    before = row_counts(path)
+    print(f"Rows: {before}")
+
+    index_path = os.path.join(workdir, 'face_index')
+    times = [time_import(path, index_path) for _ in range(args.runs + 1)]
+    first, warm = times[0], times[1:]
+    median = statistics.median(warm) * 1000
+    print(f"First start (applies pending migrations): {first * 1000:.0f} ms")
+    print(f"Warm starts: median {median:.0f} ms, min {min(warm) * 1000:.0f} ms, "
+          f"max {max(warm) * 1000:.0f} ms over {len(warm)} runs")
+
+    after = row_counts(path)
+    if after != before:
+        print(f"❌ Startup changed the data: {before} -> {after}")
+        sys.exit(1)
+    print("✅ Data untouched by startup")
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"❌ Median start {median:.0f} ms exceeds {args.max_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""Start-of-class load test for the SQLite layer.
+
+Seeds a temporary database with students, courses and semesters of
+attendance history, imports the app against it and then fires a burst of
+``mark_attendance`` check-ins from ``--writers`` threads while
+``--readers`` threads keep loading instructor views through the Flask
+test client:
+
+* dashboard: /instructor/dashboard
+* course_stats: /api/course-stats/<id> (get_course_stats)
+* attendance_stats: /api/attendance-stats/<id>/<today>
+
+Reports throughput and p50/p95/p99 latency per operation plus errors,
+counting "database is locked" separately. The seed and the schedule are
+fixed by ``--seed``, so runs before and after a schema, index or pooling
+change are comparable; ``--output`` writes JSON and ``--compare`` prints
+the difference against an earlier file.
+
+    python benchmarks/db_load.py --students 20000 --semesters 4 --checkins 2000 --output before.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from cold_start import build_database
+from recognition import environment, percentiles
+
+OPERATIONS = ('checkin', 'dashboard', 'course_stats', 'attendance_stats')
+# Two meetings a week over a 15-week term
+CLASS_DAYS_PER_SEMESTER = 30
+
+
+class Results:
+    def __init__(self):
+        self.latencies = {operation: [] for operation in OPERATIONS}
+        self.errors = {operation: 0 for operation in OPERATIONS}
+        self.lock_errors = 0
+        self._lock = threading.Lock()
+
+    def timed(self, operation, function):
+        started = time.perf_counter()
+        try:
+            ok = function()
+        except sqlite3.OperationalError as e:
+            with self._lock:
+                self.errors[operation] += 1
+                if 'locked' in str(e) or 'busy' in str(e):
+                    self.lock_errors += 1
+            return
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            if ok is False:
+                self.errors[operation] += 1
+            else:
+                self.latencies[operation].append(elapsed)
+
+
+def alias_instructor_templates(app):
+    """Serve templates/Instructor as instructor/ on case-sensitive filesystems"""
+    from jinja2 import ChoiceLoader, FileSystemLoader, PrefixLoader, TemplateNotFound
+    try:
+        app.jinja_env.get_template('instructor/dashboard.html')
+    except TemplateNotFound:
+        folder = os.path.join(app.root_path, app.template_folder, 'Instructor')
+        app.jinja_loader = ChoiceLoader([app.jinja_loader, PrefixLoader({'instructor': FileSystemLoader(folder)})])
+        app.jinja_env.loader = app.jinja_loader
+        print("Note: templates/Instructor aliased as instructor/ for this run")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--courses', type=int, default=60)
+    parser.add_argument('--instructors', type=int, default=20)
+    parser.add_argument('--semesters', type=int, default=2)
+    parser.add_argument('--checkins', type=int, default=1000, help='Check-ins in the burst')
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Earlier JSON results to compare against')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='db_load_')
+    path = os.path.join(workdir, 'attendance.db')
+    started = time.perf_counter()
+    build_database(path, args.students, args.courses, args.semesters * CLASS_DAYS_PER_SEMESTER,
+                   instructors=args.instructors, seed=args.seed)
+    print(f"Seeded {os.path.getsize(path) / 1e6:.1f} MB database in {time.perf_counter() - started:.1f}s")
+
+    conn = sqlite3.connect(path)
+    enrollments = conn.execute('SELECT student_id, course_id FROM enrollments ORDER BY id').fetchall()
+    courses = {}
+    for course_id, instructor_id in conn.execute('SELECT id, instructor_id FROM courses ORDER BY id'):
+        courses.setdefault(instructor_id, []).append(course_id)
+    conn.close()
+
+    # The app reads its configuration at import
+    os.environ.update(ATTENDANCE_DB=path, FACE_INDEX_PATH=os.path.join(workdir, 'face_index'))
+    import main as attendance_app
+    attendance_app.bootstrap()
+    attendance_app.start_background_work()
+    app = attendance_app.app
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+    alias_instructor_templates(app)
+
+    rng = random.Random(args.seed)
+    burst = [rng.choice(enrollments) for _ in range(args.checkins)]
+    schedules = [burst[i::args.writers] for i in range(args.writers)]
+    instructors = sorted(courses)
+    today = datetime.now().strftime('%Y-%m-%d')
+    results = Results()
+    writing = threading.Event()
+    writing.set()
+
+    def writer(schedule):
+        for student_id, course_id in schedule:
+            results.timed('checkin', lambda: attendance_app.mark_attendance(student_id, course_id, 95.0))
+
+    def reader(index):
+        reader_rng = random.Random(args.seed + 1 + index)
+        instructor_id = instructors[index % len(instructors)]
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['role'] = 'instructor'
+            session['user_id'] = instructor_id
+            session['name'] = f'Instructor {instructor_id}'
+        while writing.is_set():
+            course_id = reader_rng.choice(courses[instructor_id])
+            operation, url = reader_rng.choice([
+                ('dashboard', '/instructor/dashboard'),
+                ('course_stats', f'/api/course-stats/{course_id}'),
+                ('attendance_stats', f'/api/attendance-stats/{course_id}/{today}'),
+            ])
+            results.timed(operation, lambda: client.get(url).status_code == 200)
+
+    readers = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    writers = [threading.Thread(target=writer, args=(schedule,)) for schedule in schedules]
+    started = time.perf_counter()
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    writing.clear()
+    for thread in readers:
+        thread.join()
+
+    report = {
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'environment': environment(),
+        'seconds': round(elapsed, 3),
+        'lock_errors': results.lock_errors,
+        'operations': {
+            operation: {
+                'ops_per_second': round(len(results.latencies[operation]) / elapsed, 1),
+                'errors': results.errors[operation],
+                **(percentiles(results.latencies[operation]) if results.latencies[operation] else {'count': 0}),
+            } for operation in OPERATIONS
+        },
+    }
+
+    print(f"{args.checkins} check-ins from {args.writers} writers with {args.readers} readers "
+          f"in {elapsed:.2f}s, {results.lock_errors} lock errors")
+    for operation, stats in report['operations'].items():
+        if not stats['count']:
+            print(f"  {operation:<17} no successful calls, {stats['errors']} errors")
+            continue
+        print(f"  {operation:<17} {stats['ops_per_second']:>8.1f}/s  p50 {stats['p50_ms']:>8.2f} ms  "
+              f"p95 {stats['p95_ms']:>8.2f} ms  p99 {stats['p99_ms']:>8.2f} ms  {stats['errors']} errors")
+
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+        print(f"\nAgainst {baseline['environment'].get('commit') or 'baseline'}:")
+        for operation, stats in report['operations'].items():
+            old = baseline['operations'].get(operation, {})
+            if stats['count'] and old.get('count'):
+                print(f"  {operation:<17} {old['ops_per_second']:>8.1f} -> {stats['ops_per_second']:>8.1f}/s  "
+                      f"p99 {old['p99_ms']:>8.2f} -> {stats['p99_ms']:>8.2f} ms")
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2)
+        print(f"\n✅ Wrote {args.output}")
+
+    attendance_app.stop_background_work()
+    sys.exit(1 if results.lock_errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,445 @@
+"""Recognition benchmark on synthetic classroom frames.
+
+Draws classroom frames (rows of cartoon faces the Haar cascade finds,
+smaller towards the back) at a chosen resolution, enrolls every drawn
+student except ``--strangers`` visitors in a temporary gallery padded
+with random embeddings up to ``--gallery``, fills the background gallery
+with ``--background`` other drawn faces, then times each stage of the
+pipeline:
+
+* decode: JPEG bytes to a BGR frame
+* detect: grayscale conversion and face detection
+* embed: crop, LBP descriptors and eye check
+* match: roster (or ANN index) search and the threshold/margin check
+* record: buffered attendance UPSERT, flushed to a temporary database
+
+Frames are run one at a time (``single``) and ``--batch`` at a time
+(``batched``, one stacked embed and match per batch); stage latencies
+are per call, so per batch in batched mode. Every drawn face's identity
+is known, so each mode also reports the identification rate (detected
+enrolled faces accepted as the right student) and the false-accept rate
+(detected faces accepted as someone else, strangers included). The
+``small_course`` mode repeats the accuracy run for a course with only
+``--small-enrolled`` students and ``--small-strangers`` visitors in the
+room, where the roster offers almost no rival to a stranger. The run
+fails when the single or small_course mode misses ``--min-identification``
+or ``--max-false-accept``. ``--api`` also posts the frames to
+/api/recognize-face through the Flask test client.
+Results are printed and, with ``--output``, written as JSON; pass an
+earlier file to ``--compare`` to see the change per stage.
+
+    python benchmarks/recognition.py --faces 30 --width 1280 --height 720 --output before.json
+    python benchmarks/recognition.py --faces 30 --width 1280 --height 720 --compare before.json
+"""
+
+import argparse
+import base64
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ann_index import IVFIndex  # noqa: E402
+from attendance_recorder import AttendanceRecorder  # noqa: E402
+from daily_stats import refresh_daily_stats  # noqa: E402
+from db import ConnectionPool  # noqa: E402
+from embedding_store import EmbeddingStore  # noqa: E402
+from face_engine import EMBEDDING_DIM, FaceEngine, compute_embeddings, decode_image  # noqa: E402
+from migrations import migrate  # noqa: E402
+
+STAGES = ('decode', 'detect', 'embed', 'match', 'record')
+COURSE_ID = 1
+# User 1 is the instructor; students are users 2.. as in the demo data
+FIRST_STUDENT = 2
+
+
+def draw_face(rng, size):
+    """A grayscale cartoon face the frontal Haar cascade detects.
+
+    Face shape, eyes, brows, nose, mouth and a few moles vary per
+    student, so identities differ by more than detection jitter.
+    """
+    face = np.full((size, size), rng.integers(60, 110), np.uint8)
+    c = size // 2
+    skin = int(rng.integers(150, 210))
+    outline = (int(size * rng.uniform(.33, .39)), int(size * rng.uniform(.43, .48)))
+    cv2.ellipse(face, (c, c), outline, 0, 0, 360, skin, -1)
+    eye_y, eye_x = int(size * rng.uniform(.38, .42)), int(size * rng.uniform(.15, .19))
+    eye = (int(size * rng.uniform(.07, .1)), int(size * rng.uniform(.035, .05)))
+    brow = max(1, int(size * rng.uniform(.02, .045)))
+    for side in (-1, 1):
+        cv2.ellipse(face, (c + side * eye_x, eye_y), eye, 0, 0, 360, int(rng.integers(25, 60)), -1)
+        cv2.line(face, (c + side * eye_x - int(size * .1), eye_y - int(size * .09)),
+                 (c + side * eye_x + int(size * .1), eye_y - int(size * .1)), 50, brow)
+    cv2.line(face, (c, int(size * .45)), (c, int(size * rng.uniform(.55, .63))), skin - 50, max(1, size // 40))
+    cv2.ellipse(face, (c, int(size * rng.uniform(.7, .76))),
+                (int(size * rng.uniform(.1, .18)), int(size * rng.uniform(.03, .05))),
+                0, 0, 360, int(rng.integers(50, 90)), -1)
+    for _ in range(rng.integers(3, 7)):
+        mole = (c + int(size * rng.uniform(-.28, .28)), int(size * rng.uniform(.5, .85)))
+        cv2.circle(face, mole, max(1, int(size * rng.uniform(.015, .045))), skin - int(rng.integers(50, 100)), -1)
+    return cv2.GaussianBlur(face, (0, 0), size / 60)
+
+
+def classroom(rng, width, height, faces):
+    """Seat positions and face sizes for a class, back rows smaller"""
+    columns = max(1, int(np.ceil(np.sqrt(faces * width / height))))
+    rows = int(np.ceil(faces / columns))
+    row_height = height / rows
+    seats = []
+    for i in range(faces):
+        row, column = divmod(i, columns)
+        # Perspective: back rows (top of frame) are up to half the size
+        size = int(min(row_height, width / columns) * (0.55 + 0.3 * (row + 1) / rows))
+        size = max(48, size)
+        x = int((column + 0.5) * width / columns - size / 2)
+        y = int((row + 0.5) * row_height - size / 2)
+        seats.append((max(0, min(x, width - size)), max(0, min(y, height - size)), size))
+    return seats
+
+
+def render_frame(rng, width, height, seats, templates, jitter=3):
+    """Paste every student's face into a noisy room, slightly moved"""
+    gradient = np.linspace(70, 130, height, dtype=np.float32)[:, None]
+    room = np.clip(gradient + rng.normal(0, 6, (height, width)), 0, 255).astype(np.uint8)
+    for (x, y, size), template in zip(seats, templates):
+        face = cv2.resize(template, (size, size), interpolation=cv2.INTER_AREA)
+        x = int(np.clip(x + rng.integers(-jitter, jitter + 1), 0, width - size))
+        y = int(np.clip(y + rng.integers(-jitter, jitter + 1), 0, height - size))
+        room[y:y + size, x:x + size] = face
+    frame = cv2.cvtColor(room, cv2.COLOR_GRAY2BGR)
+    return cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+
+
+def seat_identities(seats, boxes, students):
+    """The user id (None for a stranger) drawn at each detected box, or -1 if it matches no seat"""
+    identities = []
+    for x, y, w, h in boxes:
+        distances = [np.hypot(sx + size / 2 - (x + w / 2), sy + size / 2 - (y + h / 2)) for sx, sy, size in seats]
+        seat = int(np.argmin(distances))
+        identities.append(students[seat] if distances[seat] < seats[seat][2] / 3 else -1)
+    return identities
+
+
+def enroll_faces(engine, templates):
+    """Gallery rows for each drawn face, taken as the app does (largest detected face)"""
+    size = 128
+    canvas = np.full((size * 2, size * 2), 100, np.uint8)
+    enrolled = []
+    for template in templates:
+        canvas[size // 2:size // 2 + size, size // 2:size // 2 + size] = cv2.resize(template, (size, size))
+        boxes = engine.detect(canvas)
+        if len(boxes) == 0:
+            boxes = np.array([[size // 2, size // 2, size, size]])
+        enrolled.append(engine.enrollment_embeddings(canvas, boxes[np.argmax(boxes[:, 2] * boxes[:, 3])]))
+    return enrolled
+
+
+def build_background(path, engine, count, seed):
+    """Background gallery of ``count`` drawn faces nobody in the benchmark classrooms has"""
+    store = EmbeddingStore(path)
+    rng = np.random.default_rng(seed)
+    rows = enroll_faces(engine, [draw_face(rng, 160) for _ in range(count)])
+    if rows:
+        rows = np.concatenate(rows)
+        store.add_many(np.zeros(len(rows), dtype=np.int64), rows)
+    return store
+
+
+def build_gallery(path, engine, templates, gallery_size, rng):
+    """Enroll the drawn students, then pad with random embeddings"""
+    store = EmbeddingStore(path)
+    enrolled = enroll_faces(engine, templates)
+    next_id = FIRST_STUDENT + len(templates)
+    store.add_many(np.repeat(np.arange(FIRST_STUDENT, next_id), [len(rows) for rows in enrolled]),
+                   np.concatenate(enrolled))
+    extra = max(0, gallery_size - len(templates))
+    for start in range(0, extra, 50000):
+        count = min(50000, extra - start)
+        noise = np.abs(rng.normal(size=(count, EMBEDDING_DIM))).astype(np.float32)
+        noise /= np.linalg.norm(noise, axis=1, keepdims=True)
+        store.add_many(np.arange(next_id + start, next_id + start + count), noise)
+    return store
+
+
+def build_database(path, roster):
+    pool = ConnectionPool(path)
+    conn = pool.acquire()
+    migrate(conn)
+    with conn:
+        conn.execute('''
+            INSERT INTO users (username, password, role, name) VALUES ('professor', 'password', 'instructor', 'Instructor')
+        ''')
+        conn.execute("INSERT INTO courses (id, code, name, instructor_id) VALUES (?, 'BENCH', 'Benchmark', 1)",
+                     (COURSE_ID,))
+        conn.executemany('''
+            INSERT INTO users (id, username, password, role, name, student_id) VALUES (?, ?, 'password', 'student', ?, ?)
+        ''', ((user_id, f'student{user_id}', f'Student {user_id}', f'S{user_id:06d}') for user_id in roster))
+        conn.executemany('INSERT INTO enrollments (student_id, course_id) VALUES (?, ?)',
+                         ((user_id, COURSE_ID) for user_id in roster))
+    conn.close()
+    return pool
+
+
+class Timings:
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+
+    def timed(self, stage, function, *args):
+        """Call function(*args), adding its duration to the stage's samples"""
+        started = time.perf_counter()
+        result = function(*args)
+        self.samples[stage].append(time.perf_counter() - started)
+        return result
+
+    def summary(self):
+        return {stage: percentiles(values) for stage, values in self.samples.items() if values}
+
+
+def percentiles(values):
+    ms = np.asarray(values) * 1000
+    return {
+        'count': len(ms),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+    }
+
+
+def run_frames(engine, matcher, recorder, frames, batch, seats, students):
+    """Push frames through every stage, batch at a time; returns the mode's results"""
+    timings = Timings()
+    detected = recognized = enrolled_seen = identified = false_accepts = 0
+    started = time.perf_counter()
+    for start in range(0, len(frames), batch):
+        chunk = frames[start:start + batch]
+        decoded = timings.timed('decode', lambda: [decode_image(data) for data in chunk])
+
+        def detect():
+            grays = [engine.to_gray(frame) for frame in decoded]
+            return grays, [engine.detect(gray) for gray in grays]
+        grays, boxes = timings.timed('detect', detect)
+        detected += sum(len(b) for b in boxes)
+        if not sum(len(b) for b in boxes):
+            continue
+
+        def embed():
+            faces = np.concatenate([engine.crop_faces(gray, b) for gray, b in zip(grays, boxes)])
+            return compute_embeddings(faces), engine.eyes_detected(faces)
+        embeddings, eyes = timings.timed('embed', embed)
+        user_ids, scores = timings.timed('match', engine.best_matches, matcher, embeddings)
+        hits = [(int(user_id), float(score)) for user_id, score in zip(user_ids, scores) if user_id >= 0]
+        recognized += len(hits)
+        truth = [identity for b in boxes for identity in seat_identities(seats, b, students)]
+        for identity, user_id in zip(truth, user_ids):
+            enrolled_seen += identity is not None and identity >= 0
+            identified += identity is not None and user_id == identity
+            false_accepts += user_id >= 0 and user_id != identity
+
+        def record():
+            for user_id, score in hits:
+                recorder.record(user_id, COURSE_ID, round(score * 100, 1))
+            recorder.flush()
+        timings.timed('record', record)
+    elapsed = time.perf_counter() - started
+
+    return {
+        'batch': batch,
+        'frames': len(frames),
+        'seconds': round(elapsed, 3),
+        'fps': round(len(frames) / elapsed, 2),
+        'detection_recall': round(detected / (len(students) * len(frames)), 3),
+        'recognized_per_frame': round(recognized / len(frames), 2),
+        'identification_rate': round(identified / max(enrolled_seen, 1), 3),
+        'false_accept_rate': round(false_accepts / max(detected, 1), 4),
+        'stages': timings.summary(),
+    }
+
+
+def run_small_course(engine, recorder, args, rng, workdir):
+    """Accuracy for a course whose roster is too small to offer a stranger a rival"""
+    faces = args.small_enrolled + args.small_strangers
+    templates = [draw_face(rng, 160) for _ in range(faces)]
+    seats = classroom(rng, args.width, args.height, faces)
+    frames = [render_frame(rng, args.width, args.height, seats, templates) for _ in range(args.frames)]
+    students = list(range(FIRST_STUDENT, FIRST_STUDENT + args.small_enrolled)) + [None] * args.small_strangers
+    store = build_gallery(os.path.join(workdir, 'small_course'), engine, templates[:args.small_enrolled], 0, rng)
+    matcher = IVFIndex(store).for_candidates(students[:args.small_enrolled])
+    return run_frames(engine, matcher, recorder, frames, 1, seats, students)
+
+
+def run_api(frames, db_path, gallery_path):
+    """Post frames to /api/recognize-face with the frame gate off"""
+    os.environ.update(ATTENDANCE_DB=db_path, FACE_INDEX_PATH=gallery_path, FRAME_GATE='0')
+    from main import app, bootstrap, start_background_work
+    bootstrap()
+    start_background_work()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['role'] = 'instructor'
+        session['user_id'] = 1
+    payloads = [json.dumps({'image': 'data:image/jpeg;base64,' + base64.b64encode(data).decode('ascii'),
+                            'course_id': COURSE_ID, 'camera_id': 'benchmark'}) for data in frames]
+    latencies = []
+    started = time.perf_counter()
+    for payload in payloads:
+        request_started = time.perf_counter()
+        response = client.post('/api/recognize-face', data=payload, content_type='application/json')
+        latencies.append(time.perf_counter() - request_started)
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/recognize-face returned {response.status_code}")
+    elapsed = time.perf_counter() - started
+    return {
+        'frames': len(frames),
+        'seconds': round(elapsed, 3),
+        'fps': round(len(frames) / elapsed, 2),
+        'request': percentiles(latencies),
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'cpus': os.cpu_count(),
+        'machine': platform.machine(),
+    }
+
+
+def print_mode(name, result):
+    print(f"\n{name}: {result['fps']} frames/s over {result['frames']} frames"
+          + (f", detection recall {result['detection_recall']}, identification {result['identification_rate']}, "
+             f"false accepts {result['false_accept_rate']}" if 'detection_recall' in result else ''))
+    rows = result.get('stages') or {'request': result['request']}
+    for stage, stats in rows.items():
+        print(f"  {stage:<8} p50 {stats['p50_ms']:>9.2f} ms  p95 {stats['p95_ms']:>9.2f} ms  "
+              f"p99 {stats['p99_ms']:>9.2f} ms")
+
+
+def print_comparison(baseline, results):
+    print(f"\nAgainst {baseline.get('environment', {}).get('commit') or 'baseline'} (p50, new / old):")
+    for mode, result in results['modes'].items():
+        old = baseline.get('modes', {}).get(mode)
+        if not old:
+            continue
+        print(f"  {mode}: fps {old['fps']} -> {result['fps']}")
+        stages = result.get('stages') or {'request': result['request']}
+        old_stages = old.get('stages') or {'request': old.get('request')}
+        for stage, stats in stages.items():
+            before = (old_stages.get(stage) or {}).get('p50_ms')
+            if before:
+                print(f"    {stage:<8} {before:>9.2f} -> {stats['p50_ms']:>9.2f} ms "
+                      f"({stats['p50_ms'] / before:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--faces', type=int, default=20, help='Students visible in each frame')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--gallery', type=int, default=1000, help='Total gallery rows')
+    parser.add_argument('--strangers', type=int, default=4, help='Drawn faces that are not enrolled')
+    parser.add_argument('--background', type=int, default=100,
+                        help='Faces of people who are not enrolled in the background gallery')
+    parser.add_argument('--small-enrolled', type=int, default=1, help='Enrolled students in the small course')
+    parser.add_argument('--small-strangers', type=int, default=2, help='Visitors in the small course')
+    parser.add_argument('--roster', type=int, default=60, help='Course roster size (>= faces)')
+    parser.add_argument('--matcher', choices=('roster', 'index'), default='roster',
+                        help='Search the course roster, as course frames do, or the ANN index')
+    parser.add_argument('--frames', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--batch', type=int, default=8)
+    parser.add_argument('--api', action='store_true', help='Also time /api/recognize-face')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min-identification', type=float, default=0.5,
+                        help='Fail if fewer detected enrolled faces are identified correctly')
+    parser.add_argument('--max-false-accept', type=float, default=0.01,
+                        help='Fail if more detected faces are accepted as the wrong student')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Earlier JSON results to compare against')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    workdir = tempfile.mkdtemp(prefix='recognition_bench_')
+    gallery_path = os.path.join(workdir, 'face_index')
+    # Where the app looks for it by default, so --api uses it too
+    background = build_background(os.path.join(gallery_path, 'background'), FaceEngine(),
+                                  args.background, args.seed + 1)
+    engine = FaceEngine(background=background)
+    templates = [draw_face(rng, 160) for _ in range(args.faces)]
+    seats = classroom(rng, args.width, args.height, args.faces)
+    frames = [render_frame(rng, args.width, args.height, seats, templates)
+              for _ in range(args.frames + args.warmup)]
+
+    # The last --strangers faces are visitors who were never enrolled
+    enrolled = args.faces - args.strangers
+    students = list(range(FIRST_STUDENT, FIRST_STUDENT + enrolled)) + [None] * args.strangers
+    store = build_gallery(gallery_path, engine, templates[:enrolled], args.gallery, rng)
+    roster = list(range(FIRST_STUDENT, FIRST_STUDENT + max(args.roster, enrolled)))
+    db_path = os.path.join(workdir, 'attendance.db')
+    pool = build_database(db_path, roster)
+    recorder = AttendanceRecorder(pool.acquire, write_hook=refresh_daily_stats)
+    index = IVFIndex(store, min_rows=20000)
+    matcher = index.for_candidates(roster) if args.matcher == 'roster' else index
+
+    # Warm caches, the index and the cascade before timing
+    run_frames(engine, matcher, recorder, frames[:args.warmup], 1, seats, students)
+    frames = frames[args.warmup:]
+
+    results = {
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'environment': environment(),
+        'modes': {
+            'single': run_frames(engine, matcher, recorder, frames, 1, seats, students),
+            'batched': run_frames(engine, matcher, recorder, frames, args.batch, seats, students),
+            'small_course': run_small_course(engine, recorder, args, rng, workdir),
+        },
+    }
+    if args.api:
+        results['modes']['api'] = run_api(frames, db_path, gallery_path)
+
+    print(f"{args.faces} faces at {args.width}x{args.height}, gallery {len(store)}, "
+          f"{args.matcher} matcher, {os.cpu_count()} CPUs")
+    for mode, result in results['modes'].items():
+        print_mode(mode, result)
+    if args.compare:
+        with open(args.compare) as handle:
+            print_comparison(json.load(handle), results)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(results, handle, indent=2)
+        print(f"\n✅ Wrote {args.output}")
+
+    failed = False
+    for mode in ('single', 'small_course'):
+        accuracy = results['modes'][mode]
+        if accuracy['identification_rate'] < args.min_identification:
+            print(f"❌ {mode}: identification rate {accuracy['identification_rate']} "
+                  f"is below {args.min_identification}")
+            failed = True
+        if accuracy['false_accept_rate'] > args.max_false_accept:
+            print(f"❌ {mode}: false-accept rate {accuracy['false_accept_rate']} is above {args.max_false_accept}")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
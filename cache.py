@@ -0,0 +1,225 @@
+"""In-process stats cache, with invalidations shared between processes.
+
+Every web worker keeps its own ``TTLCache``. Without ``sync``, a write
+in one process only invalidates that process's entries, and the others
+serve their copy for up to ``ttl`` seconds. With an ``InvalidationLog``,
+invalidated tags are also appended to a SQLite table, and every process
+applies the tags other processes logged at most ``interval`` seconds
+before it answers from its cache. Writers that already hold a
+transaction log their tags in it with ``log_invalidations``.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+CREATE_CACHE_INVALIDATIONS_SQL = '''
+    CREATE TABLE IF NOT EXISTS cache_invalidations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tag TEXT NOT NULL,
+        pid INTEGER NOT NULL,
+        created_at REAL NOT NULL
+    )
+'''
+
+POLL_INVALIDATIONS_SQL = '''
+    SELECT id, tag, pid FROM cache_invalidations WHERE id > ? ORDER BY id
+'''
+
+
+class InvalidationLog:
+    """Tag invalidations shared through the database.
+
+    ``publish`` appends tags; ``poll`` returns the tags other processes
+    appended since the last poll, checking at most every ``interval``
+    seconds. Rows older than ``retention`` seconds are pruned, so a
+    process that has not polled for half that long gets None, meaning
+    it may have missed some and must drop everything.
+    """
+
+    def __init__(self, connect, interval=0.5, retention=60.0):
+        self.connect = connect
+        self.interval = interval
+        self.retention = retention
+        self._last_id = None
+        self._polled = 0.0
+        self._pruned = 0.0
+        self._lock = threading.Lock()
+
+    def publish(self, tags, conn=None):
+        """Log tags in their own transaction, or as part of ``conn``'s open one"""
+        if conn is not None:
+            self._append(conn, tags)
+            return
+        conn = self.connect()
+        try:
+            with conn:
+                self._append(conn, tags)
+        except sqlite3.OperationalError:
+            pass  # schema not migrated yet; nobody can have cached anything
+        finally:
+            conn.close()
+
+    def _append(self, conn, tags):
+        now = time.time()
+        conn.executemany('INSERT INTO cache_invalidations (tag, pid, created_at) VALUES (?, ?, ?)',
+                         [(json.dumps(list(tag)), os.getpid(), now) for tag in tags])
+        if now - self._pruned > self.retention / 2:
+            self._pruned = now
+            conn.execute('DELETE FROM cache_invalidations WHERE created_at < ?', (now - self.retention,))
+
+    def poll(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._polled < self.interval:
+                return []
+            stale = self._last_id is None or now - self._polled > self.retention / 2
+            self._polled = now
+            conn = self.connect()
+            try:
+                if stale:
+                    self._last_id = conn.execute(
+                        'SELECT COALESCE(MAX(id), 0) FROM cache_invalidations').fetchone()[0]
+                    return None
+                rows = conn.execute(POLL_INVALIDATIONS_SQL, (self._last_id,)).fetchall()
+            except sqlite3.OperationalError:
+                return []
+            finally:
+                conn.close()
+            if rows:
+                self._last_id = rows[-1][0]
+        pid = os.getpid()
+        return [tuple(json.loads(tag)) for _, tag, owner in rows if owner != pid]
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTL and tag-based invalidation.
+
+    Entries are stored with a set of tags, e.g. ('course', 1, '2024-01-01').
+    ``invalidate_tags`` drops every entry carrying one of the tags and bumps
+    the generation of tags a value is being computed for, so a value whose
+    inputs changed mid-computation is not stored afterwards. Generations
+    are only kept while such a computation runs; tags such as dates come
+    and go without piling up. ``sync``, an InvalidationLog, carries
+    invalidations to and from other processes.
+    """
+
+    def __init__(self, maxsize=1024, ttl=5.0, sync=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sync = sync
+        self._entries = OrderedDict()
+        self._tagged = {}
+        self._computing = Counter()
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_set(self, key, compute, tags=()):
+        if self.sync is not None:
+            remote = self.sync.poll()
+            if remote is None:
+                self.clear()
+            elif remote:
+                self._invalidate_local(remote)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            self._computing.update(tags)
+            generations = [self._epoch] + [self._generations.get(tag, 0) for tag in tags]
+
+        try:
+            value = compute()
+            with self._lock:
+                # A write that landed while we computed makes the value suspect
+                if generations == [self._epoch] + [self._generations.get(tag, 0) for tag in tags]:
+                    self._store(key, value, tags, now + self.ttl)
+        finally:
+            with self._lock:
+                self._computing.subtract(tags)
+                for tag in tags:
+                    if self._computing[tag] <= 0:
+                        del self._computing[tag]
+                        self._generations.pop(tag, None)
+        return value
+
+    def _store(self, key, value, tags, expires):
+        self._drop(key)
+        self._entries[key] = (expires, value, tuple(tags))
+        for tag in tags:
+            self._tagged.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+    def invalidate(self, key):
+        with self._lock:
+            self._drop(key)
+
+    def invalidate_tags(self, *tags, publish=True):
+        """Drop entries carrying any of the tags here and, with ``publish``, in other processes.
+
+        Pass publish=False when the tags were already logged with
+        log_invalidations.
+        """
+        self._invalidate_local(tags)
+        if publish and self.sync is not None and tags:
+            self.sync.publish(tags)
+
+    def log_invalidations(self, conn, tags):
+        """Log tags for other processes inside ``conn``'s open write transaction"""
+        if self.sync is not None and tags:
+            self.sync.publish(tags, conn)
+
+    def _invalidate_local(self, tags):
+        with self._lock:
+            for tag in tags:
+                if tag in self._computing:
+                    self._generations[tag] = self._generations.get(tag, 0) + 1
+                for key in list(self._tagged.get(tag, ())):
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._tagged.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
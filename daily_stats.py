@@ -0,0 +1,81 @@
+"""Materialized per-course, per-day attendance counts.
+
+``course_daily_stats`` holds one row per (course_id, date) with the
+present/absent counts and rate for that session. The attendance write
+paths call ``refresh_daily_stats`` inside their own transaction for just
+the (course_id, date) pairs they touched, and enrollment writes call
+``refresh_enrolled_counts`` for the courses whose roster changed.
+``rebuild_daily_stats`` recomputes the whole table from raw attendance.
+"""
+
+CREATE_DAILY_STATS_SQL = '''
+    CREATE TABLE IF NOT EXISTS course_daily_stats (
+        course_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        present_count INTEGER NOT NULL DEFAULT 0,
+        enrolled_count INTEGER NOT NULL DEFAULT 0,
+        absent_count INTEGER NOT NULL DEFAULT 0,
+        attendance_rate REAL NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (course_id, date),
+        FOREIGN KEY (course_id) REFERENCES courses (id)
+    )
+'''
+
+# "WHERE true" keeps SQLite from parsing ON CONFLICT as part of the SELECT
+_UPSERT_SELECT = '''
+    INSERT INTO course_daily_stats
+        (course_id, date, present_count, enrolled_count, absent_count, attendance_rate, updated_at)
+    SELECT course_id, date, present_count, enrolled_count,
+           MAX(enrolled_count - present_count, 0),
+           CASE WHEN enrolled_count > 0
+                THEN ROUND(present_count * 100.0 / enrolled_count, 1) ELSE 0 END,
+           CURRENT_TIMESTAMP
+    FROM ({source}) WHERE true
+    ON CONFLICT(course_id, date) DO UPDATE SET
+        present_count = excluded.present_count,
+        enrolled_count = excluded.enrolled_count,
+        absent_count = excluded.absent_count,
+        attendance_rate = excluded.attendance_rate,
+        updated_at = excluded.updated_at
+'''
+
+REFRESH_DAILY_STATS_SQL = _UPSERT_SELECT.format(source='''
+    SELECT ?1 AS course_id, ?2 AS date,
+           (SELECT COUNT(DISTINCT student_id) FROM attendance
+            WHERE course_id = ?1 AND date = ?2 AND status = 'present') AS present_count,
+           (SELECT COUNT(*) FROM enrollments WHERE course_id = ?1) AS enrolled_count
+''')
+
+REFRESH_ENROLLED_COUNTS_SQL = _UPSERT_SELECT.format(source='''
+    SELECT s.course_id AS course_id, s.date AS date, s.present_count AS present_count,
+           (SELECT COUNT(*) FROM enrollments e WHERE e.course_id = s.course_id) AS enrolled_count
+    FROM course_daily_stats s
+    WHERE s.course_id = ?
+''')
+
+REBUILD_DAILY_STATS_SQL = _UPSERT_SELECT.format(source='''
+    SELECT a.course_id AS course_id, a.date AS date,
+           COUNT(DISTINCT CASE WHEN a.status = 'present' THEN a.student_id END) AS present_count,
+           (SELECT COUNT(*) FROM enrollments e WHERE e.course_id = a.course_id) AS enrolled_count
+    FROM attendance a
+    WHERE a.course_id IS NOT NULL
+    GROUP BY a.course_id, a.date
+''')
+
+
+def refresh_daily_stats(conn, keys):
+    """Recompute the summary rows for the given (course_id, date) pairs"""
+    conn.executemany(REFRESH_DAILY_STATS_SQL, [(int(course_id), date) for course_id, date in keys])
+
+
+def refresh_enrolled_counts(conn, course_ids):
+    """Recompute enrolled/absent counts and rates of every summary row of the given courses"""
+    conn.executemany(REFRESH_ENROLLED_COUNTS_SQL, [(int(course_id),) for course_id in course_ids])
+
+
+def rebuild_daily_stats(conn):
+    """Backfill: recompute every summary row from raw attendance"""
+    conn.execute('DELETE FROM course_daily_stats')
+    conn.execute(REBUILD_DAILY_STATS_SQL)
+    return conn.execute('SELECT COUNT(*) FROM course_daily_stats').fetchone()[0]
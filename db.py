@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Applied to every new connection. journal_mode=WAL lets dashboard readers
+# run while check-ins are being written; it persists in the file, the rest
+# are per-connection.
+DEFAULT_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16000),       # KiB, i.e. 16 MB of page cache per connection
+    ('mmap_size', 268435456),     # map up to 256 MB of the file
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),
+)
+
+
+class PooledConnection:
+    """sqlite3.Connection proxy whose close() hands it back to the pool"""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        self._raw.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._raw.__exit__(*exc)
+
+    def execute(self, sql, parameters=()):
+        on_query = self._pool.on_query
+        if on_query is None:
+            return self._raw.execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return self._raw.execute(sql, parameters)
+        finally:
+            on_query(time.perf_counter() - started)
+
+    def executemany(self, sql, parameters):
+        on_query = self._pool.on_query
+        if on_query is None:
+            return self._raw.executemany(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return self._raw.executemany(sql, parameters)
+        finally:
+            on_query(time.perf_counter() - started)
+
+    @property
+    def released(self):
+        return self._released
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._raw)
+
+
+class ConnectionPool:
+    """Small LIFO pool of tuned SQLite connections.
+
+    Connections are created on demand, configured once with
+    DEFAULT_PRAGMAS and a prepared-statement cache, and reused across
+    requests and threads (one holder at a time). At most ``max_idle`` are
+    kept open between uses. A forked child never reuses its parent's
+    connections. ``on_query(seconds)``, if set, is called after every
+    execute/executemany made through a pooled connection (the time to
+    run the statement, not to fetch all of its rows).
+    """
+
+    def __init__(self, path, max_idle=8, cached_statements=256, pragmas=DEFAULT_PRAGMAS, on_query=None):
+        self.path = path
+        self.max_idle = max_idle
+        self.cached_statements = cached_statements
+        self.pragmas = pragmas
+        self.on_query = on_query
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _connect(self):
+        raw = sqlite3.connect(self.path, check_same_thread=False,
+                              cached_statements=self.cached_statements)
+        raw.row_factory = sqlite3.Row
+        for name, value in self.pragmas:
+            raw.execute(f"PRAGMA {name} = {value}")
+        return raw
+
+    def acquire(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Inherited across fork: the parent still owns these handles
+                self._idle = []
+                self._pid = os.getpid()
+            raw = self._idle.pop() if self._idle else None
+        if raw is None:
+            raw = self._connect()
+        return PooledConnection(self, raw)
+
+    def release(self, raw):
+        if raw.in_transaction:
+            raw.rollback()
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.max_idle:
+                self._idle.append(raw)
+                return
+        raw.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for raw in idle:
+            raw.close()
@@ -0,0 +1,214 @@
+import json
+import os
+
+import numpy as np
+
+from face_engine import DESCRIPTOR_VERSION, EMBEDDING_DIM, top_k_cosine
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-writer deployments only
+    fcntl = None
+
+FORMAT_VERSION = 1
+GROWTH_ROWS = 1024
+TOMBSTONE = -1
+
+
+class EmbeddingStore:
+    """Persistent, memory-mapped face gallery.
+
+    The store is a directory holding three files:
+
+    * ``embeddings.f32`` - contiguous float32 matrix, one row per sample
+    * ``ids.i64`` - int64 user_id for each row, ``-1`` for deleted rows
+    * ``header.json`` - format, descriptor, dim, used row count and a
+      version counter
+
+    Rows are only ever appended or tombstoned in place, so enrolling or
+    deleting a student touches a few pages instead of rewriting the file.
+    Both data files are mapped with ``np.memmap``; every process that opens
+    the same directory shares one page-cache copy of the gallery.
+    """
+
+    def __init__(self, path, dim=EMBEDDING_DIM):
+        self.path = path
+        self.dim = dim
+        os.makedirs(path, exist_ok=True)
+        self._header_path = os.path.join(path, 'header.json')
+        self._matrix_path = os.path.join(path, 'embeddings.f32')
+        self._ids_path = os.path.join(path, 'ids.i64')
+        self._lock_path = os.path.join(path, '.lock')
+        self._header_stamp = None
+        self._capacity = 0
+
+        if not os.path.exists(self._header_path):
+            self._grow(GROWTH_ROWS)
+            self._write_header({'format': FORMAT_VERSION, 'descriptor': DESCRIPTOR_VERSION,
+                                'dim': dim, 'rows': 0, 'version': 0})
+        self.refresh()
+
+    def __len__(self):
+        return int(np.count_nonzero(self.valid))
+
+    @property
+    def rows(self):
+        return self._header['rows']
+
+    @property
+    def version(self):
+        return self._header['version']
+
+    @property
+    def matrix(self):
+        return self._matrix[:self.rows]
+
+    @property
+    def user_ids(self):
+        return self._ids[:self.rows]
+
+    @property
+    def valid(self):
+        return self.user_ids != TOMBSTONE
+
+    def refresh(self):
+        """Re-read the header and remap if another process changed the files"""
+        # os.replace gives every header write a fresh inode, so (inode, mtime)
+        # changes even when two writes land within one timestamp tick.
+        stat = os.stat(self._header_path)
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if stamp == self._header_stamp:
+            return False
+        with open(self._header_path) as f:
+            header = json.load(f)
+        if header['format'] != FORMAT_VERSION or header['dim'] != self.dim:
+            raise ValueError(f"Incompatible embedding store at {self.path}: {header}")
+        # Rows from another descriptor are not comparable with live faces
+        if header.get('descriptor') != DESCRIPTOR_VERSION:
+            raise ValueError(f"Embedding store at {self.path} was built with face descriptor "
+                             f"{header.get('descriptor', 1)}, this build uses {DESCRIPTOR_VERSION}: "
+                             "move it aside and re-import its photos ('flask import-roster ROSTER "
+                             "--photos DIR' for the gallery, 'flask import-background DIR' for background faces)")
+        self._header = header
+        self._header_stamp = stamp
+        self._map()
+        return True
+
+    def _map(self):
+        capacity = os.path.getsize(self._ids_path) // 8
+        if capacity != self._capacity:
+            self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode='r+',
+                                     shape=(capacity, self.dim))
+            self._ids = np.memmap(self._ids_path, dtype=np.int64, mode='r+', shape=(capacity,))
+            self._capacity = capacity
+
+    def _grow(self, capacity):
+        # Extending a file with truncate allocates the tail lazily and leaves
+        # existing rows where they are.
+        for file_path, row_bytes in ((self._matrix_path, self.dim * 4), (self._ids_path, 8)):
+            with open(file_path, 'ab') as f:
+                f.truncate(capacity * row_bytes)
+
+    def _write_header(self, header):
+        tmp_path = self._header_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(header, f)
+        os.replace(tmp_path, self._header_path)
+
+    def _locked(self):
+        return _FileLock(self._lock_path)
+
+    def _commit(self, rows):
+        self._matrix.flush()
+        self._ids.flush()
+        header = dict(self._header, rows=rows, version=self._header['version'] + 1)
+        self._write_header(header)
+        self._header = header
+        stat = os.stat(self._header_path)
+        self._header_stamp = (stat.st_ino, stat.st_mtime_ns)
+
+    def add_many(self, user_ids, embeddings):
+        """Append a block of rows in one write"""
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if len(user_ids) == 0:
+            return
+        with self._locked():
+            self.refresh()
+            start = self.rows
+            end = start + len(user_ids)
+            if end > self._capacity:
+                self._grow(max(end, self._capacity * 2, GROWTH_ROWS))
+                self._map()
+            self._matrix[start:end] = embeddings
+            self._ids[start:end] = user_ids
+            self._commit(end)
+
+    def add(self, user_id, embeddings):
+        """Append one or more embeddings for a user"""
+        embeddings = np.atleast_2d(embeddings)
+        self.add_many(np.full(len(embeddings), user_id, dtype=np.int64), embeddings)
+
+    def remove(self, user_id):
+        """Tombstone every row belonging to a user"""
+        with self._locked():
+            self.refresh()
+            rows = np.flatnonzero(self.user_ids == user_id)
+            if len(rows) == 0:
+                return 0
+            self._ids[rows] = TOMBSTONE
+            self._commit(self.rows)
+            return len(rows)
+
+    def remove_many(self, user_ids):
+        """Tombstone every row belonging to any of the users in one commit"""
+        with self._locked():
+            self.refresh()
+            rows = np.flatnonzero(np.isin(self.user_ids, np.asarray(list(user_ids), dtype=np.int64)))
+            if len(rows) == 0:
+                return 0
+            self._ids[rows] = TOMBSTONE
+            self._commit(self.rows)
+            return len(rows)
+
+    def replace(self, user_id, embeddings):
+        """Re-enroll a user: tombstone their old rows and append the new ones"""
+        self.remove(user_id)
+        self.add(user_id, embeddings)
+
+    def match(self, embeddings, k=1):
+        """Return (user_ids, scores) of the k closest live rows for each embedding"""
+        self.refresh()
+        indices, scores = top_k_cosine(embeddings, self.matrix, k, valid=self.valid)
+        return self.user_ids[indices], scores
+
+    def compact(self):
+        """Rewrite the store without tombstoned rows (offline maintenance)"""
+        with self._locked():
+            self.refresh()
+            keep = self.valid
+            matrix = np.array(self.matrix[keep])
+            ids = np.array(self.user_ids[keep])
+            self._matrix[:len(ids)] = matrix
+            self._ids[:len(ids)] = ids
+            self._commit(len(ids))
+
+
+class _FileLock:
+    """Advisory cross-process lock for writers; a no-op where fcntl is missing"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
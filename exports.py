@@ -0,0 +1,88 @@
+import csv
+import io
+import zlib
+
+CSV_HEADER = ['Date', 'Student Name', 'Student ID', 'Status', 'Time', 'Method', 'Confidence']
+
+
+def attendance_export_query(start=None, end=None):
+    """Build the per-course export SELECT.
+
+    With course_id pinned by equality the rows come out of the
+    (course_id, date, student_id) index already in date order, so SQLite
+    only sorts names within one date at a time instead of the whole export.
+    """
+    sql = '''
+        SELECT a.date, u.name, u.student_id, a.status, a.timestamp, a.method,
+               a.recognized_confidence
+        FROM attendance a
+        JOIN users u ON a.student_id = u.id
+        WHERE a.course_id = ?
+    '''
+    params = []
+    if start:
+        sql += ' AND a.date >= ?'
+        params.append(start)
+    if end:
+        sql += ' AND a.date <= ?'
+        params.append(end)
+    sql += ' ORDER BY a.date DESC, u.name'
+    return sql, params
+
+
+def stream_attendance_csv(connect, courses, start=None, end=None, include_course=False,
+                          chunk_size=1000):
+    """Yield encoded CSV chunks for [(course_id, code)], chunk_size rows at a time.
+
+    The header is yielded before any query runs so the client sees the
+    first byte immediately. ``connect`` must return a connection the
+    generator may keep until it is exhausted or closed.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow((['Course'] if include_course else []) + CSV_HEADER)
+    yield buffer.getvalue().encode('utf-8')
+
+    sql, params = attendance_export_query(start, end)
+    conn = connect()
+    try:
+        for course_id, code in courses:
+            prefix = [code] if include_course else []
+            cursor = conn.execute(sql, [course_id] + params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                buffer.seek(0)
+                buffer.truncate(0)
+                for record in rows:
+                    writer.writerow(prefix + [
+                        record['date'],
+                        record['name'],
+                        record['student_id'],
+                        record['status'],
+                        record['timestamp'],
+                        record['method'],
+                        f"{record['recognized_confidence']}%" if record['recognized_confidence'] else 'N/A'
+                    ])
+                yield buffer.getvalue().encode('utf-8')
+    finally:
+        conn.close()
+
+
+def gzip_stream(chunks, level=6):
+    """Compress a byte-chunk iterator into a gzip stream on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    first = True
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if first:
+                # Push the gzip header and CSV header out right away
+                data += compressor.flush(zlib.Z_SYNC_FLUSH)
+                first = False
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        chunks.close()
@@ -0,0 +1,389 @@
+import base64
+import contextlib
+
+import cv2
+import numpy as np
+
+# Face crops are normalised to this size before the LBP descriptor is computed.
+# The extra pixel on each side is consumed by the 3x3 LBP neighbourhood.
+FACE_SIZE = 60
+# Centred share of each detector box that is described; the box edge is
+# mostly background and moves with detection jitter
+FACE_CROP = 0.9
+GRID = 5
+# Each of the 58 uniform LBP codes (at most two 0/1 transitions around the
+# circle) gets its own bin; every other code shares the last one
+BINS = 59
+EMBEDDING_DIM = GRID * GRID * BINS
+# Bumped whenever new embeddings stop being comparable with stored ones
+DESCRIPTOR_VERSION = 2
+
+# Cosine similarity needed before a gallery hit counts as a recognition, and
+# its lead over the best other student and the best background face.
+# Calibrated on benchmarks/recognition.py faces: genuine best scores start at
+# ~0.73 and strangers score as high, so the threshold only rejects non-faces.
+# Over 4- to 20-face classrooms against 100 background faces, a 0.02 lead
+# identifies 0.70 of enrolled faces and accepts 0.002 of strangers.
+DEFAULT_MATCH_THRESHOLD = 0.7
+DEFAULT_MATCH_MARGIN = 0.02
+# Enrolment stores the face at these box scales, since the detector's box
+# for the same face varies in size from frame to frame
+ENROLL_SCALES = (1.0, 1.06, 0.94)
+# Gallery rows fetched per face to find the best other student
+MATCH_CANDIDATES = 4 * len(ENROLL_SCALES)
+
+_LBP_OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1)]
+
+
+def _uniform_lbp_table():
+    table = np.full(256, BINS - 1, dtype=np.int64)
+    uniform = [code for code in range(256) if bin(code ^ (code >> 1 | (code & 1) << 7)).count('1') <= 2]
+    table[uniform] = np.arange(len(uniform))
+    return table
+
+
+_UNIFORM_LBP = _uniform_lbp_table()
+
+
+def image_bytes(image_data):
+    """Get the encoded bytes of a data URL, base64 string or raw bytes"""
+    if isinstance(image_data, str):
+        if image_data.startswith('data:'):
+            image_data = image_data.split(',', 1)[1]
+        image_data = base64.b64decode(image_data)
+    return image_data
+
+
+def decode_image(image_data):
+    """Decode a data URL, base64 string or raw bytes into a BGR frame"""
+    buffer = np.frombuffer(image_bytes(image_data), dtype=np.uint8)
+    if buffer.size == 0:
+        return None
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+def _lbp_codes(faces):
+    """Vectorised 8-neighbour LBP codes for a stack of (N, H, W) grey crops"""
+    height, width = faces.shape[1:]
+    center = faces[:, 1:-1, 1:-1]
+    codes = np.zeros(center.shape, dtype=np.uint8)
+    for bit, (dy, dx) in enumerate(_LBP_OFFSETS):
+        neighbour = faces[:, 1 + dy:height - 1 + dy, 1 + dx:width - 1 + dx]
+        codes |= (neighbour >= center).astype(np.uint8) << bit
+    return codes
+
+
+def compute_embeddings(faces):
+    """Turn a stack of (N, FACE_SIZE+2, FACE_SIZE+2) grey crops into unit-length embeddings"""
+    count = faces.shape[0]
+    if count == 0:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+
+    # Map the 256 LBP codes to uniform-pattern bins and histogram every grid
+    # cell for every face with a single bincount over (face, cell, bin) ids.
+    codes = _UNIFORM_LBP[_lbp_codes(faces)]
+    cell = FACE_SIZE // GRID
+    codes = codes.reshape(count, GRID, cell, GRID, cell).transpose(0, 1, 3, 2, 4)
+    codes = codes.reshape(count, GRID * GRID, cell * cell)
+    offsets = (np.arange(count)[:, None, None] * GRID * GRID
+               + np.arange(GRID * GRID)[None, :, None]) * BINS
+    histograms = np.bincount((codes + offsets).ravel(), minlength=count * EMBEDDING_DIM)
+
+    # Hellinger mapping, then centring: without it the texture every face
+    # shares dominates and different people score close to 1. After L2
+    # normalisation a dot product is a cosine.
+    embeddings = np.sqrt(histograms.reshape(count, EMBEDDING_DIM).astype(np.float32))
+    embeddings -= embeddings.mean(axis=1, keepdims=True)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12
+    return embeddings
+
+
+def top_k_cosine(queries, gallery, k=1, valid=None):
+    """Score every query against every gallery row in one matrix product.
+
+    Returns (indices, scores), both shaped (len(queries), k) and sorted by
+    descending similarity. Rows where ``valid`` is False are never returned
+    ahead of live rows.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    rows = gallery.shape[0]
+    if queries.shape[0] == 0 or rows == 0:
+        empty = np.empty((queries.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+
+    sims = queries @ gallery.T
+    if valid is not None:
+        sims[:, ~valid] = -np.inf
+
+    k = min(k, rows)
+    if k < rows:
+        indices = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    else:
+        indices = np.broadcast_to(np.arange(rows), (queries.shape[0], rows)).copy()
+    scores = np.take_along_axis(sims, indices, axis=1)
+    order = np.argsort(-scores, axis=1)
+    return np.take_along_axis(indices, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def _box_iou(box, boxes):
+    x2 = np.minimum(box[0] + box[2], boxes[:, 0] + boxes[:, 2])
+    y2 = np.minimum(box[1] + box[3], boxes[:, 1] + boxes[:, 3])
+    inter = (np.clip(x2 - np.maximum(box[0], boxes[:, 0]), 0, None)
+             * np.clip(y2 - np.maximum(box[1], boxes[:, 1]), 0, None))
+    return inter / (box[2] * box[3] + boxes[:, 2] * boxes[:, 3] - inter)
+
+
+def suppress_overlaps(boxes, iou_threshold=0.3):
+    """Drop boxes overlapping a larger kept box (the same face found at two scales)"""
+    if len(boxes) < 2:
+        return boxes
+    order = np.argsort(-(boxes[:, 2] * boxes[:, 3]))
+    keep = []
+    for i in order:
+        if not keep or _box_iou(boxes[i], boxes[keep]).max() < iou_threshold:
+            keep.append(i)
+    return boxes[np.sort(keep)]
+
+
+class DetectionRegions:
+    """Static detection layout for one camera, in fractions of the frame.
+
+    ``include`` rectangles (x, y, w, h) are searched instead of the whole
+    frame, ``exclude`` rectangles (doors, projector screens) are blanked
+    and any face centred in them is dropped. The top ``far_field`` share
+    of the frame, where the back rows sit, is searched a second time at
+    ``far_scale`` times the normal detection resolution so small faces
+    are still found.
+    """
+
+    def __init__(self, include=(), exclude=(), far_field=0.0, far_scale=2.0):
+        self.include = [tuple(float(v) for v in rect) for rect in include]
+        self.exclude = [tuple(float(v) for v in rect) for rect in exclude]
+        self.far_field = float(far_field)
+        self.far_scale = float(far_scale)
+        for rect in self.include + self.exclude:
+            if len(rect) != 4 or min(rect) < 0 or rect[0] + rect[2] > 1 or rect[1] + rect[3] > 1:
+                raise ValueError(f"Region {rect} is not an (x, y, w, h) rectangle inside the frame")
+        if not 0 <= self.far_field <= 1 or self.far_scale < 1:
+            raise ValueError('far_field must be in [0, 1] and far_scale at least 1')
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('include', ()), data.get('exclude', ()),
+                   data.get('far_field', 0.0), data.get('far_scale', 2.0))
+
+    def to_dict(self):
+        return {
+            'include': [list(rect) for rect in self.include],
+            'exclude': [list(rect) for rect in self.exclude],
+            'far_field': self.far_field,
+            'far_scale': self.far_scale,
+        }
+
+    @staticmethod
+    def pixels(rects, width, height):
+        """Fractional rectangles as integer (x, y, w, h) pixel boxes"""
+        return [(int(x * width), int(y * height), max(1, int(w * width)), max(1, int(h * height)))
+                for x, y, w, h in rects]
+
+
+class FaceEngine:
+    """CPU face pipeline: Haar detection, LBP embeddings and gallery matching.
+
+    ``background`` (an EmbeddingStore, or anything with a ``match`` method)
+    holds faces of people who are not enrolled; see best_matches.
+    """
+
+    def __init__(self, detect_width=480, min_face=40, match_threshold=DEFAULT_MATCH_THRESHOLD,
+                 match_margin=DEFAULT_MATCH_MARGIN, timer=None, background=None):
+        self.detect_width = detect_width
+        self.min_face = min_face
+        self.match_threshold = match_threshold
+        self.match_margin = match_margin
+        self.background = background
+        # timer(stage) returns a context manager that times the 'embed' and 'match' steps
+        self.timer = timer or (lambda stage: contextlib.nullcontext())
+        self.face_cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.eye_cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + 'haarcascade_eye.xml')
+
+    def to_gray(self, frame):
+        if frame.ndim == 2:
+            return frame
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    def detect(self, gray, regions=None):
+        """Find faces, returning (x, y, w, h) boxes in full-frame pixels.
+
+        Proposals always come from a downscaled copy; the full-resolution
+        frame is only read again when the boxes are cropped for embedding.
+        ``regions`` (a DetectionRegions) limits and extends the search.
+        """
+        if regions is None:
+            return self._detect_area(gray, (0, 0, gray.shape[1], gray.shape[0]), self.detect_width)
+
+        height, width = gray.shape
+        excluded = DetectionRegions.pixels(regions.exclude, width, height)
+        if excluded:
+            gray = gray.copy()
+            for x, y, w, h in excluded:
+                gray[y:y + h, x:x + w] = 0
+        areas = DetectionRegions.pixels(regions.include, width, height) or [(0, 0, width, height)]
+
+        found = [self._detect_area(gray, area, self.detect_width) for area in areas]
+        band = int(regions.far_field * height)
+        if band:
+            # Back rows: same areas clipped to the band, at a finer scale
+            for x, y, w, h in areas:
+                if y < band:
+                    found.append(self._detect_area(gray, (x, y, w, min(h, band - y)),
+                                                   self.detect_width * regions.far_scale,
+                                                   self.min_face / regions.far_scale))
+        boxes = np.concatenate(found)
+
+        if excluded and len(boxes):
+            cx = boxes[:, 0] + boxes[:, 2] / 2
+            cy = boxes[:, 1] + boxes[:, 3] / 2
+            inside = np.zeros(len(boxes), dtype=bool)
+            for x, y, w, h in excluded:
+                inside |= (cx >= x) & (cx < x + w) & (cy >= y) & (cy < y + h)
+            boxes = boxes[~inside]
+        return suppress_overlaps(boxes)
+
+    def _detect_area(self, gray, area, detect_width, min_face=None):
+        """Run the cascade over one (x, y, w, h) area at detect_width px per frame width"""
+        x, y, w, h = area
+        scale = min(1.0, detect_width / gray.shape[1])
+        crop = gray[y:y + h, x:x + w]
+        small = crop if scale == 1.0 else cv2.resize(
+            crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        min_size = max(12, int((min_face or self.min_face) * scale))
+        boxes = self.face_cascade.detectMultiScale(
+            small, scaleFactor=1.2, minNeighbors=4, minSize=(min_size, min_size))
+        if len(boxes) == 0:
+            return np.empty((0, 4), dtype=np.int32)
+        boxes = np.round(np.asarray(boxes) / scale).astype(np.int32)
+        boxes[:, 0] += x
+        boxes[:, 1] += y
+        return boxes
+
+    def crop_faces(self, gray, boxes):
+        """Cut, resize and equalise the centre of every box into one (N, FACE_SIZE+2, FACE_SIZE+2) stack"""
+        size = FACE_SIZE + 2
+        faces = np.empty((len(boxes), size, size), dtype=np.uint8)
+        for i, (x, y, w, h) in enumerate(boxes):
+            x, y = x + int(w * (1 - FACE_CROP) / 2), y + int(h * (1 - FACE_CROP) / 2)
+            w, h = max(1, int(w * FACE_CROP)), max(1, int(h * FACE_CROP))
+            crop = gray[max(y, 0):y + h, max(x, 0):x + w]
+            faces[i] = cv2.equalizeHist(cv2.resize(crop, (size, size), interpolation=cv2.INTER_AREA))
+        return faces
+
+    def eyes_detected(self, faces):
+        """Cheap liveness hint: look for eyes in the upper half of each normalised crop"""
+        upper = faces[:, :faces.shape[1] // 2]
+        return [len(self.eye_cascade.detectMultiScale(face, 1.1, 3, minSize=(8, 8))) > 0
+                for face in upper]
+
+    def embed(self, gray, boxes):
+        return compute_embeddings(self.crop_faces(gray, boxes))
+
+    def enrollment_embeddings(self, gray, box):
+        """Gallery rows for one enrolment face: its box at every ENROLL_SCALES size"""
+        x, y, w, h = box
+        boxes = [(x - (int(w * scale) - w) // 2, y - (int(h * scale) - h) // 2, int(w * scale), int(h * scale))
+                 for scale in ENROLL_SCALES]
+        return self.embed(gray, np.array(boxes))
+
+    def best_matches(self, matcher, embeddings):
+        """Accepted user_id for each embedding (-1 if none) and its best score.
+
+        A match needs ``match_threshold`` and a lead of ``match_margin`` over
+        its rival: the best other student and the best background face,
+        whichever scores higher. A face that looks about as much like two
+        people is left unidentified rather than given to either, and one
+        that looks about as much like a stranger is taken for a stranger.
+        With no rival at all (a tiny roster and no background faces) there
+        is no evidence against a stranger, so nothing is accepted.
+        """
+        ids, scores = matcher.match(embeddings, k=MATCH_CANDIDATES)
+        if scores.shape[1] == 0:
+            return np.full(len(ids), -1, dtype=np.int64), np.zeros(len(ids), dtype=np.float32)
+        # Deleted rows, rows outside a course roster and the padding after a
+        # short result come back at -inf
+        live = np.isfinite(scores[:, 0])
+        best_ids, best = ids[:, 0], np.where(live, scores[:, 0], 0)
+        other = (ids != best_ids[:, None]) & np.isfinite(scores)
+        rival = np.where(other.any(axis=1), scores[np.arange(len(ids)), other.argmax(axis=1)], -np.inf)
+        # A full list of one student: the other students score below its last entry
+        full = (scores.shape[1] == MATCH_CANDIDATES) & np.isfinite(scores[:, -1])
+        rival = np.where(~other.any(axis=1) & full, scores[:, -1], rival)
+        rival = np.maximum(rival, self.background_scores(embeddings))
+        accepted = (live & np.isfinite(rival) & (best >= self.match_threshold)
+                    & (best - rival >= self.match_margin))
+        return np.where(accepted, best_ids, -1), best
+
+    def background_scores(self, embeddings):
+        """Best background-face score for each embedding, -inf without background faces"""
+        if self.background is None:
+            return np.full(len(embeddings), -np.inf, dtype=np.float32)
+        _, scores = self.background.match(embeddings, k=1)
+        if scores.shape[1] == 0:
+            return np.full(len(embeddings), -np.inf, dtype=np.float32)
+        return scores[:, 0]
+
+    def recognize(self, frame, matcher):
+        """Detect, embed and match every face in a frame.
+
+        ``matcher`` is anything with a ``match(embeddings, k)`` method: a
+        gallery, the ANN index or a course-scoped subset of it. Returns a
+        list of dicts with the box, accepted user_id (or None, see
+        best_matches), cosine score and eye check for each face.
+        """
+        return self.recognize_batch([frame], [matcher])[0]
+
+    def recognize_batch(self, frames, matchers):
+        """Recognize several frames at once, one matcher per frame.
+
+        Detection still runs per frame, but every face from every frame is
+        embedded as one stacked batch and each distinct matcher is queried
+        once with all of its faces.
+        """
+        grays = [self.to_gray(frame) for frame in frames]
+        return self.identify_batch(grays, [self.detect(gray) for gray in grays], matchers)
+
+    def identify_batch(self, grays, boxes, matchers):
+        """Embed and match already-detected boxes, one (boxes, matcher) per gray frame"""
+        counts = [len(b) for b in boxes]
+        if sum(counts) == 0:
+            return [[] for _ in grays]
+
+        with self.timer('embed'):
+            faces = np.concatenate([self.crop_faces(gray, b) for gray, b in zip(grays, boxes)])
+            embeddings = compute_embeddings(faces)
+            eyes = self.eyes_detected(faces)
+        owners = np.repeat(np.arange(len(grays)), counts)
+
+        user_ids = np.full(len(faces), -1, dtype=np.int64)
+        scores = np.zeros(len(faces), dtype=np.float32)
+        by_matcher = {}
+        for frame_index, matcher in enumerate(matchers):
+            by_matcher.setdefault(id(matcher), (matcher, []))[1].append(frame_index)
+        with self.timer('match'):
+            for matcher, frame_indices in by_matcher.values():
+                rows = np.flatnonzero(np.isin(owners, frame_indices))
+                if len(rows) == 0:
+                    continue
+                user_ids[rows], scores[rows] = self.best_matches(matcher, embeddings[rows])
+
+        results = [[] for _ in grays]
+        all_boxes = np.concatenate(boxes)
+        for i, box in enumerate(all_boxes):
+            score = float(scores[i])
+            results[owners[i]].append({
+                'location': tuple(int(v) for v in box),
+                'user_id': int(user_ids[i]) if user_ids[i] >= 0 else None,
+                'score': score,
+                'eyes_detected': eyes[i],
+            })
+        return results
@@ -0,0 +1,102 @@
+"""Cheap per-camera checks that decide whether a frame is worth recognizing.
+
+The frame is decoded straight to a small grayscale image (JPEG decoders
+scale down in the DCT domain, so this costs a fraction of a full decode)
+and put through three stages, cheapest first:
+
+* exposure: mean brightness outside [dark, bright] means nothing usable
+* blur: variance of the Laplacian below ``blur_threshold`` means motion
+  blur or a defocused camera
+* motion: share of pixels that changed by more than ``pixel_delta`` since
+  the last accepted frame of the same camera; below ``motion_threshold``
+  the room has not changed and the previous result still stands
+
+A static camera is still let through every ``max_static_age`` seconds so
+slow changes are never missed for long.
+"""
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+STAGES = ('undecodable', 'dark', 'bright', 'blurred', 'static')
+
+
+class FrameGate:
+    def __init__(self, width=160, dark=40.0, bright=220.0, blur_threshold=20.0,
+                 motion_threshold=0.005, pixel_delta=25, max_static_age=15.0, max_idle=300.0):
+        self.width = width
+        self.dark = dark
+        self.bright = bright
+        self.blur_threshold = blur_threshold
+        self.motion_threshold = motion_threshold
+        self.pixel_delta = pixel_delta
+        self.max_static_age = max_static_age
+        self.max_idle = max_idle
+        self._references = {}
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.passed = 0
+        self.rejected = dict.fromkeys(STAGES, 0)
+
+    def thumbnail(self, image_bytes):
+        """Decode encoded image bytes into a small grayscale frame"""
+        buffer = np.frombuffer(image_bytes, dtype=np.uint8)
+        if buffer.size == 0:
+            return None
+        small = cv2.imdecode(buffer, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+        if small is None:
+            return None
+        if small.shape[1] > self.width:
+            scale = self.width / small.shape[1]
+            small = cv2.resize(small, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return small
+
+    def check(self, camera_id, image_bytes):
+        """Return None if the frame should be recognized, else the rejecting stage"""
+        small = self.thumbnail(image_bytes)
+        reason = self._evaluate(camera_id, small)
+        with self._lock:
+            self.checked += 1
+            if reason is None:
+                self.passed += 1
+            else:
+                self.rejected[reason] += 1
+        return reason
+
+    def _evaluate(self, camera_id, small):
+        if small is None:
+            return 'undecodable'
+        brightness = float(small.mean())
+        if brightness < self.dark:
+            return 'dark'
+        if brightness > self.bright:
+            return 'bright'
+        if cv2.Laplacian(small, cv2.CV_32F).var() < self.blur_threshold:
+            return 'blurred'
+
+        smooth = cv2.GaussianBlur(small, (5, 5), 0)
+        now = time.monotonic()
+        with self._lock:
+            for key in [k for k, (_, seen) in self._references.items() if now - seen > self.max_idle]:
+                del self._references[key]
+            reference = self._references.get(camera_id)
+        if (reference is not None and reference[0].shape == smooth.shape
+                and now - reference[1] < self.max_static_age):
+            changed = np.count_nonzero(cv2.absdiff(smooth, reference[0]) > self.pixel_delta)
+            if changed < self.motion_threshold * smooth.size:
+                return 'static'
+        with self._lock:
+            self._references[camera_id] = (smooth, now)
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'checked': self.checked,
+                'passed': self.passed,
+                'rejected': dict(self.rejected),
+                'skip_rate': round(1 - self.passed / self.checked, 3) if self.checked else 0.0,
+            }
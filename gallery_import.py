@@ -0,0 +1,386 @@
+"""Bulk roster and face-gallery import.
+
+A roster CSV (name, student_id, email, phone and optionally username,
+password, course, photo) is upserted into ``users`` and ``enrollments``
+with executemany in batched transactions. Photos come from a directory
+or a zip, matched to students by file name (the student_id, username or
+the CSV ``photo`` column, without extension).
+
+New accounts get the CSV ``password`` or a random one, returned in the
+summary's ``credentials`` for the importer to hand out. An instructor's
+import only changes the details and photo of new accounts and of
+students already enrolled in one of that instructor's courses; other
+existing students are just enrolled.
+
+Every photo is hashed; ``face_photos`` remembers the hash last embedded
+for each student, so re-running an import only embeds new or changed
+photos. Embeddings are computed across a process pool and written to the
+gallery in large blocks, each followed by its ``face_photos`` rows, which
+makes an interrupted import safe to resume.
+
+import_background fills the separate background gallery: faces of people
+who are not enrolled, which recognition uses to reject strangers.
+"""
+
+import csv
+import hashlib
+import io
+import os
+import secrets
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from daily_stats import refresh_enrolled_counts
+from face_engine import FaceEngine, decode_image
+
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+UPSERT_STUDENT_SQL = '''
+    INSERT INTO users (username, password, role, name, email, student_id, phone)
+    VALUES (?, ?, 'student', ?, ?, ?, ?)
+    ON CONFLICT(username) DO UPDATE SET
+        name = excluded.name,
+        email = excluded.email,
+        student_id = excluded.student_id,
+        phone = excluded.phone
+    WHERE users.role = 'student'
+'''
+
+# Relies on the unique (student_id, course_id) enrollment index
+ENROLL_SQL = 'INSERT OR IGNORE INTO enrollments (student_id, course_id) VALUES (?, ?)'
+
+UPSERT_FACE_PHOTO_SQL = '''
+    INSERT INTO face_photos (user_id, sha256, source, has_face, updated_at)
+    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(user_id) DO UPDATE SET
+        sha256 = excluded.sha256,
+        source = excluded.source,
+        has_face = excluded.has_face,
+        updated_at = excluded.updated_at
+'''
+
+# Stay well under SQLite's bound-parameter limit in IN (...) lookups
+_LOOKUP_CHUNK = 500
+# Every background-gallery row belongs to this id; no student has it
+BACKGROUND_ID = 0
+
+_engine = None
+
+
+def _init_embed_worker():
+    global _engine
+    _engine = FaceEngine()
+
+
+def _embed_photo(image_bytes):
+    """Gallery rows for the largest face in a photo, or None if there is none"""
+    frame = decode_image(image_bytes)
+    if frame is None:
+        return None
+    gray = _engine.to_gray(frame)
+    boxes = _engine.detect(gray)
+    if len(boxes) == 0:
+        return None
+    return _engine.enrollment_embeddings(gray, boxes[np.argmax(boxes[:, 2] * boxes[:, 3])])
+
+
+class _Embedder:
+    """Embeds photos in this process, or across a process pool when workers > 1"""
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = None
+        if self.workers > 1:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_embed_worker)
+        else:
+            _init_embed_worker()
+
+    def embed(self, images):
+        """Gallery rows (or None) for each photo"""
+        if self._executor is None:
+            return [_embed_photo(image) for image in images]
+        return list(self._executor.map(_embed_photo, images,
+                                       chunksize=max(1, len(images) // (self.workers * 4))))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def read_roster(file):
+    """Parse a roster CSV (path or text file object) into (rows, errors)"""
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, newline='', encoding='utf-8-sig') as handle:
+            return read_roster(handle)
+    rows, errors = [], []
+    for line, record in enumerate(csv.DictReader(file), start=2):
+        record = {(key or '').strip().lower(): (value or '').strip() for key, value in record.items()}
+        if not record.get('name') or not record.get('student_id'):
+            errors.append(f"line {line}: name and student_id are required")
+            continue
+        record.setdefault('username', '')
+        rows.append(record)
+    return rows, errors
+
+
+class PhotoSource:
+    """Photos in a directory or zip archive, indexed by lower-case file stem"""
+
+    def __init__(self, path):
+        self.path = path
+        self.index = {}
+        if not zipfile.is_zipfile(path) and not os.path.isdir(path):
+            raise ValueError(f"{path} is neither a directory nor a zip archive")
+        self._zip = zipfile.ZipFile(path) if zipfile.is_zipfile(path) else None
+        if self._zip is not None:
+            names = [info.filename for info in self._zip.infolist() if not info.is_dir()]
+        else:
+            names = [os.path.join(root, name)
+                     for root, _, files in os.walk(path) for name in files]
+        for name in names:
+            stem, ext = os.path.splitext(os.path.basename(name))
+            if ext.lower() in PHOTO_EXTENSIONS and not stem.startswith('.'):
+                self.index.setdefault(stem.lower(), name)
+
+    def find(self, *keys):
+        for key in keys:
+            if key:
+                name = self.index.get(os.path.splitext(os.path.basename(key))[0].lower())
+                if name is not None:
+                    return name
+        return None
+
+    def read(self, name):
+        if self._zip is not None:
+            return self._zip.read(name)
+        with open(name, 'rb') as handle:
+            return handle.read()
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+
+
+def _course_ids(conn, instructor_id):
+    sql = 'SELECT id, code FROM courses'
+    params = ()
+    if instructor_id is not None:
+        sql += ' WHERE instructor_id = ?'
+        params = (instructor_id,)
+    return {row['code'].upper(): row['id'] for row in conn.execute(sql, params)}
+
+
+def _existing_usernames(conn, student_numbers):
+    """Usernames of students already registered under these student ids"""
+    usernames = {}
+    for chunk in _chunks(student_numbers, _LOOKUP_CHUNK):
+        usernames.update((row['student_id'], row['username']) for row in conn.execute(f'''
+            SELECT student_id, username FROM users
+            WHERE role = 'student' AND student_id IN ({', '.join('?' * len(chunk))})
+        ''', chunk))
+    return usernames
+
+
+def _existing_accounts(conn, usernames, instructor_id):
+    """Existing usernames mapped to whether this import may change the account"""
+    accounts = {}
+    for chunk in _chunks(usernames, _LOOKUP_CHUNK):
+        accounts.update((row['username'], bool(row['managed'])) for row in conn.execute(f'''
+            SELECT u.username, u.role = 'student' AND (? IS NULL OR EXISTS (
+                       SELECT 1 FROM enrollments e JOIN courses c ON c.id = e.course_id
+                       WHERE e.student_id = u.id AND c.instructor_id = ?)) AS managed
+            FROM users u
+            WHERE u.username IN ({', '.join('?' * len(chunk))})
+        ''', [instructor_id, instructor_id, *chunk]))
+    return accounts
+
+
+def _user_ids(conn, usernames):
+    ids = {}
+    for chunk in _chunks(usernames, _LOOKUP_CHUNK):
+        ids.update((row['username'], row['id']) for row in conn.execute(f'''
+            SELECT id, username FROM users
+            WHERE role = 'student' AND username IN ({', '.join('?' * len(chunk))})
+        ''', chunk))
+    return ids
+
+
+def import_roster(conn, store, rows, photos=None, course_id=None, instructor_id=None,
+                  workers=None, batch_size=1000, flush_rows=2048):
+    """Upsert roster rows, enroll them and embed their photos into store.
+
+    ``course_id`` enrolls every row; a ``course`` column (course code)
+    adds per-row enrollments. With ``instructor_id`` only that
+    instructor's courses are accepted, and existing students outside
+    them keep their details and photo. Returns a summary dict; its
+    ``courses`` entry lists every course id students were enrolled in
+    and ``credentials`` the (username, password) of new accounts.
+    """
+    summary = {
+        'rows': len(rows), 'students': 0, 'students_protected': 0, 'enrollments': 0,
+        'photos_found': 0, 'photos_unchanged': 0, 'photos_embedded': 0,
+        'photos_without_face': 0, 'photos_missing': 0, 'photos_protected': 0,
+        'courses': set(), 'user_ids': [], 'credentials': [], 'errors': [],
+    }
+    courses = _course_ids(conn, instructor_id)
+    if course_id is not None and int(course_id) not in courses.values():
+        raise ValueError(f"Unknown course {course_id}")
+
+    # Users and enrollments, one transaction per batch
+    user_ids = {}
+    protected = set()
+    for batch in _chunks(rows, batch_size):
+        # Rows without a username update the student already holding that
+        # student_id, and otherwise get the lower-cased student_id
+        existing = _existing_usernames(conn, [row['student_id'] for row in batch if not row['username']])
+        for row in batch:
+            row['username'] = row['username'] or existing.get(row['student_id'], row['student_id'].lower())
+        accounts = _existing_accounts(conn, [row['username'] for row in batch], instructor_id)
+        passwords = {}
+        for row in batch:
+            if row['username'] not in accounts and row['username'] not in passwords:
+                passwords[row['username']] = row.get('password') or secrets.token_urlsafe(9)
+                if not row.get('password'):
+                    summary['credentials'].append((row['username'], passwords[row['username']]))
+        with conn:
+            conn.executemany(UPSERT_STUDENT_SQL, [
+                (row['username'], passwords.get(row['username']) or secrets.token_urlsafe(9), row['name'],
+                 row.get('email') or None, row['student_id'], row.get('phone') or None)
+                for row in batch if accounts.get(row['username'], True)])
+            ids = _user_ids(conn, [row['username'] for row in batch])
+            protected.update(ids[username] for username, managed in accounts.items()
+                             if not managed and username in ids)
+            enrollments = []
+            for row in batch:
+                user_id = ids.get(row['username'])
+                if user_id is None:
+                    summary['errors'].append(f"{row['username']}: username belongs to a non-student")
+                    continue
+                targets = [int(course_id)] if course_id is not None else []
+                code = row.get('course', '').upper()
+                if code:
+                    if code in courses:
+                        targets.append(courses[code])
+                    else:
+                        summary['errors'].append(f"{row['username']}: unknown course {code}")
+                enrollments.extend((user_id, target) for target in targets)
+            before = conn.total_changes
+            conn.executemany(ENROLL_SQL, enrollments)
+            added = conn.total_changes - before
+            if added:
+                # Past sessions count the new students as absent, as a rebuild would
+                refresh_enrolled_counts(conn, {target for _, target in enrollments})
+            summary['enrollments'] += added
+            summary['courses'].update(target for _, target in enrollments)
+        user_ids.update(ids)
+    summary['students'] = len(user_ids)
+    summary['students_protected'] = len(protected)
+    summary['user_ids'] = sorted(user_ids.values())
+
+    if photos is not None:
+        _import_photos(conn, store, rows, user_ids, protected, photos, summary, workers, flush_rows)
+
+    summary['courses'] = sorted(summary['courses'])
+    return summary
+
+
+def _import_photos(conn, store, rows, user_ids, protected, photos, summary, workers, flush_rows):
+    # A photo is unchanged only if its face is still in the gallery; a
+    # gallery rebuilt for a new descriptor re-embeds every photo, and photos
+    # without a face (recorded by older builds) are tried and reported again
+    in_gallery = set(store.user_ids[store.valid].tolist())
+    known = {user_id: digest for user_id, digest, has_face in
+             conn.execute('SELECT user_id, sha256, has_face FROM face_photos').fetchall()
+             if has_face and user_id in in_gallery}
+
+    # A student listed twice gets the photo of their last row, like their details
+    latest = {}
+    for row in rows:
+        user_id = user_ids.get(row['username'])
+        if user_id is not None:
+            latest[user_id] = row
+
+    def changed_photos():
+        for user_id, row in latest.items():
+            if user_id in protected:
+                summary['photos_protected'] += 1
+                continue
+            name = photos.find(row.get('photo'), row['student_id'], row['username'])
+            if name is None:
+                summary['photos_missing'] += 1
+                continue
+            summary['photos_found'] += 1
+            data = photos.read(name)
+            digest = hashlib.sha256(data).hexdigest()
+            if known.get(user_id) == digest:
+                summary['photos_unchanged'] += 1
+                continue
+            yield user_id, name, digest, data
+
+    with _Embedder(workers) as embedder:
+        pending = []
+        for item in changed_photos():
+            pending.append(item)
+            if len(pending) >= flush_rows:
+                _embed_and_write(conn, store, pending, embedder, summary)
+                pending = []
+        _embed_and_write(conn, store, pending, embedder, summary)
+
+
+def import_background(store, photos, workers=None):
+    """Replace the background gallery with the faces in every photo of a PhotoSource.
+
+    Returns (photos, faces): how many photos were read and how many had a face.
+    """
+    names = sorted(photos.index.values())
+    with _Embedder(workers) as embedder:
+        embeddings = [rows for rows in embedder.embed([photos.read(name) for name in names]) if rows is not None]
+    store.remove_many([BACKGROUND_ID])
+    if embeddings:
+        rows = np.concatenate(embeddings)
+        store.add_many(np.full(len(rows), BACKGROUND_ID, dtype=np.int64), rows)
+    return len(names), len(embeddings)
+
+
+def _embed_and_write(conn, store, pending, embedder, summary):
+    """Embed a block of photos, then write gallery rows and their hashes.
+
+    A photo that cannot be read or shows no face is reported in the
+    summary's errors and not recorded: the student keeps any earlier
+    face, and the next import tries the photo again.
+    """
+    if not pending:
+        return
+    embeddings = embedder.embed([data for _, _, _, data in pending])
+
+    found = [(item, rows) for item, rows in zip(pending, embeddings) if rows is not None]
+    summary['errors'].extend(f"{os.path.basename(name)}: no face found" for (_, name, _, _), rows in zip(pending, embeddings)
+                             if rows is None)
+    if found:
+        # Drop earlier samples first so a resumed import never duplicates rows
+        store.remove_many([user_id for (user_id, _, _, _), _ in found])
+        store.add_many(np.concatenate([[user_id] * len(rows) for (user_id, _, _, _), rows in found]),
+                       np.concatenate([rows for _, rows in found]))
+    with conn:
+        conn.executemany(UPSERT_FACE_PHOTO_SQL, [
+            (user_id, digest, name, 1) for (user_id, name, digest, _), _ in found])
+    summary['photos_embedded'] += len(found)
+    summary['photos_without_face'] += len(pending) - len(found)
+
+
+def open_roster_upload(stream):
+    """Wrap an uploaded binary CSV stream for read_roster"""
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
@@ -0,0 +1,79 @@
+"""Gunicorn settings for serving the attendance system.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+WEB_CONCURRENCY worker processes (default: one per CPU) each serve
+WEB_THREADS requests at a time. The app is loaded in the master before
+the workers fork, so recognition runs on every core without loading the
+model once per worker.
+
+Each open dashboard or live-attendance page holds a thread for its
+event stream, so every worker gets LIVE_STREAM_LIMIT threads on top of
+WEB_THREADS and the app refuses streams beyond that limit (the browser
+retries later). Streams are also closed after LIVE_STREAM_MAX_AGE
+seconds and reconnect on their own. With the defaults a worker serves
+four streams and four other requests at once. A check-in recognized by
+one worker reaches streams open in the others through the live_events
+table within about twice LIVE_STREAM_SYNC_INTERVAL; workers only write
+events there for courses that such a stream is listening to.
+
+Every worker also owns RECOGNITION_WORKERS processes for queued frames
+(/api/recognize-frame/async). Their default is cpu_count // workers, at
+least one, so all workers together start about one per core rather than
+one per core each; the worker count is exported as WEB_CONCURRENCY for
+that. Set RECOGNITION_WORKERS explicitly only with the product
+workers x RECOGNITION_WORKERS in mind.
+
+``kill -HUP <master>`` re-reads this file and replaces the workers
+gracefully. On SIGTERM a worker closes its live streams and writes
+buffered check-ins at once, then finishes in-flight requests within
+GRACEFUL_TIMEOUT. Because the app is preloaded, new code needs USR2
+(start a second master) and then QUIT to the old one.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# main.py divides the cores between workers for its recognition pools
+os.environ['WEB_CONCURRENCY'] = str(workers)
+threads = int(os.environ.get('WEB_THREADS', 4)) + int(os.environ.get('LIVE_STREAM_LIMIT', 4))
+worker_class = 'gthread'
+preload_app = True
+# Seconds a worker gets to finish requests on reload or shutdown
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+timeout = int(os.environ.get('WORKER_TIMEOUT', 60))
+# Recycle workers after this many requests (0 = never)
+max_requests = int(os.environ.get('MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+accesslog = os.environ.get('ACCESS_LOG', '-')
+
+
+def post_fork(server, worker):
+    import cv2
+    from main import start_background_work
+    # One worker per core already uses every core; OpenCV's own thread
+    # pool on top of that only oversubscribes them
+    cv2.setNumThreads(int(os.environ.get('OPENCV_THREADS', 1)))
+    start_background_work()
+
+
+def post_worker_init(worker):
+    import signal
+    from main import begin_shutdown
+    handle_exit = worker.handle_exit
+
+    # Wraps gunicorn's own handler so nothing waits for graceful_timeout:
+    # a worker killed after it would otherwise lose buffered check-ins
+    def handle_exit_and_flush(sig, frame):
+        handle_exit(sig, frame)
+        begin_shutdown()
+
+    signal.signal(signal.SIGTERM, handle_exit_and_flush)
+    signal.siginterrupt(signal.SIGTERM, False)
+
+
+def worker_exit(server, worker):
+    from main import stop_background_work
+    stop_background_work()
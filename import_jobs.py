@@ -0,0 +1,149 @@
+"""Background import jobs, tracked in the database.
+
+A roster import with a photo archive embeds every photo and can take
+minutes, far longer than a web request should be held. The request only
+saves the upload and queues the work; ``ImportJobs`` runs it on one
+background thread per process (imports write the same face gallery, so
+they run one at a time) and records each job's status and result in
+``import_jobs``. Polls read that table, so any worker process can answer
+them, not just the one running the job.
+
+Parts of a result that must not stay on the server, such as the
+passwords of new accounts, are kept apart in ``import_jobs.secret`` and
+cleared by the first poll that returns them.
+"""
+
+import json
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+CREATE_IMPORT_JOBS_SQL = '''
+    CREATE TABLE IF NOT EXISTS import_jobs (
+        id TEXT PRIMARY KEY,
+        owner_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        status TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP
+    )
+'''
+
+
+class ImportJobs:
+    """Runs import callables in the background and records their outcome.
+
+    ``work()`` returns a JSON-serialisable result. A ValueError it raises
+    is reported as the job's error; anything else is logged and reported
+    as a generic failure. ``cleanup()``, if given, runs once the job is
+    over, e.g. to delete its uploaded files. Jobs still queued when the
+    process shuts down are marked failed.
+
+    Result keys named in ``once`` are only returned by the first ``get``
+    of the completed job; later ones leave them out.
+    """
+
+    def __init__(self, connect):
+        self.connect = connect
+        self._executor = None
+        self._pid = None
+        self._queued = {}
+        self._lock = threading.Lock()
+
+    def submit(self, owner_id, kind, work, cleanup=None, once=()):
+        """Queue work() and return the new job's id"""
+        job_id = uuid.uuid4().hex
+        self._execute('INSERT INTO import_jobs (id, owner_id, kind, status) VALUES (?, ?, ?, ?)',
+                      (job_id, int(owner_id), kind, 'queued'))
+        with self._lock:
+            # Threads do not survive fork; each worker starts its own
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='import')
+                self._pid = os.getpid()
+                self._queued = {}
+            self._queued[job_id] = cleanup
+            self._executor.submit(self._run, job_id, work, once)
+        return job_id
+
+    def get(self, job_id, owner_id):
+        """The job as a dict, or None if there is no such job for this owner"""
+        conn = self.connect()
+        try:
+            row = conn.execute('SELECT id, kind, status, result, error, secret FROM import_jobs '
+                               'WHERE id = ? AND owner_id = ?', (job_id, int(owner_id))).fetchone()
+            secret = None
+            if row is not None and row[5] is not None:
+                # Whichever poll clears the column hands the secret out
+                with conn:
+                    cleared = conn.execute('UPDATE import_jobs SET secret = NULL WHERE id = ? AND secret IS NOT NULL',
+                                           (job_id,)).rowcount
+                if cleared:
+                    secret = json.loads(row[5])
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        result = None if row[3] is None else json.loads(row[3])
+        if secret:
+            result.update(secret)
+        return {
+            'job_id': row[0],
+            'kind': row[1],
+            'status': row[2],
+            'result': result,
+            'error': row[4],
+        }
+
+    def shutdown(self):
+        """Wait for the running job and fail the ones that never started"""
+        with self._lock:
+            executor = self._executor if self._pid == os.getpid() else None
+            self._executor = None
+            self._pid = None
+        if executor is None:
+            return
+        executor.shutdown(cancel_futures=True)
+        with self._lock:
+            abandoned, self._queued = self._queued, {}
+        for job_id, cleanup in abandoned.items():
+            self._finish(job_id, 'failed', error='The server shut down before the import started')
+            if cleanup is not None:
+                cleanup()
+
+    def _run(self, job_id, work, once):
+        with self._lock:
+            cleanup = self._queued.pop(job_id, None)
+        try:
+            self._execute("UPDATE import_jobs SET status = 'running' WHERE id = ?", (job_id,))
+            result = work()
+        except ValueError as e:
+            self._finish(job_id, 'failed', error=str(e))
+        except Exception:
+            logger.exception('Import job %s failed', job_id)
+            self._finish(job_id, 'failed', error='Import failed')
+        else:
+            secret = {key: result.pop(key) for key in once if key in result}
+            self._finish(job_id, 'completed', result=result, secret=secret or None)
+        finally:
+            if cleanup is not None:
+                cleanup()
+
+    def _finish(self, job_id, status, result=None, error=None, secret=None):
+        self._execute('UPDATE import_jobs SET status = ?, result = ?, error = ?, secret = ?, '
+                      'finished_at = CURRENT_TIMESTAMP WHERE id = ?',
+                      (status, None if result is None else json.dumps(result), error,
+                       None if secret is None else json.dumps(secret), job_id))
+
+    def _execute(self, sql, params):
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute(sql, params)
+        finally:
+            conn.close()
@@ -0,0 +1,326 @@
+"""Live Server-Sent Events, shared between worker processes.
+
+Streams are served from the worker that accepted them, but check-ins are
+published by whichever worker recognized the face. With an ``EventLog``,
+each process with open streams keeps a heartbeat row per channel in
+``live_listeners`` and polls the ``live_events`` table for events
+published elsewhere, much as the stats cache shares invalidations. An
+event is only appended to the table while some other process is
+listening on its channel, so nothing is written when no stream is open.
+"""
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+CREATE_LIVE_EVENTS_SQL = '''
+    CREATE TABLE IF NOT EXISTS live_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        channel INTEGER NOT NULL,
+        message TEXT NOT NULL,
+        source TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )
+'''
+
+CREATE_LIVE_LISTENERS_SQL = '''
+    CREATE TABLE IF NOT EXISTS live_listeners (
+        source TEXT NOT NULL,
+        channel INTEGER NOT NULL,
+        seen_at REAL NOT NULL,
+        PRIMARY KEY (source, channel)
+    )
+'''
+
+
+class EventLog:
+    """Live events shared through the database.
+
+    ``append`` writes a batch of (channel, message) pairs; ``read``
+    returns the ones other processes appended since the last read. The
+    first read, and a read after ``reset``, only starts from the newest
+    row, so a process that had no streams does not replay old events.
+    Rows older than ``retention`` seconds are pruned.
+
+    ``listen`` records the channels this process has streams on, and
+    ``listeners`` returns the ones other processes have, re-read at most
+    every ``listener_refresh`` seconds. Heartbeats are rewritten every
+    third of ``listener_ttl`` and ignored once older than that, so a
+    process that died with streams open stops counting.
+    """
+
+    def __init__(self, connect, retention=60.0, listener_ttl=10.0, listener_refresh=0.5):
+        self.connect = connect
+        self.retention = retention
+        self.listener_ttl = listener_ttl
+        self.listener_refresh = listener_refresh
+        self._last_id = None
+        self._pruned = 0.0
+        self._source = None
+        self._pid = None
+        self._listening = frozenset()
+        self._heartbeat = 0.0
+        self._listeners = frozenset()
+        self._listeners_read = None
+        self._lock = threading.Lock()
+
+    @property
+    def source(self):
+        # A forked worker must not take its parent's events or streams for its own
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._source = uuid.uuid4().hex
+            self._last_id = None
+            self._listening = frozenset()
+            self._listeners_read = None
+        return self._source
+
+    def append(self, events):
+        now = time.time()
+        source = self.source
+        conn = self.connect()
+        try:
+            with conn:
+                conn.executemany('INSERT INTO live_events (channel, message, source, created_at) VALUES (?, ?, ?, ?)',
+                                 [(channel, message, source, now) for channel, message in events])
+                if now - self._pruned > self.retention / 2:
+                    self._pruned = now
+                    conn.execute('DELETE FROM live_events WHERE created_at < ?', (now - self.retention,))
+        finally:
+            conn.close()
+
+    def read(self):
+        source = self.source
+        with self._lock:
+            conn = self.connect()
+            try:
+                if self._last_id is None:
+                    self._last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM live_events').fetchone()[0]
+                    return []
+                rows = conn.execute('SELECT id, channel, message, source FROM live_events WHERE id > ? '
+                                    'ORDER BY id', (self._last_id,)).fetchall()
+            finally:
+                conn.close()
+            if rows:
+                self._last_id = rows[-1][0]
+        return [(channel, message) for _, channel, message, owner in rows if owner != source]
+
+    def reset(self):
+        with self._lock:
+            self._last_id = None
+
+    def listen(self, channels):
+        """Record that this process has streams on channels; an empty set withdraws it"""
+        channels = frozenset(channels)
+        source = self.source
+        now = time.time()
+        if channels == self._listening and (not channels or now - self._heartbeat < self.listener_ttl / 3):
+            return
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM live_listeners WHERE source = ? OR seen_at < ?',
+                             (source, now - self.listener_ttl))
+                conn.executemany('INSERT INTO live_listeners (source, channel, seen_at) VALUES (?, ?, ?)',
+                                 [(source, channel, now) for channel in channels])
+        finally:
+            conn.close()
+        self._listening, self._heartbeat = channels, now
+
+    def listeners(self):
+        """Channels with streams open in other processes"""
+        source = self.source
+        now = time.monotonic()
+        if self._listeners_read is None or now - self._listeners_read >= self.listener_refresh:
+            conn = self.connect()
+            try:
+                rows = conn.execute('SELECT DISTINCT channel FROM live_listeners WHERE source != ? AND seen_at >= ?',
+                                    (source, time.time() - self.listener_ttl)).fetchall()
+            finally:
+                conn.close()
+            self._listeners, self._listeners_read = frozenset(row[0] for row in rows), now
+        return self._listeners
+
+
+class LiveBroadcaster:
+    """Pub/sub feeding Server-Sent Event streams.
+
+    Every open stream owns a bounded queue subscribed to one or more
+    channels (course ids). Publishing never blocks: a subscriber that has
+    stopped reading simply loses events once its queue is full.
+
+    With ``relay``, an EventLog, a channel also has subscribers when a
+    stream in another process listens to it; only those channels' events
+    are queued for the log. A background thread runs while this process
+    has streams open or events queued: every ``relay_interval`` seconds
+    it writes the queued events, refreshes this process's listener
+    heartbeats and delivers other processes' events to local streams.
+
+    A stream occupies a server thread for as long as it is open, so each
+    one ends after ``max_age`` seconds and the browser's EventSource
+    reconnects. At most ``max_streams`` are open at once; further
+    requests get an empty stream that asks the browser to retry after
+    ``busy_retry`` seconds. ``close()`` ends every open stream, e.g. when
+    the worker is shutting down.
+    """
+
+    def __init__(self, max_queue=100, heartbeat=15.0, max_age=None, max_streams=None, busy_retry=30.0,
+                 relay=None, relay_interval=0.5, max_outbox=1000):
+        self.max_queue = max_queue
+        self.heartbeat = heartbeat
+        self.max_age = max_age
+        self.max_streams = max_streams
+        self.busy_retry = busy_retry
+        self.relay = relay
+        self.relay_interval = relay_interval
+        self.max_outbox = max_outbox
+        self._subscribers = {}
+        self._streams = 0
+        self._outbox = []
+        self._relay_pid = None
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+
+    def open_streams(self):
+        return self._streams
+
+    def has_subscribers(self, channel):
+        return bool(self._subscribers.get(channel)) or self._relayed(channel)
+
+    def _relayed(self, channel):
+        if self.relay is None:
+            return False
+        try:
+            return channel in self.relay.listeners()
+        except sqlite3.Error:
+            logger.exception('Live event relay failed')
+            return False
+
+    def subscribe(self, channels):
+        events = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(events)
+        self._start_relay()
+        return events
+
+    def unsubscribe(self, channels, events):
+        with self._lock:
+            for channel in channels:
+                listeners = self._subscribers.get(channel)
+                if listeners:
+                    listeners.discard(events)
+                    if not listeners:
+                        del self._subscribers[channel]
+
+    def publish(self, channel, event, data):
+        message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        self._deliver(channel, message)
+        if self._relayed(channel):
+            with self._lock:
+                self._outbox.append((channel, message))
+                # Live events are only worth anything fresh; drop the oldest
+                del self._outbox[:-self.max_outbox]
+            self._start_relay()
+
+    def _deliver(self, channel, message):
+        for events in list(self._subscribers.get(channel, ())):
+            try:
+                events.put_nowait(message)
+            except queue.Full:
+                pass
+
+    def _start_relay(self):
+        if self.relay is None or self._closed.is_set():
+            return
+        with self._lock:
+            # Threads do not survive fork; each worker starts its own
+            if self._relay_pid == os.getpid():
+                return
+            self._relay_pid = os.getpid()
+        threading.Thread(target=self._run_relay, daemon=True).start()
+
+    def _run_relay(self):
+        while not self._closed.wait(self.relay_interval):
+            try:
+                self._sync()
+            except sqlite3.Error:
+                logger.exception('Live event relay failed')
+            with self._lock:
+                # Idle: the next stream or relayed event starts a new thread
+                if not self._subscribers and not self._outbox:
+                    self._relay_pid = None
+                    return
+
+    def _sync(self):
+        with self._lock:
+            outbox, self._outbox = self._outbox, []
+            channels = set(self._subscribers)
+        if outbox:
+            self.relay.append(outbox)
+        self.relay.listen(channels)
+        if not channels:
+            self.relay.reset()
+            return
+        for channel, message in self.relay.read():
+            self._deliver(channel, message)
+
+    def close(self):
+        """End every open stream, refuse new ones and hand pending events to the relay"""
+        self._closed.set()
+        with self._lock:
+            outbox, self._outbox = self._outbox, []
+        if self.relay is not None:
+            try:
+                if outbox:
+                    self.relay.append(outbox)
+                self.relay.listen(())
+            except sqlite3.Error:
+                logger.exception('Live event relay failed')
+        with self._lock:
+            listeners = {events for subscribers in self._subscribers.values() for events in subscribers}
+        for events in listeners:
+            try:
+                events.put_nowait(None)
+            except queue.Full:
+                # A full queue is drained by its stream, which checks _closed
+                pass
+
+    def stream(self, channels):
+        """Generator of SSE messages for a response body"""
+        with self._lock:
+            busy = self._closed.is_set() or (self.max_streams is not None and self._streams >= self.max_streams)
+            if not busy:
+                self._streams += 1
+        if busy:
+            yield f"retry: {int(self.busy_retry * 1000)}\n\n"
+            return
+        events = self.subscribe(channels)
+        deadline = time.monotonic() + self.max_age if self.max_age else None
+        try:
+            yield "retry: 3000\n\n"
+            while not self._closed.is_set():
+                timeout = self.heartbeat
+                if deadline is not None:
+                    timeout = min(timeout, deadline - time.monotonic())
+                    if timeout <= 0:
+                        break
+                try:
+                    message = events.get(timeout=timeout)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle stream
+                    message = ": keep-alive\n\n"
+                if message is None:
+                    break
+                yield message
+        finally:
+            self.unsubscribe(channels, events)
+            with self._lock:
+                self._streams -= 1
@@ -1,270 +1,793 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file
-import sqlite3
+import click
+import csv
+from flask import Flask, render_template, request, jsonify, session, redirect, Response, g, has_request_context
 from datetime import datetime, timedelta
 import json
-import cv2
 import numpy as np
-import base64
-from io import BytesIO
-from PIL import Image
 import os
 import random
-import csv
-from werkzeug.utils import secure_filename
+import atexit
+import io
+import tempfile
+
+from ann_index import IVFIndex
+from attendance_recorder import AttendanceRecorder, SessionPresence, UPSERT_ATTENDANCE_SQL
+from cache import InvalidationLog, TTLCache
+from daily_stats import rebuild_daily_stats, refresh_daily_stats
+from db import ConnectionPool
+from query_plans import find_table_scans
+from queries import (ATTENDANCE_HISTORY_CURSOR, ATTENDANCE_HISTORY_SQL, ATTENDANCE_RECORDS_SQL,
+                     COURSE_ENROLLED_SQL, COURSE_HISTORY_SQL, COURSE_PRESENT_TODAY_SQL,
+                     COURSE_ROSTERS_SQL, COURSE_STUDENTS_SQL, INSTRUCTOR_COURSES_SQL,
+                     INSTRUCTOR_STUDENT_TOTALS_SQL, INSTRUCTOR_STUDENTS_CURSOR, INSTRUCTOR_STUDENTS_SQL,
+                     INSTRUCTOR_TODAY_ATTENDANCE_SQL, INSTRUCTOR_TOTAL_STUDENTS_SQL, PRESENT_STUDENTS_SQL,
+                     STUDENT_ATTENDANCE_CURSOR, STUDENT_ATTENDANCE_SQL, STUDENT_ATTENDANCE_TOTALS_SQL,
+                     STUDENT_COURSES_SQL, STUDENT_ENROLLMENT_SQL)
+from embedding_store import EmbeddingStore
+from exports import gzip_stream, stream_attendance_csv
+from face_engine import DetectionRegions, FaceEngine, decode_image, image_bytes
+from frame_gate import FrameGate
+from gallery_import import PhotoSource, import_background, import_roster, open_roster_upload, read_roster
+from import_jobs import ImportJobs
+from live_events import EventLog, LiveBroadcaster
+from metrics import Metrics
+from migrations import migrate
+from pagination import clamp_page_size, decode_cursor, fetch_page
+from profiler import SlowRequestProfiler
+from recognition_pool import RecognitionPool
+from tracker import TrackerRegistry
+from reports import build_attendance_report
 
 app = Flask(__name__)
 app.secret_key = 'face-attendance-secret-2024'
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
+app.config['DATABASE'] = os.environ.get('ATTENDANCE_DB', 'attendance.db')
+app.config['FACE_INDEX_PATH'] = os.environ.get('FACE_INDEX_PATH', 'face_index')
+# Faces of people who are not enrolled; a face is only recognized as a
+# student if it looks clearly more like them than like any of these
+app.config['FACE_BACKGROUND_PATH'] = os.environ.get(
+    'FACE_BACKGROUND_PATH', os.path.join(app.config['FACE_INDEX_PATH'], 'background'))
+# ANN search knobs: cells (0 = sqrt of gallery size), cells probed per query,
+# and the gallery size below which an exact scan is used instead
+app.config['ANN_NLIST'] = int(os.environ.get('ANN_NLIST', 0))
+app.config['ANN_NPROBE'] = int(os.environ.get('ANN_NPROBE', 8))
+app.config['ANN_MIN_ROWS'] = int(os.environ.get('ANN_MIN_ROWS', 20000))
+app.config['MAX_BATCH_FRAMES'] = int(os.environ.get('MAX_BATCH_FRAMES', 16))
+# Asynchronous recognition: worker processes per web process, pending-frame
+# limit and the age (seconds) after which a queued frame is skipped instead
+# of processed. By default the WEB_CONCURRENCY web processes share the cores.
+app.config['RECOGNITION_WORKERS'] = int(os.environ.get(
+    'RECOGNITION_WORKERS', max(1, (os.cpu_count() or 1) // int(os.environ.get('WEB_CONCURRENCY', 1)))))
+app.config['RECOGNITION_QUEUE_DEPTH'] = int(os.environ.get('RECOGNITION_QUEUE_DEPTH', 32))
+app.config['RECOGNITION_MAX_FRAME_AGE'] = float(os.environ.get('RECOGNITION_MAX_FRAME_AGE', 5.0))
+# Recognized check-ins are buffered and written together on this interval
+# (seconds) or once this many distinct rows are waiting
+app.config['ATTENDANCE_FLUSH_INTERVAL'] = float(os.environ.get('ATTENDANCE_FLUSH_INTERVAL', 0.5))
+app.config['ATTENDANCE_FLUSH_BATCH'] = int(os.environ.get('ATTENDANCE_FLUSH_BATCH', 256))
+# Live event streams each hold a server thread while open: they end after
+# LIVE_STREAM_MAX_AGE seconds (the browser reconnects) and at most
+# LIVE_STREAM_LIMIT are open per process (gunicorn.conf.py adds that many
+# threads so streams never take the ones serving check-ins)
+app.config['LIVE_STREAM_MAX_AGE'] = float(os.environ.get('LIVE_STREAM_MAX_AGE', 300))
+app.config['LIVE_STREAM_LIMIT'] = int(os.environ.get('LIVE_STREAM_LIMIT', 4))
+# Seconds between exchanges of live events with other worker processes
+# (through the live_events table, and only for courses that a stream in
+# another process is listening to, per the live_listeners table)
+app.config['LIVE_STREAM_SYNC_INTERVAL'] = float(os.environ.get('LIVE_STREAM_SYNC_INTERVAL', 0.5))
+# Dashboard/stats cache. Writes invalidate entries in this process at once
+# and in the other worker processes within CACHE_SYNC_INTERVAL (through the
+# cache_invalidations table); the TTL bounds changes made outside the app.
+app.config['CACHE_TTL'] = float(os.environ.get('CACHE_TTL', 5.0))
+app.config['CACHE_SIZE'] = int(os.environ.get('CACHE_SIZE', 2048))
+# Seconds between checks for invalidations made by other worker processes;
+# each check is a query, so 0 (check on every cache read) costs one per read
+app.config['CACHE_SYNC_INTERVAL'] = float(os.environ.get('CACHE_SYNC_INTERVAL', 0.5))
+# Per-camera face tracking: box overlap that continues a track, matching
+# embeddings needed to trust its identity, and frames between re-checks
+app.config['TRACK_IOU_THRESHOLD'] = float(os.environ.get('TRACK_IOU_THRESHOLD', 0.3))
+app.config['TRACK_CONFIRM_HITS'] = int(os.environ.get('TRACK_CONFIRM_HITS', 2))
+app.config['TRACK_REVERIFY_FRAMES'] = int(os.environ.get('TRACK_REVERIFY_FRAMES', 20))
+# Frame pre-filter: share of changed pixels that counts as motion, minimum
+# Laplacian variance (sharpness), and seconds after which a static camera
+# is recognized again anyway. FRAME_GATE=0 turns the filter off.
+app.config['FRAME_GATE'] = os.environ.get('FRAME_GATE', '1') == '1'
+app.config['FRAME_GATE_MOTION'] = float(os.environ.get('FRAME_GATE_MOTION', 0.005))
+app.config['FRAME_GATE_BLUR'] = float(os.environ.get('FRAME_GATE_BLUR', 20.0))
+app.config['FRAME_GATE_MAX_STATIC_AGE'] = float(os.environ.get('FRAME_GATE_MAX_STATIC_AGE', 15.0))
+# Roster/photo imports: embedding processes and photos per gallery write
+app.config['IMPORT_WORKERS'] = int(os.environ.get('IMPORT_WORKERS', os.cpu_count() or 1))
+app.config['IMPORT_FLUSH_ROWS'] = int(os.environ.get('IMPORT_FLUSH_ROWS', 2048))
+# Request/stage/SQL metrics at /metrics (METRICS=0 turns them off), an
+# optional Server-Timing header with each response's breakdown, and a
+# bearer token required by /metrics when set
+app.config['METRICS'] = os.environ.get('METRICS', '1') == '1'
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', '0') == '1'
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+# Sampling profiler: PROFILE_SLOW_REQUESTS=1 samples every request's stack
+# each PROFILE_INTERVAL_MS and keeps collapsed stacks of those slower than
+# PROFILE_THRESHOLD_MS in PROFILE_DIR, capped at PROFILE_MAX_MB. It is the
+# deployment's opt-in: only then can /api/profiler pause it or change the
+# threshold (saved settings override these two), and without it requests
+# skip the profiler entirely
+app.config['PROFILE_SLOW_REQUESTS'] = os.environ.get('PROFILE_SLOW_REQUESTS', '0') == '1'
+app.config['PROFILE_THRESHOLD_MS'] = float(os.environ.get('PROFILE_THRESHOLD_MS', 500))
+app.config['PROFILE_INTERVAL_MS'] = float(os.environ.get('PROFILE_INTERVAL_MS', 10))
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', 'profiles')
+app.config['PROFILE_MAX_MB'] = float(os.environ.get('PROFILE_MAX_MB', 50))
+
+metrics = Metrics(enabled=app.config['METRICS'])
+db_pool = ConnectionPool(app.config['DATABASE'],
+                         on_query=metrics.observe_query if metrics.enabled else None)
+profiler = SlowRequestProfiler(app.config['PROFILE_DIR'],
+                               threshold=app.config['PROFILE_THRESHOLD_MS'] / 1000,
+                               interval=app.config['PROFILE_INTERVAL_MS'] / 1000,
+                               max_bytes=int(app.config['PROFILE_MAX_MB'] * 1024 * 1024),
+                               enabled=app.config['PROFILE_SLOW_REQUESTS'])
+stats_cache = TTLCache(maxsize=app.config['CACHE_SIZE'], ttl=app.config['CACHE_TTL'],
+                       sync=InvalidationLog(db_pool.acquire, interval=app.config['CACHE_SYNC_INTERVAL']))
 
 # Utility functions - DEFINED FIRST
 def get_db_connection():
-    conn = sqlite3.connect('attendance.db')
-    conn.row_factory = sqlite3.Row
+    """Borrow a pooled connection; close() returns it to the pool"""
+    conn = db_pool.acquire()
+    if has_request_context():
+        # Remembered so teardown can reclaim it if a route forgets close()
+        g.setdefault('db_connections', []).append(conn)
     return conn
 
-def init_db():
-    # Remove existing database to start fresh
-    if os.path.exists('attendance.db'):
-        os.remove('attendance.db')
+@app.before_request
+def start_request_metrics():
+    metrics.begin_request(request.endpoint)
+
+@app.after_request
+def finish_request_metrics(response):
+    breakdown = metrics.end_request(response.status_code)
+    if breakdown is not None and app.config['SERVER_TIMING']:
+        response.headers['Server-Timing'] = metrics.server_timing(breakdown)
+    return response
+
+@app.teardown_request
+def abandon_request_metrics(exception=None):
+    # Only still open if the view raised before after_request ran
+    metrics.end_request(500)
+
+def get_profiler_settings():
+    """Profiler settings last saved through /api/profiler, or None (cached)"""
+    def load():
+        conn = get_db_connection()
+        row = conn.execute("SELECT value FROM app_settings WHERE name = 'profiler'").fetchone()
+        conn.close()
+        return json.loads(row['value']) if row else None
     
+    return stats_cache.get_or_set(('app_settings', 'profiler'), load, tags=[('app_settings', 'profiler')])
+
+@app.before_request
+def start_profiling():
+    if not app.config['PROFILE_SLOW_REQUESTS']:
+        return
+    # Settings changed in any worker reach this one with the cache invalidation
+    settings = get_profiler_settings()
+    if settings is not None:
+        profiler.enabled = settings['enabled']
+        profiler.threshold = settings['threshold_ms'] / 1000
+    profiler.start_request(f"{request.method} {request.endpoint or request.path}")
+
+@app.teardown_request
+def finish_profiling(exception=None):
+    if app.config['PROFILE_SLOW_REQUESTS']:
+        profiler.end_request()
+
+@app.teardown_appcontext
+def release_db_connections(exception=None):
+    for conn in g.pop('db_connections', []):
+        conn.close()
+
+def init_db():
+    """Bring the schema up to date; existing data is never touched"""
+    conn = get_db_connection()
+    applied = migrate(conn)
+    conn.close()
+    if applied:
+        print(f"✅ Applied schema migrations {', '.join(map(str, applied))}")
+
+def seed_demo_data():
+    """Insert the demo instructor, students, courses and attendance into an empty database"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            role TEXT NOT NULL,
-            name TEXT NOT NULL,
-            email TEXT,
-            student_id TEXT,
-            phone TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Courses table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS courses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            code TEXT UNIQUE NOT NULL,
-            name TEXT NOT NULL,
-            instructor_id INTEGER,
-            schedule TEXT,
-            room TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (instructor_id) REFERENCES users (id)
-        )
-    ''')
-    
-    # Enrollments table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS enrollments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            student_id INTEGER,
-            course_id INTEGER,
-            enrolled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (student_id) REFERENCES users (id),
-            FOREIGN KEY (course_id) REFERENCES courses (id)
-        )
-    ''')
-    
-    # Attendance table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS attendance (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            student_id INTEGER,
-            course_id INTEGER,
-            date TEXT NOT NULL,
-            status TEXT NOT NULL,
-            timestamp TEXT NOT NULL,
-            recognized_confidence REAL,
-            method TEXT DEFAULT 'auto',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (student_id) REFERENCES users (id),
-            FOREIGN KEY (course_id) REFERENCES courses (id)
-        )
-    ''')
-    
-    # Insert sample data
     cursor.execute("SELECT COUNT(*) FROM users")
-    if cursor.fetchone()[0] == 0:
-        # Add sample instructor
+    if cursor.fetchone()[0] > 0:
+        conn.close()
+        return False
+    
+    # Add sample instructor
+    cursor.execute('''
+        INSERT INTO users (username, password, role, name, email, phone)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', ('professor', 'password', 'instructor', 'Dr. Sarah Johnson', 's.johnson@university.edu', '+1-555-0101'))
+    
+    # Add sample students
+    students = [
+        ('student1', 'password', 'student', 'Alice Chen', 'alice.chen@student.edu', 'S1001', '+1-555-0102'),
+        ('student2', 'password', 'student', 'Bob Rodriguez', 'bob.rodriguez@student.edu', 'S1002', '+1-555-0103'),
+        ('student3', 'password', 'student', 'Carol Williams', 'carol.williams@student.edu', 'S1003', '+1-555-0104'),
+        ('student4', 'password', 'student', 'David Kim', 'david.kim@student.edu', 'S1004', '+1-555-0105'),
+        ('student5', 'password', 'student', 'Eva Martinez', 'eva.martinez@student.edu', 'S1005', '+1-555-0106'),
+    ]
+    
+    for student in students:
         cursor.execute('''
-            INSERT INTO users (username, password, role, name, email, phone)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', ('professor', 'password', 'instructor', 'Dr. Sarah Johnson', 's.johnson@university.edu', '+1-555-0101'))
-        
-        # Add sample students
-        students = [
-            ('student1', 'password', 'student', 'Alice Chen', 'alice.chen@student.edu', 'S1001', '+1-555-0102'),
-            ('student2', 'password', 'student', 'Bob Rodriguez', 'bob.rodriguez@student.edu', 'S1002', '+1-555-0103'),
-            ('student3', 'password', 'student', 'Carol Williams', 'carol.williams@student.edu', 'S1003', '+1-555-0104'),
-            ('student4', 'password', 'student', 'David Kim', 'david.kim@student.edu', 'S1004', '+1-555-0105'),
-            ('student5', 'password', 'student', 'Eva Martinez', 'eva.martinez@student.edu', 'S1005', '+1-555-0106'),
-        ]
-        
-        for student in students:
-            cursor.execute('''
-                INSERT INTO users (username, password, role, name, email, student_id, phone)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', student)
-        
-        # Add sample courses
-        courses = [
-            ('CAP5178', 'Human-Computer Interaction', 1, 'Mon/Wed 10:00-11:30', 'Room 301'),
-            ('CIS4930', 'Advanced HCI', 1, 'Tue/Thu 14:00-15:30', 'Room 205'),
-        ]
-        
-        for course in courses:
-            cursor.execute('''
-                INSERT INTO courses (code, name, instructor_id, schedule, room)
-                VALUES (?, ?, ?, ?, ?)
-            ''', course)
+            INSERT INTO users (username, password, role, name, email, student_id, phone)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', student)
+    
+    # Add sample courses
+    courses = [
+        ('CAP5178', 'Human-Computer Interaction', 1, 'Mon/Wed 10:00-11:30', 'Room 301'),
+        ('CIS4930', 'Advanced HCI', 1, 'Tue/Thu 14:00-15:30', 'Room 205'),
+    ]
+    
+    for course in courses:
+        cursor.execute('''
+            INSERT INTO courses (code, name, instructor_id, schedule, room)
+            VALUES (?, ?, ?, ?, ?)
+        ''', course)
+    
+    # Enroll students in courses
+    for student_id in range(2, 7):  # Students 2-6
+        cursor.execute('''
+            INSERT INTO enrollments (student_id, course_id)
+            VALUES (?, ?)
+        ''', (student_id, 1))  # All in CAP5178
         
-        # Enroll students in courses
-        for student_id in range(2, 7):  # Students 2-6
+        if student_id <= 5:  # Some in CIS4930
             cursor.execute('''
                 INSERT INTO enrollments (student_id, course_id)
                 VALUES (?, ?)
-            ''', (student_id, 1))  # All in CAP5178
-            
-            if student_id <= 5:  # Some in CIS4930
+            ''', (student_id, 2))
+    
+    # Add sample attendance records
+    today = datetime.now()
+    for i in range(5):
+        date = (today - timedelta(days=i)).strftime('%Y-%m-%d')
+        for student_id in range(2, 7):
+            if random.random() > 0.2:  # 80% attendance rate
                 cursor.execute('''
-                    INSERT INTO enrollments (student_id, course_id)
-                    VALUES (?, ?)
-                ''', (student_id, 2))
-        
-        # Add sample attendance records
-        today = datetime.now()
-        for i in range(5):
-            date = (today - timedelta(days=i)).strftime('%Y-%m-%d')
-            for student_id in range(2, 7):
-                if random.random() > 0.2:  # 80% attendance rate
-                    cursor.execute('''
-                        INSERT INTO attendance (student_id, course_id, date, status, timestamp, recognized_confidence, method)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        student_id, 1, date, 'present',
-                        f"{random.randint(9, 11)}:{random.randint(10, 59)}:{random.randint(10, 59)}",
-                        random.uniform(85.0, 98.0), 'auto'
-                    ))
+                    INSERT INTO attendance (student_id, course_id, date, status, timestamp, recognized_confidence, method)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    student_id, 1, date, 'present',
+                    f"{random.randint(9, 11)}:{random.randint(10, 59)}:{random.randint(10, 59)}",
+                    random.uniform(85.0, 98.0), 'auto'
+                ))
+    
+    rebuild_daily_stats(conn)
     
     conn.commit()
     conn.close()
-    print("✅ Database initialized successfully!")
+    return True
+
+@app.cli.command('seed-demo')
+@click.option('--reset', is_flag=True, help='Delete the database first (destroys all data)')
+def seed_demo_command(reset):
+    """Load the demo accounts and sample attendance into an empty database"""
+    if reset:
+        db_pool.close_all()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(app.config['DATABASE'] + suffix):
+                os.remove(app.config['DATABASE'] + suffix)
+        stats_cache.clear()
+    init_db()
+    if seed_demo_data():
+        print("✅ Demo data loaded")
+    else:
+        print("⚠️ Database already has users; nothing seeded (use --reset to start over)")
 
 def mark_attendance(student_id, course_id, confidence=None, method='auto'):
+    """Mark a student present right away (used by manual override)"""
     conn = get_db_connection()
-    cursor = conn.cursor()
     
-    today = datetime.now().strftime('%Y-%m-%d')
-    current_time = datetime.now().strftime('%H:%M:%S')
+    now = datetime.now()
+    today = now.strftime('%Y-%m-%d')
+    with metrics.stage('db_write'), conn:
+        conn.execute(UPSERT_ATTENDANCE_SQL, (
+            student_id, course_id, today, now.strftime('%H:%M:%S'), confidence, method
+        ))
+        record_attendance_writes(conn, [(course_id, today)])
     
-    # Check if already marked today
-    cursor.execute('''
-        SELECT id FROM attendance 
-        WHERE student_id = ? AND course_id = ? AND date = ?
-    ''', (student_id, course_id, today))
-    
-    existing = cursor.fetchone()
-    if existing:
-        # Update existing record
-        cursor.execute('''
-            UPDATE attendance 
-            SET status = 'present', timestamp = ?, recognized_confidence = ?, method = ?
-            WHERE id = ?
-        ''', (current_time, confidence, method, existing['id']))
-    else:
-        # Insert new record
-        cursor.execute('''
-            INSERT INTO attendance (student_id, course_id, date, status, timestamp, recognized_confidence, method)
-            VALUES (?, ?, ?, 'present', ?, ?, ?)
-        ''', (student_id, course_id, today, current_time, confidence, method))
-    
-    conn.commit()
     conn.close()
+    invalidate_attendance([(course_id, today)])
+    session_presence.claim(course_id, [int(student_id)], now)
+
+def get_course_instructor(course_id):
+    """Get the instructor id that owns a course (cached)"""
+    def load():
+        conn = get_db_connection()
+        row = conn.execute('SELECT instructor_id FROM courses WHERE id = ?', (course_id,)).fetchone()
+        conn.close()
+        return row['instructor_id'] if row else None
+    return stats_cache.get_or_set(('course_instructor', int(course_id)), load)
+
+def attendance_tags(keys):
+    """Cache tags of the stats and dashboards affected by attendance writes"""
+    tags = set()
+    for course_id, date in keys:
+        tags.add(('course', int(course_id), date))
+        tags.add(('instructor_day', get_course_instructor(course_id), date))
+    return tags
+
+def record_attendance_writes(conn, keys):
+    """Refresh daily stats and log cache invalidations in the attendance write's transaction"""
+    refresh_daily_stats(conn, keys)
+    stats_cache.log_invalidations(conn, attendance_tags(keys))
+
+def invalidate_attendance(keys):
+    """Drop this process's cached stats once record_attendance_writes has committed"""
+    stats_cache.invalidate_tags(*attendance_tags(keys), publish=False)
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any hot attendance query plans a full table SCAN"""
+    init_db()
+    conn = get_db_connection()
+    scans = find_table_scans(conn)
+    conn.close()
+    for name, step in scans:
+        print(f"❌ {name}: {step}")
+    if scans:
+        raise SystemExit(1)
+    print("✅ All hot queries use index searches")
+
+@app.cli.command('rebuild-daily-stats')
+def rebuild_daily_stats_command():
+    """Recompute course_daily_stats from raw attendance rows"""
+    init_db()
+    conn = get_db_connection()
+    with conn:
+        rows = rebuild_daily_stats(conn)
+    conn.close()
+    print(f"✅ Rebuilt {rows} course/day summary rows")
+
+@app.cli.command('build-report')
+@click.argument('instructor_id', type=int)
+@click.argument('output', type=click.Path(dir_okay=False))
+@click.option('--start', help='First date to include (YYYY-MM-DD)')
+@click.option('--end', help='Last date to include (YYYY-MM-DD)')
+def build_report_command(instructor_id, output, start, end):
+    """Write the bulk attendance report for an instructor to a .npz file"""
+    init_db()
+    conn = get_db_connection()
+    report = build_attendance_report(conn, instructor_id, start=start, end=end)
+    conn.close()
+    report.save(output)
+    print(f"✅ Wrote {len(report.courses['course_id'])} courses, "
+          f"{len(report.students['student_id'])} enrollments to {output}")
+
+@app.cli.command('import-roster')
+@click.argument('roster', type=click.Path(exists=True, dir_okay=False))
+@click.option('--photos', type=click.Path(exists=True), help='Directory or .zip of photos named by student_id')
+@click.option('--course-id', type=int, help='Enroll every student in this course')
+@click.option('--workers', type=int, help='Embedding processes (default IMPORT_WORKERS)')
+@click.option('--credentials', type=click.Path(dir_okay=False),
+              help='Write the generated passwords of new accounts to this CSV instead of printing them')
+def import_roster_command(roster, photos, course_id, workers, credentials):
+    """Upsert students from a roster CSV and embed their photos"""
+    init_db()
+    rows, errors = read_roster(roster)
+    source = PhotoSource(photos) if photos else None
+    conn = get_db_connection()
+    try:
+        summary = import_roster(conn, face_system.gallery, rows, photos=source, course_id=course_id,
+                                workers=workers or app.config['IMPORT_WORKERS'],
+                                flush_rows=app.config['IMPORT_FLUSH_ROWS'])
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        conn.close()
+        if source is not None:
+            source.close()
+    finish_roster_import(summary)
+    for error in errors + summary['errors']:
+        print(f"⚠️ {error}")
+    print(f"✅ {summary['students']} students, {summary['enrollments']} new enrollments, "
+          f"{summary['photos_embedded']} photos embedded "
+          f"({summary['photos_unchanged']} unchanged, {summary['photos_without_face']} without a face, "
+          f"{summary['photos_missing']} missing)")
+    if summary['credentials'] and credentials:
+        with open(credentials, 'w', newline='') as f:
+            csv.writer(f).writerows([('username', 'password'), *summary['credentials']])
+        print(f"🔑 {len(summary['credentials'])} new account passwords written to {credentials}")
+    else:
+        for username, password in summary['credentials']:
+            print(f"🔑 {username} / {password}")
+
+@app.cli.command('import-background')
+@click.argument('photos', type=click.Path(exists=True))
+@click.option('--workers', type=int, help='Embedding processes (default IMPORT_WORKERS)')
+def import_background_command(photos, workers):
+    """Replace the background faces with the photos in a directory or .zip.
+
+    Use photos of people who are not enrolled (a few hundred, taken like
+    the classroom cameras see faces); recognition rejects any face that
+    looks about as much like one of them as like its best student.
+    """
+    try:
+        source = PhotoSource(photos)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    try:
+        read, found = import_background(face_system.background, source,
+                                        workers=workers or app.config['IMPORT_WORKERS'])
+    finally:
+        source.close()
+    print(f"✅ {found} background faces from {read} photos ({read - found} without a face)")
+
+def finish_roster_import(summary):
+    """Drop cached names, rosters and instructor views a roster import changed"""
+    face_system.forget_students(summary['user_ids'])
+    tags = set()
+    for course_id in summary['courses']:
+        tags.add(('enrollments', course_id))
+        tags.add(('instructor', get_course_instructor(course_id)))
+    stats_cache.invalidate_tags(*tags)
 
 def get_course_stats(course_id):
-    """Get comprehensive course statistics"""
+    """Get comprehensive course statistics (cached until the next check-in)"""
+    course_id = int(course_id)
+    today = datetime.now().strftime('%Y-%m-%d')
+    return stats_cache.get_or_set(('course_stats', course_id, today),
+                                  lambda: compute_course_stats(course_id, today),
+                                  tags=[('course', course_id, today), ('enrollments', course_id)])
+
+def compute_course_stats(course_id, today):
     conn = get_db_connection()
     
     # Total enrolled students
-    total_students = conn.execute('''
-        SELECT COUNT(*) FROM enrollments WHERE course_id = ?
-    ''', (course_id,)).fetchone()[0]
+    total_students = conn.execute(COURSE_ENROLLED_SQL, (course_id,)).fetchone()[0]
     
-    # Today's attendance
-    today = datetime.now().strftime('%Y-%m-%d')
-    today_present = conn.execute('''
-        SELECT COUNT(DISTINCT student_id) FROM attendance 
-        WHERE course_id = ? AND date = ? AND status = 'present'
-    ''', (course_id, today)).fetchone()[0]
+    # Today's attendance and the per-session history, from the daily summary
+    today_row = conn.execute(COURSE_PRESENT_TODAY_SQL, (course_id, today)).fetchone()
+    today_present = today_row['present_count'] if today_row else 0
+    
+    history = conn.execute(COURSE_HISTORY_SQL, (course_id,)).fetchone()
     
     conn.close()
     
     return {
         'total_students': total_students,
         'today_present': today_present,
-        'attendance_rate': round((today_present / total_students * 100) if total_students > 0 else 0, 1)
+        'attendance_rate': round((today_present / total_students * 100) if total_students > 0 else 0, 1),
+        'avg_attendance': f"{round(history['avg_rate'] or 0, 1)}%",
+        'total_classes': history['total_classes']
     }
 
-# Face Detection System - SIMPLIFIED VERSION
+def get_course_rosters(course_ids):
+    """Get the enrolled student ids for several courses in one query"""
+    course_ids = list({int(course_id) for course_id in course_ids})
+    rosters = {course_id: [] for course_id in course_ids}
+    if not course_ids:
+        return rosters
+    conn = get_db_connection()
+    rows = conn.execute(COURSE_ROSTERS_SQL.format(placeholders=', '.join('?' * len(course_ids))),
+                        course_ids).fetchall()
+    conn.close()
+    for row in rows:
+        rosters[row['course_id']].append(row['student_id'])
+    return rosters
+
+def get_course_roster(course_id):
+    """Get the user ids of every student enrolled in a course"""
+    return get_course_rosters([course_id])[int(course_id)]
+
+# Face Detection System
 class FaceDetectionSystem:
-    """Simple face detection system for demo"""
-    
-    def __init__(self):
-        self.student_data = {
-            2: {'name': 'Alice Chen', 'student_id': 'S1001'},
-            3: {'name': 'Bob Rodriguez', 'student_id': 'S1002'},
-            4: {'name': 'Carol Williams', 'student_id': 'S1003'},
-            5: {'name': 'David Kim', 'student_id': 'S1004'},
-            6: {'name': 'Eva Martinez', 'student_id': 'S1005'}
-        }
+    """Face recognition backed by the CPU pipeline in face_engine"""
+    
+    def __init__(self, index_path, background_path, nlist=0, nprobe=8, min_rows=20000,
+                 tracker_options=None, timer=None):
+        # Names and student numbers, looked up the first time a user is matched
+        self.student_data = {}
+        self.background = EmbeddingStore(background_path)
+        self.engine = FaceEngine(timer=timer, background=self.background)
+        self.timer = self.engine.timer
+        # Maps the persistent gallery instead of recomputing embeddings
+        self.gallery = EmbeddingStore(index_path)
+        self.index = IVFIndex(self.gallery, nlist=nlist, nprobe=nprobe, min_rows=min_rows)
+        self.trackers = TrackerRegistry(**(tracker_options or {}))
+    
+    def matcher_for(self, course_id=None, roster=None):
+        """Search only the course roster when a course is known, else the ANN index"""
+        if course_id is None:
+            return self.index
+        if roster is None:
+            roster = get_course_roster(course_id)
+        return self.index.for_candidates(roster)
+    
+    def warm_up(self):
+        """Build the ANN index, page in the gallery and run the detector once"""
+        self.index.sync()
+        np.asarray(self.gallery.matrix).sum()
+        self.engine.detect(np.zeros((self.engine.detect_width, self.engine.detect_width), dtype=np.uint8))
+        if len(self.background) == 0:
+            print(f"⚠️ No background faces in {self.background.path}: strangers can only be told apart "
+                  "from students in large rosters (see 'flask import-background')")
+    
+    def load_students(self, user_ids):
+        """Fill student_data for user ids not looked up yet, in one query"""
+        missing = list({user_id for user_id in user_ids
+                        if user_id is not None and user_id not in self.student_data})
+        if not missing:
+            return
+        conn = get_db_connection()
+        rows = conn.execute(f'''
+            SELECT id, name, student_id FROM users
+            WHERE role = 'student' AND id IN ({', '.join('?' * len(missing))})
+        ''', missing).fetchall()
+        conn.close()
+        # Unknown ids are remembered as None so they are not queried every frame
+        self.student_data.update(dict.fromkeys(missing))
+        for row in rows:
+            self.student_data[row['id']] = {'name': row['name'], 'student_id': row['student_id']}
+    
+    def forget_students(self, user_ids):
+        """Drop cached names so the next match reloads them"""
+        for user_id in user_ids:
+            self.student_data.pop(user_id, None)
+    
+    def describe(self, matches, timestamp):
+        """Turn engine matches into the recognized-face dicts the API returns"""
+        self.load_students([match['user_id'] for match in matches])
+        recognized_faces = []
+        for match in matches:
+            student = self.student_data.get(match['user_id'])
+            if student is None:
+                continue
+            recognized_faces.append({
+                'user_id': match['user_id'],
+                'name': student['name'],
+                'student_id': student['student_id'],
+                'confidence': round(match['score'] * 100, 1),
+                'location': match['location'],
+                'eyes_detected': match['eyes_detected'],
+                'timestamp': timestamp
+            })
+        return recognized_faces
+    
+    def recognize(self, frames, matchers, camera_ids):
+        """Detect faces in every frame, embedding only those no camera track vouches for.
+
+        Frames with a camera_id go through that camera's tracker; frames
+        without one are embedded in full.
+        """
+        with self.timer('detect'):
+            grays = [self.engine.to_gray(frame) for frame in frames]
+            boxes = [self.engine.detect(gray, get_camera_regions(camera_id))
+                     for gray, camera_id in zip(grays, camera_ids)]
+        trackers = [None if camera_id is None else self.trackers.get(camera_id) for camera_id in camera_ids]
+        
+        tracks, needs, pending = [], [], []
+        for tracker, frame_boxes in zip(trackers, boxes):
+            if tracker is None:
+                tracks.append(None)
+                needs.append(None)
+                pending.append(frame_boxes)
+                continue
+            with tracker.lock:
+                frame_tracks = tracker.associate(frame_boxes)
+                frame_needs = np.array([tracker.needs_embedding(t) for t in frame_tracks], dtype=bool)
+            tracks.append(frame_tracks)
+            needs.append(frame_needs)
+            pending.append(frame_boxes[frame_needs])
+        
+        identified = self.engine.identify_batch(grays, pending, matchers)
+        
+        results = []
+        for tracker, frame_tracks, frame_needs, matches in zip(trackers, tracks, needs, identified):
+            if tracker is None:
+                results.append(matches)
+                continue
+            fresh = iter(matches)
+            with tracker.lock:
+                for track, needed in zip(frame_tracks, frame_needs):
+                    if needed:
+                        tracker.observe(track, next(fresh))
+            self.trackers.count(len(frame_tracks), len(matches))
+            results.append([track.as_match() for track in frame_tracks])
+        return results
+    
+    def detect_faces(self, image_data, course_id=None, camera_id=None):
+        """Detect and recognize enrolled students in a frame"""
+        try:
+            with self.timer('decode'):
+                frame = decode_image(image_data)
+            if frame is None:
+                return []
+            matches = self.recognize([frame], [self.matcher_for(course_id)], [camera_id])[0]
+        except Exception as e:
+            print(f"Face detection error: {e}")
+            return []
+        
+        return self.describe(matches, datetime.now().strftime('%H:%M:%S'))
     
-    def detect_faces(self, image_data):
-        """Simulate face detection for demo"""
+    def detect_faces_batch(self, frames):
+        """Recognize a list of (image_data, course_id, camera_id) frames in one stacked pass"""
+        timestamp = datetime.now().strftime('%H:%M:%S')
+        results = [[] for _ in frames]
         try:
-            # Simulate processing time
-            import time
-            time.sleep(1)
+            with self.timer('decode'):
+                decoded = [decode_image(image_data) for image_data, _, _ in frames]
+            valid = [i for i, frame in enumerate(decoded) if frame is not None]
             
-            # Return 0-2 random recognitions
-            num_faces = random.randint(0, 2)
-            recognized_faces = []
-            
-            for i in range(num_faces):
-                student_id = random.choice(list(self.student_data.keys()))
-                recognized_faces.append({
-                    'user_id': student_id,
-                    'name': self.student_data[student_id]['name'],
-                    'student_id': self.student_data[student_id]['student_id'],
-                    'confidence': round(random.uniform(85.0, 98.0), 1),
-                    'location': (100 + i*50, 100, 200, 200),
-                    'eyes_detected': True,
-                    'timestamp': datetime.now().strftime('%H:%M:%S')
-                })
-            
-            return recognized_faces
+            # One roster query and one matcher per distinct course in the batch
+            course_ids = {frames[i][1] for i in valid}
+            rosters = get_course_rosters([c for c in course_ids if c is not None])
+            matchers = {course_id: self.matcher_for(
+                            course_id, None if course_id is None else rosters[int(course_id)])
+                        for course_id in course_ids}
             
+            matches = self.recognize([decoded[i] for i in valid],
+                                     [matchers[frames[i][1]] for i in valid],
+                                     [frames[i][2] for i in valid])
         except Exception as e:
             print(f"Face detection error: {e}")
-            # Return demo data for testing
-            return [{
-                'user_id': 2,
-                'name': 'Alice Chen', 
-                'student_id': 'S1001',
-                'confidence': 92.3,
-                'location': (100, 100, 200, 200),
-                'eyes_detected': True,
-                'timestamp': datetime.now().strftime('%H:%M:%S')
-            }]
-
-# Initialize database and face system
-init_db()
-face_system = FaceDetectionSystem()
+            return results
+        
+        for i, frame_matches in zip(valid, matches):
+            results[i] = self.describe(frame_matches, timestamp)
+        return results
+
+def get_camera_regions(camera_id):
+    """The camera's DetectionRegions, or None to search the whole frame (cached)"""
+    if camera_id is None:
+        return None
+    
+    def load():
+        conn = get_db_connection()
+        row = conn.execute('SELECT config FROM camera_regions WHERE camera_id = ?',
+                           (camera_id,)).fetchone()
+        conn.close()
+        return DetectionRegions.from_dict(json.loads(row['config'])) if row else None
+    
+    return stats_cache.get_or_set(('camera_regions', camera_id), load,
+                                  tags=[('camera_regions', camera_id)])
+
+def serialize_recognitions(recognized_faces):
+    return [{
+        'user_id': face['user_id'],
+        'name': face['name'],
+        'student_id': face['student_id'],
+        'confidence': face['confidence'],
+        'eyes_detected': face['eyes_detected'],
+        'timestamp': face['timestamp']
+    } for face in recognized_faces]
+
+def record_recognitions(recognized_faces, course_id, method='auto'):
+    """Buffer check-ins for recognized faces and push them to live listeners"""
+    if course_id is None:
+        return
+    # Students already present today need no further writes or pushes
+    new_ids = set(session_presence.claim(course_id, [face['user_id'] for face in recognized_faces]))
+    checkins = [face for face in recognized_faces if face['user_id'] in new_ids]
+    for face in checkins:
+        attendance_recorder.record(face['user_id'], course_id, face['confidence'], method)
+    # Stats follow once the recorder has flushed (see publish_course_stats)
+    publish_checkins(course_id, checkins, with_stats=False)
+
+def load_present_students(course_id, date):
+    conn = get_db_connection()
+    rows = conn.execute(PRESENT_STUDENTS_SQL, (course_id, date)).fetchall()
+    conn.close()
+    return [row['student_id'] for row in rows]
+
+def publish_checkins(course_id, recognized_faces, with_stats=True):
+    """Send check-ins (and refreshed course stats) to open live streams"""
+    course_id = int(course_id)
+    if not recognized_faces or not live_events.has_subscribers(course_id):
+        return
+    live_events.publish(course_id, 'recognition', {
+        'course_id': course_id,
+        'recognized_faces': serialize_recognitions(recognized_faces)
+    })
+    if with_stats:
+        live_events.publish(course_id, 'stats', dict(get_course_stats(course_id), course_id=course_id))
+
+def publish_course_stats(flushed):
+    """Recorder flush hook: invalidate caches and push fresh stats for courses that just got check-ins"""
+    invalidate_attendance(flushed)
+    today = datetime.now().strftime('%Y-%m-%d')
+    for course_id in {course_id for course_id, date in flushed if date == today}:
+        if live_events.has_subscribers(course_id):
+            live_events.publish(course_id, 'stats', dict(get_course_stats(course_id), course_id=course_id))
+
+def finish_recognition_job(job, matches):
+    """Runs in the web process when a pool worker returns a frame's matches"""
+    recognized_faces = face_system.describe(matches, datetime.now().strftime('%H:%M:%S'))
+    record_recognitions(recognized_faces, job.course_id)
+    return {'recognized_faces': serialize_recognitions(recognized_faces)}
+
+# Shared components; bootstrap() migrates and warms them up and
+# start_background_work() starts the check-in flush thread
+live_events = LiveBroadcaster(max_age=app.config['LIVE_STREAM_MAX_AGE'],
+                              max_streams=app.config['LIVE_STREAM_LIMIT'],
+                              relay=EventLog(db_pool.acquire,
+                                             listener_refresh=app.config['LIVE_STREAM_SYNC_INTERVAL']),
+                              relay_interval=app.config['LIVE_STREAM_SYNC_INTERVAL'])
+session_presence = SessionPresence(load_present_students)
+frame_gate = FrameGate(motion_threshold=app.config['FRAME_GATE_MOTION'],
+                       blur_threshold=app.config['FRAME_GATE_BLUR'],
+                       max_static_age=app.config['FRAME_GATE_MAX_STATIC_AGE'])
+attendance_recorder = AttendanceRecorder(get_db_connection,
+                                         flush_interval=app.config['ATTENDANCE_FLUSH_INTERVAL'],
+                                         max_batch=app.config['ATTENDANCE_FLUSH_BATCH'],
+                                         write_hook=record_attendance_writes,
+                                         on_flush=publish_course_stats,
+                                         timer=metrics.stage)
+face_system = FaceDetectionSystem(app.config['FACE_INDEX_PATH'], app.config['FACE_BACKGROUND_PATH'],
+                                  nlist=app.config['ANN_NLIST'],
+                                  nprobe=app.config['ANN_NPROBE'],
+                                  min_rows=app.config['ANN_MIN_ROWS'],
+                                  tracker_options={
+                                      'iou_threshold': app.config['TRACK_IOU_THRESHOLD'],
+                                      'confirm_hits': app.config['TRACK_CONFIRM_HITS'],
+                                      'reverify_frames': app.config['TRACK_REVERIFY_FRAMES'],
+                                  },
+                                  timer=metrics.stage)
+recognition_pool = RecognitionPool(app.config['FACE_INDEX_PATH'], app.config['FACE_BACKGROUND_PATH'],
+                                   workers=app.config['RECOGNITION_WORKERS'],
+                                   max_pending=app.config['RECOGNITION_QUEUE_DEPTH'],
+                                   max_age=app.config['RECOGNITION_MAX_FRAME_AGE'],
+                                   on_result=finish_recognition_job,
+                                   nlist=app.config['ANN_NLIST'],
+                                   nprobe=app.config['ANN_NPROBE'],
+                                   min_rows=app.config['ANN_MIN_ROWS'])
+import_jobs = ImportJobs(db_pool.acquire)
+
+# Read at scrape time from the components that already keep these figures
+metrics.gauge('attendance_cache_entries', 'Entries in the stats cache',
+              lambda: stats_cache.stats()['size'])
+metrics.gauge('attendance_cache_lookups_total', 'Stats cache lookups by result',
+              lambda: {'hit': stats_cache.stats()['hits'], 'miss': stats_cache.stats()['misses']},
+              labels=('result',), kind='counter')
+metrics.gauge('attendance_recognition_queue_depth', 'Asynchronous recognition jobs waiting or running',
+              lambda: {state: recognition_pool.stats()[state] for state in ('pending', 'in_flight')},
+              labels=('state',))
+metrics.gauge('attendance_recognition_jobs_total', 'Asynchronous recognition jobs by outcome',
+              lambda: {status: count for status, count in recognition_pool.stats().items()
+                       if status not in ('pending', 'in_flight', 'workers')},
+              labels=('status',), kind='counter')
+metrics.gauge('attendance_live_streams', 'Open live event streams', live_events.open_streams)
+metrics.gauge('attendance_recorder_pending', 'Buffered check-ins not yet written',
+              attendance_recorder.pending)
+metrics.gauge('attendance_frame_gate_frames_total', 'Frames checked by the frame gate by outcome',
+              lambda: dict(frame_gate.stats()['rejected'], passed=frame_gate.stats()['passed']),
+              labels=('result',), kind='counter')
+
+def bootstrap():
+    """Get the process ready to serve: migrate the schema and load the face model and gallery.
+    
+    Safe to call before forking workers: it starts no threads and leaves no
+    database connection open, so forked workers share the loaded model
+    copy-on-write and open their own connections.
+    """
+    init_db()
+    face_system.warm_up()
+    db_pool.close_all()
+
+def start_background_work():
+    """Start this process's check-in flush thread; stopped again at exit"""
+    attendance_recorder.start()
+    atexit.register(stop_background_work)
+
+def begin_shutdown():
+    """Close live streams and write buffered check-ins as soon as shutdown starts"""
+    live_events.close()
+    attendance_recorder.flush()
+
+def stop_background_work():
+    """Write buffered check-ins, finish the running import and shut down the recognition processes"""
+    attendance_recorder.stop()
+    import_jobs.shutdown()
+    recognition_pool.shutdown()
 
 # Routes
 @app.route('/')
@@ -313,85 +836,117 @@ def instructor_dashboard():
     if session.get('role') != 'instructor':
         return redirect('/')
     
+    today = datetime.now().strftime('%Y-%m-%d')
+    instructor_id = session['user_id']
+    dashboard = stats_cache.get_or_set(
+        ('instructor_dashboard', instructor_id, today),
+        lambda: load_instructor_dashboard(instructor_id, today),
+        tags=[('instructor_day', instructor_id, today), ('instructor', instructor_id)])
+    
+    return render_template('instructor/dashboard.html',
+                         courses=dashboard['courses'],
+                         total_students=dashboard['total_students'],
+                         today_attendance=dashboard['today_attendance'],
+                         name=session.get('name'),
+                         now=datetime.now())
+
+def load_instructor_dashboard(instructor_id, today):
     conn = get_db_connection()
     
-    # Get instructor's courses with stats
-    courses = conn.execute('''
-        SELECT c.*, 
-               COUNT(DISTINCT e.student_id) as enrolled_count
-        FROM courses c
-        LEFT JOIN enrollments e ON c.id = e.course_id
-        WHERE c.instructor_id = ?
-        GROUP BY c.id
-    ''', (session['user_id'],)).fetchall()
+    # Get instructor's courses with today's rate from the daily summary
+    courses = conn.execute(INSTRUCTOR_COURSES_SQL, (today, instructor_id)).fetchall()
     
     # Get overall statistics
-    total_students = conn.execute('''
-        SELECT COUNT(DISTINCT student_id) FROM enrollments 
-        WHERE course_id IN (SELECT id FROM courses WHERE instructor_id = ?)
-    ''', (session['user_id'],)).fetchone()[0]
+    total_students = conn.execute(INSTRUCTOR_TOTAL_STUDENTS_SQL, (instructor_id,)).fetchone()[0]
     
-    today = datetime.now().strftime('%Y-%m-%d')
-    today_attendance = conn.execute('''
-        SELECT COUNT(DISTINCT student_id) FROM attendance 
-        WHERE date = ? AND course_id IN (
-            SELECT id FROM courses WHERE instructor_id = ?
-        )
-    ''', (today, session['user_id'])).fetchone()[0]
+    today_attendance = conn.execute(INSTRUCTOR_TODAY_ATTENDANCE_SQL, (today, instructor_id)).fetchone()[0]
     
     conn.close()
     
-    return render_template('instructor/dashboard.html',
-                         courses=courses,
-                         total_students=total_students,
-                         today_attendance=today_attendance,
-                         name=session.get('name'),
-                         now=datetime.now())
+    return {
+        'courses': courses,
+        'total_students': total_students,
+        'today_attendance': today_attendance
+    }
 
 @app.route('/instructor/courses')
 def instructor_courses():
     if session.get('role') != 'instructor':
         return redirect('/')
     
-    conn = get_db_connection()
-    courses = conn.execute('''
-        SELECT c.*, COUNT(DISTINCT e.student_id) as student_count
-        FROM courses c
-        LEFT JOIN enrollments e ON c.id = e.course_id
-        WHERE c.instructor_id = ?
-        GROUP BY c.id
-        ORDER BY c.created_at DESC
-    ''', (session['user_id'],)).fetchall()
-    conn.close()
+    instructor_id = session['user_id']
+    
+    def load():
+        conn = get_db_connection()
+        courses = conn.execute('''
+            SELECT c.*, COUNT(DISTINCT e.student_id) as student_count
+            FROM courses c
+            LEFT JOIN enrollments e ON c.id = e.course_id
+            WHERE c.instructor_id = ?
+            GROUP BY c.id
+            ORDER BY c.created_at DESC
+        ''', (instructor_id,)).fetchall()
+        conn.close()
+        return courses
+    
+    courses = stats_cache.get_or_set(('instructor_courses', instructor_id), load,
+                                     tags=[('instructor', instructor_id)])
     
     return render_template('instructor/courses.html',
                          courses=courses,
                          name=session.get('name'))
 
+def page_args(width):
+    """Read the cursor and limit query args; raises ValueError on a bad cursor"""
+    return (decode_cursor(request.args.get('cursor'), width),
+            clamp_page_size(request.args.get('limit')))
+
+def load_instructor_students(instructor_id, cursor, limit):
+    """One page of the instructor's students in (name, id) order"""
+    def load():
+        conn = get_db_connection()
+        
+        after = INSTRUCTOR_STUDENTS_CURSOR if cursor else ''
+        students, next_cursor = fetch_page(
+            conn, INSTRUCTOR_STUDENTS_SQL.format(after=after),
+            [instructor_id] + list(cursor or ()),
+            limit, lambda row: (row['name'], row['id']))
+        
+        conn.close()
+        return students, next_cursor
+    
+    return stats_cache.get_or_set(('instructor_students', instructor_id, cursor, limit), load,
+                                  tags=[('instructor', instructor_id)])
+
+def load_instructor_student_totals(instructor_id):
+    """Roster counts over all pages"""
+    def load():
+        conn = get_db_connection()
+        totals = conn.execute(INSTRUCTOR_STUDENT_TOTALS_SQL, (instructor_id,)).fetchone()
+        conn.close()
+        return dict(totals)
+    
+    return stats_cache.get_or_set(('instructor_student_totals', instructor_id), load,
+                                  tags=[('instructor', instructor_id)])
+
 @app.route('/instructor/students')
 def instructor_students():
     if session.get('role') != 'instructor':
         return redirect('/')
     
-    conn = get_db_connection()
-    
-    # Get all students with their enrollment info
-    students = conn.execute('''
-        SELECT u.*, 
-               GROUP_CONCAT(c.name, ', ') as courses,
-               COUNT(DISTINCT c.id) as course_count
-        FROM users u
-        JOIN enrollments e ON u.id = e.student_id
-        JOIN courses c ON e.course_id = c.id
-        WHERE u.role = 'student' AND c.instructor_id = ?
-        GROUP BY u.id
-        ORDER BY u.name
-    ''', (session['user_id'],)).fetchall()
+    instructor_id = session['user_id']
+    try:
+        cursor, limit = page_args(2)
+    except ValueError:
+        return redirect(request.path)
     
-    conn.close()
+    students, next_cursor = load_instructor_students(instructor_id, cursor, limit)
     
     return render_template('instructor/students.html',
                          students=students,
+                         totals=load_instructor_student_totals(instructor_id),
+                         next_cursor=next_cursor,
+                         paged=cursor is not None,
                          name=session.get('name'))
 
 @app.route('/instructor/live-attendance/<int:course_id>')
@@ -415,20 +970,11 @@ def live_attendance(course_id):
         return redirect('/instructor/dashboard')
     
     # Get enrolled students
-    students = conn.execute('''
-        SELECT u.id, u.name, u.student_id, u.email
-        FROM users u
-        JOIN enrollments e ON u.id = e.student_id
-        WHERE e.course_id = ? AND u.role = 'student'
-        ORDER BY u.name
-    ''', (course_id,)).fetchall()
+    students = conn.execute(COURSE_STUDENTS_SQL, (course_id,)).fetchall()
     
     # Get today's attendance
     today = datetime.now().strftime('%Y-%m-%d')
-    present_students = conn.execute('''
-        SELECT student_id FROM attendance 
-        WHERE course_id = ? AND date = ? AND status = 'present'
-    ''', (course_id, today)).fetchall()
+    present_students = conn.execute(PRESENT_STUDENTS_SQL, (course_id, today)).fetchall()
     present_ids = [row['student_id'] for row in present_students]
     
     conn.close()
@@ -439,11 +985,22 @@ def live_attendance(course_id):
                          present_students=present_ids,
                          today=today)
 
+def load_attendance_history(conn, course_id, cursor, limit):
+    """One page of session summaries, newest first; the date is the key"""
+    before = ATTENDANCE_HISTORY_CURSOR if cursor else ''
+    return fetch_page(conn, ATTENDANCE_HISTORY_SQL.format(before=before),
+                      [course_id] + list(cursor or ()), limit, lambda row: (row['date'],))
+
 @app.route('/instructor/attendance-history/<int:course_id>')
 def attendance_history(course_id):
     if session.get('role') != 'instructor':
         return redirect('/')
     
+    try:
+        cursor, limit = page_args(1)
+    except ValueError:
+        return redirect(request.path)
+    
     conn = get_db_connection()
     
     course = conn.execute('''
@@ -455,22 +1012,43 @@ def attendance_history(course_id):
         conn.close()
         return redirect('/instructor/dashboard')
     
-    # Get attendance dates with stats
-    dates = conn.execute('''
-        SELECT date, 
-               COUNT(DISTINCT student_id) as present_count
-        FROM attendance 
-        WHERE course_id = ? 
-        GROUP BY date 
-        ORDER BY date DESC
-        LIMIT 30
-    ''', (course_id,)).fetchall()
+    # Get attendance dates with stats from the daily summary
+    dates, next_cursor = load_attendance_history(conn, course_id, cursor, limit)
     
     conn.close()
     
     return render_template('instructor/attendance-history.html',
                          course=course,
-                         dates=dates)
+                         dates=dates,
+                         next_cursor=next_cursor,
+                         paged=cursor is not None)
+
+@app.route('/api/attendance-history/<int:course_id>')
+def api_attendance_history(course_id):
+    """JSON pages of /instructor/attendance-history; pass next_cursor back as ?cursor="""
+    if session.get('role') != 'instructor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    try:
+        cursor, limit = page_args(1)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    conn = get_db_connection()
+    course = conn.execute('''
+        SELECT id FROM courses WHERE id = ? AND instructor_id = ?
+    ''', (course_id, session['user_id'])).fetchone()
+    if not course:
+        conn.close()
+        return jsonify({'error': 'Course not found'}), 404
+    
+    dates, next_cursor = load_attendance_history(conn, course_id, cursor, limit)
+    conn.close()
+    
+    return jsonify({
+        'dates': [dict(row) for row in dates],
+        'next_cursor': next_cursor
+    })
 
 @app.route('/instructor/reports')
 def instructor_reports():
@@ -497,25 +1075,261 @@ def api_recognize_face():
         return jsonify({'error': 'Unauthorized'}), 403
     
     data = request.get_json()
-    image_data = data.get('image')
+    image_data = frame_bytes(data.get('image'))
     course_id = data.get('course_id')
+    # Each device sends its own id; a shared default would merge the
+    # trackers and frame-gate references of unrelated cameras. Clients
+    # without one get untracked, ungated recognition.
+    camera_id = data.get('camera_id') or None
+    
+    skipped = gate_frame(camera_id, image_data)
+    if skipped:
+        return jsonify({'recognized_faces': [], 'skipped': skipped})
+    
+    recognized_faces = face_system.detect_faces(image_data, course_id, camera_id)
+    
+    # Mark attendance for recognized faces
+    record_recognitions(recognized_faces, course_id)
+    
+    return jsonify({'recognized_faces': serialize_recognitions(recognized_faces)})
+
+def frame_bytes(image_data):
+    """Encoded bytes of a JSON image field; b'' if it is missing or not valid base64"""
+    try:
+        return image_bytes(image_data or b'')
+    except ValueError:
+        return b''
+
+def gate_frame(camera_id, image_data):
+    """Run the frame pre-filter; returns the stage that rejected the frame, or None.
+    
+    Frames without a camera_id have no previous frame to compare with and always pass.
+    """
+    if not app.config['FRAME_GATE'] or camera_id is None:
+        return None
+    with metrics.stage('gate'):
+        return frame_gate.check(camera_id, image_data)
+
+def read_frame_upload():
+    """Get the JPEG bytes of a raw or multipart frame upload"""
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('frame')
+        return upload.read() if upload is not None else None
+    return request.get_data(cache=False)
+
+@app.route('/api/recognize-frame', methods=['POST'])
+def api_recognize_frame():
+    """Binary variant of /api/recognize-face.
+
+    Accepts either a raw image/jpeg body with course_id and an optional
+    camera_id in the query string or a multipart form with a 'frame' file
+    and those fields. The bytes are decoded straight from the request
+    buffer, skipping the base64 and JSON round trip.
+    """
+    if session.get('role') != 'instructor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    image_data = read_frame_upload()
+    if image_data is None:
+        return jsonify({'error': 'Missing frame'}), 400
+    course_id = request.values.get('course_id', type=int)
+    camera_id = request.values.get('camera_id') or None
+    
+    skipped = gate_frame(camera_id, image_data)
+    if skipped:
+        return jsonify({'recognized_faces': [], 'skipped': skipped})
+    
+    recognized_faces = face_system.detect_faces(image_data, course_id, camera_id)
+    record_recognitions(recognized_faces, course_id)
+    
+    return jsonify({'recognized_faces': serialize_recognitions(recognized_faces)})
+
+@app.route('/api/recognize-frame/async', methods=['POST'])
+def api_recognize_frame_async():
+    """Queue a binary frame for the recognition worker pool.
+
+    Returns 202 with a job id to poll at /api/recognition-jobs/<job_id>.
+    A newer frame from the same camera_id replaces one still waiting, and
+    a full queue answers 503 so the client skips the frame.
+    """
+    if session.get('role') != 'instructor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    image_data = read_frame_upload()
+    if image_data is None:
+        return jsonify({'error': 'Missing frame'}), 400
+    course_id = request.values.get('course_id', type=int)
+    camera_id = request.values.get('camera_id') or None
+    
+    # Frames that would not change anything never reach the queue
+    skipped = gate_frame(camera_id, image_data)
+    if skipped:
+        return jsonify({'status': 'skipped', 'skipped': skipped})
+    
+    roster = get_course_roster(course_id) if course_id is not None else None
+    regions = get_camera_regions(camera_id)
+    
+    job = recognition_pool.submit(camera_id, course_id, image_data, roster,
+                                  None if regions is None else regions.to_dict(), owner_id=session['user_id'])
+    if job is None:
+        return jsonify({'status': 'rejected', 'error': 'Recognition queue is full'}), 503
+    return jsonify({'job_id': job.id, 'status': job.status}), 202
+
+@app.route('/api/recognition-jobs/<job_id>')
+def api_recognition_job(job_id):
+    if session.get('role') != 'instructor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    # Other users' frames and results are not theirs to see
+    job = recognition_pool.get(job_id, session['user_id'])
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/recognition-queue')
+def api_recognition_queue():
+    if session.get('role') != 'instructor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    return jsonify(recognition_pool.stats())
+
+@app.route('/api/tracking-stats')
+def api_tracking_stats():
+    """How much per-frame work the frame gate, camera tracking and the presence set saved"""
+    if session.get('role') != 'instructor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    return jsonify({
+        'frame_gate': frame_gate.stats(),
+        'tracking': face_system.trackers.stats(),
+        'skipped_checkins': session_presence.skipped
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition of request, stage, SQL, cache and queue metrics"""
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'error': 'Unauthorized'}), 403
+    if not metrics.enabled:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/profiler', methods=['GET', 'PUT'])
+def api_profiler():
+    """Show or change the slow-request profiler (PUT {"enabled": true, "threshold_ms": 300}).
+
+    Changes are saved to app_settings and reach every worker process with
+    the cache invalidations, overriding PROFILE_THRESHOLD_MS. They need
+    PROFILE_SLOW_REQUESTS=1: without it PUT is refused with 409. Capture
+    and file counts are this worker's, whose pid is reported.
+    """
+    if session.get('role') != 'instructor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    if request.method == 'PUT':
+        if not app.config['PROFILE_SLOW_REQUESTS']:
+            return jsonify({'error': 'Profiling is off for this deployment (set PROFILE_SLOW_REQUESTS=1)'}), 409
+        data = request.get_json() or {}
+        settings = {'enabled': profiler.enabled, 'threshold_ms': profiler.threshold * 1000}
+        try:
+            if 'threshold_ms' in data:
+                settings['threshold_ms'] = float(data['threshold_ms'])
+                if settings['threshold_ms'] < 0:
+                    raise ValueError
+        except (TypeError, ValueError):
+            return jsonify({'error': 'threshold_ms must be a non-negative number'}), 400
+        if 'enabled' in data:
+            settings['enabled'] = bool(data['enabled'])
+        conn = get_db_connection()
+        with conn:
+            conn.execute('''
+                INSERT INTO app_settings (name, value) VALUES ('profiler', ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    value = excluded.value,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', (json.dumps(settings),))
+        conn.close()
+        stats_cache.invalidate_tags(('app_settings', 'profiler'))
+        profiler.enabled = settings['enabled']
+        profiler.threshold = settings['threshold_ms'] / 1000
+    
+    return jsonify(dict(profiler.stats(), pid=os.getpid()))
+
+@app.route('/api/cameras/<camera_id>/regions', methods=['GET', 'PUT', 'DELETE'])
+def api_camera_regions(camera_id):
+    """Read, set or clear a camera's detection regions.
+
+    PUT body: {"include": [[x, y, w, h], ...], "exclude": [...],
+    "far_field": 0.3, "far_scale": 2.0}, all as fractions of the frame.
+    """
+    if session.get('role') != 'instructor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    if request.method == 'GET':
+        regions = get_camera_regions(camera_id)
+        return jsonify({'camera_id': camera_id,
+                        'regions': None if regions is None else regions.to_dict()})
+    
+    conn = get_db_connection()
+    if request.method == 'PUT':
+        try:
+            regions = DetectionRegions.from_dict(request.get_json() or {})
+        except (TypeError, ValueError) as e:
+            conn.close()
+            return jsonify({'error': str(e)}), 400
+        with conn:
+            conn.execute('''
+                INSERT INTO camera_regions (camera_id, config) VALUES (?, ?)
+                ON CONFLICT(camera_id) DO UPDATE SET
+                    config = excluded.config,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', (camera_id, json.dumps(regions.to_dict())))
+    else:
+        regions = None
+        with conn:
+            conn.execute('DELETE FROM camera_regions WHERE camera_id = ?', (camera_id,))
+    conn.close()
+    stats_cache.invalidate_tags(('camera_regions', camera_id))
+    
+    return jsonify({'camera_id': camera_id,
+                    'regions': None if regions is None else regions.to_dict()})
+
+@app.route('/api/recognize-faces', methods=['POST'])
+def api_recognize_faces():
+    """Recognize a batch of frames, e.g. one per webcam in a lecture hall"""
+    if session.get('role') != 'instructor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    frames = request.get_json().get('frames') or []
+    if len(frames) > app.config['MAX_BATCH_FRAMES']:
+        return jsonify({'error': f"At most {app.config['MAX_BATCH_FRAMES']} frames per batch"}), 413
+    
+    # Only frames from a known camera can be compared with its previous frame
+    images = [frame_bytes(frame.get('image')) for frame in frames]
+    skipped = [gate_frame(frame.get('camera_id') or None, image) for frame, image in zip(frames, images)]
+    todo = [i for i, reason in enumerate(skipped) if reason is None]
     
-    recognized_faces = face_system.detect_faces(image_data)
+    batch_results = [[] for _ in frames]
+    for i, recognized_faces in zip(todo, face_system.detect_faces_batch(
+            [(images[i], frames[i].get('course_id'), frames[i].get('camera_id')) for i in todo])):
+        batch_results[i] = recognized_faces
     
     results = []
-    for face in recognized_faces:
-        # Mark attendance for recognized face
-        mark_attendance(face['user_id'], course_id, face['confidence'], 'auto')
-        results.append({
-            'user_id': face['user_id'],
-            'name': face['name'],
-            'student_id': face['student_id'],
-            'confidence': face['confidence'],
-            'eyes_detected': face['eyes_detected'],
-            'timestamp': face['timestamp']
-        })
+    for frame, recognized_faces, reason in zip(frames, batch_results, skipped):
+        # Frames without a course are recognition-only
+        record_recognitions(recognized_faces, frame.get('course_id'))
+        result = {
+            'camera_id': frame.get('camera_id'),
+            'course_id': frame.get('course_id'),
+            'recognized_faces': serialize_recognitions(recognized_faces)
+        }
+        if reason:
+            result['skipped'] = reason
+        results.append(result)
     
-    return jsonify({'recognized_faces': results})
+    return jsonify({'results': results})
 
 @app.route('/api/manual-attendance', methods=['POST'])
 def api_manual_attendance():
@@ -533,13 +1347,41 @@ def api_manual_attendance():
     student = conn.execute('SELECT name, student_id FROM users WHERE id = ?', (student_id,)).fetchone()
     conn.close()
     
+    timestamp = datetime.now().strftime('%H:%M:%S')
+    publish_checkins(course_id, [{
+        'user_id': int(student_id),
+        'name': student['name'],
+        'student_id': student['student_id'],
+        'confidence': 100,
+        'eyes_detected': False,
+        'timestamp': timestamp
+    }])
+    
     return jsonify({
         'success': True,
         'student_name': student['name'],
         'student_id': student['student_id'],
-        'timestamp': datetime.now().strftime('%H:%M:%S')
+        'timestamp': timestamp
     })
 
+@app.route('/api/live-stream')
+def api_live_stream():
+    """Server-Sent Events stream of check-ins and stats for the given courses"""
+    if session.get('role') != 'instructor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    requested = request.args.getlist('course_id', type=int)
+    conn = get_db_connection()
+    owned = {row['id'] for row in conn.execute(
+        'SELECT id FROM courses WHERE instructor_id = ?', (session['user_id'],)).fetchall()}
+    conn.close()
+    course_ids = [course_id for course_id in requested if course_id in owned]
+    if not course_ids:
+        return jsonify({'error': 'Course not found'}), 404
+    
+    return Response(live_events.stream(course_ids), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/attendance-stats/<int:course_id>/<date>')
 def api_attendance_stats(course_id, date):
     if session.get('role') != 'instructor':
@@ -548,19 +1390,10 @@ def api_attendance_stats(course_id, date):
     conn = get_db_connection()
     
     # Get attendance for specific date
-    attendance_data = conn.execute('''
-        SELECT u.name, u.student_id, a.status, a.timestamp, a.recognized_confidence, a.method
-        FROM attendance a
-        JOIN users u ON a.student_id = u.id
-        WHERE a.course_id = ? AND a.date = ?
-        ORDER BY u.name
-    ''', (course_id, date)).fetchall()
+    attendance_data = conn.execute(ATTENDANCE_RECORDS_SQL, (course_id, date)).fetchall()
     
     # Get total enrolled students
-    total_students = conn.execute('''
-        SELECT COUNT(*) FROM enrollments 
-        WHERE course_id = ?
-    ''', (course_id,)).fetchone()[0]
+    total_students = conn.execute(COURSE_ENROLLED_SQL, (course_id,)).fetchone()[0]
     
     conn.close()
     
@@ -585,54 +1418,179 @@ def api_attendance_stats(course_id, date):
         ]
     })
 
+@app.route('/api/export-attendance')
 @app.route('/api/export-attendance/<int:course_id>')
-def api_export_attendance(course_id):
+def api_export_attendance(course_id=None):
+    """Stream attendance as CSV.
+
+    Query parameters: course_id (repeatable, for multi-course exports),
+    start / end (YYYY-MM-DD, inclusive) and gzip=1 for a .csv.gz download.
+    """
     if session.get('role') != 'instructor':
         return jsonify({'error': 'Unauthorized'}), 403
     
-    # Verify course belongs to instructor
+    requested = [course_id] if course_id is not None else request.args.getlist('course_id', type=int)
+    
+    # Verify courses belong to instructor
     conn = get_db_connection()
-    course = conn.execute('SELECT * FROM courses WHERE id = ? AND instructor_id = ?', 
-                         (course_id, session['user_id'])).fetchone()
-    if not course:
-        conn.close()
+    courses = conn.execute(f'''
+        SELECT id, code FROM courses
+        WHERE instructor_id = ? AND id IN ({', '.join('?' * len(requested))})
+        ORDER BY code
+    ''', [session['user_id']] + requested).fetchall() if requested else []
+    conn.close()
+    if not courses:
         return jsonify({'error': 'Course not found'}), 404
     
-    # Get attendance data
-    attendance_data = conn.execute('''
-        SELECT a.date, u.name, u.student_id, a.status, a.timestamp, a.method, a.recognized_confidence
-        FROM attendance a
-        JOIN users u ON a.student_id = u.id
-        WHERE a.course_id = ?
-        ORDER BY a.date DESC, u.name
-    ''', (course_id,)).fetchall()
+    chunks = stream_attendance_csv(db_pool.acquire, [(course['id'], course['code']) for course in courses],
+                                   start=request.args.get('start'),
+                                   end=request.args.get('end'),
+                                   include_course=course_id is None)
+    
+    label = courses[0]['code'] if len(courses) == 1 else f"{len(courses)}courses"
+    filename = f"attendance_{label}_{datetime.now().strftime('%Y%m%d')}.csv"
+    mimetype = 'text/csv'
+    if request.args.get('gzip') == '1':
+        chunks = gzip_stream(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    return Response(chunks, mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+def instructor_report():
+    """Build the bulk report for the logged-in instructor from query args"""
+    conn = get_db_connection()
+    report = build_attendance_report(conn, session['user_id'],
+                                     start=request.args.get('start'),
+                                     end=request.args.get('end'))
     conn.close()
+    return report
+
+@app.route('/api/reports/summary')
+def api_reports_summary():
+    """Per-course figures and at-risk students for all the instructor's courses"""
+    if session.get('role') != 'instructor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    report = instructor_report()
+    return jsonify({
+        'courses': report.course_rows(),
+        'at_risk': report.student_rows(at_risk_only=True),
+        'parameters': report.meta
+    })
+
+@app.route('/api/reports/export')
+def api_reports_export():
+    """Download the full columnar report as a compressed NumPy .npz file"""
+    if session.get('role') != 'instructor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    buffer = io.BytesIO()
+    instructor_report().save(buffer)
+    filename = f"attendance_report_{datetime.now().strftime('%Y%m%d')}.npz"
+    return Response(buffer.getvalue(), mimetype='application/octet-stream',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@app.route('/api/students')
+def api_students():
+    """JSON pages of /instructor/students in (name, id) order"""
+    if session.get('role') != 'instructor':
+        return jsonify({'error': 'Unauthorized'}), 403
     
-    # Create CSV
-    output = BytesIO()
-    writer = csv.writer(output)
-    writer.writerow(['Date', 'Student Name', 'Student ID', 'Status', 'Time', 'Method', 'Confidence'])
-    
-    for record in attendance_data:
-        writer.writerow([
-            record['date'],
-            record['name'],
-            record['student_id'],
-            record['status'],
-            record['timestamp'],
-            record['method'],
-            f"{record['recognized_confidence']}%" if record['recognized_confidence'] else 'N/A'
-        ])
-    
-    output.seek(0)
-    
-    filename = f"attendance_{course['code']}_{datetime.now().strftime('%Y%m%d')}.csv"
-    return send_file(
-        output,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=filename
-    )
+    try:
+        cursor, limit = page_args(2)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    students, next_cursor = load_instructor_students(session['user_id'], cursor, limit)
+    return jsonify({
+        'students': [{
+            'id': student['id'],
+            'name': student['name'],
+            'student_id': student['student_id'],
+            'email': student['email'],
+            'courses': student['courses'],
+            'course_count': student['course_count']
+        } for student in students],
+        'totals': load_instructor_student_totals(session['user_id']),
+        'next_cursor': next_cursor
+    })
+
+@app.route('/api/import-roster', methods=['POST'])
+def api_import_roster():
+    """Queue an import of a roster CSV (field "roster") and optional photo zip (field "photos").
+
+    Students are enrolled in the form's course_id, which must belong to
+    the instructor, and in any of the instructor's courses named by code
+    in a "course" column. Returns 202 with a job id to poll at
+    /api/import-jobs/<job_id>; the finished job's result is the import
+    summary. Its credentials are only in the first response that returns
+    the finished job.
+    """
+    if session.get('role') != 'instructor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    roster = request.files.get('roster')
+    if roster is None:
+        return jsonify({'error': 'No roster file provided'}), 400
+    course_id = request.form.get('course_id', type=int)
+    instructor_id = session['user_id']
+    if course_id is not None:
+        conn = get_db_connection()
+        owned = conn.execute('SELECT 1 FROM courses WHERE id = ? AND instructor_id = ?',
+                             (course_id, instructor_id)).fetchone()
+        conn.close()
+        if owned is None:
+            return jsonify({'error': f"Unknown course {course_id}"}), 400
+    rows, errors = read_roster(open_roster_upload(roster.stream))
+    
+    # Archives are read from disk so large ones are not held in memory, in a
+    # private temp file: UPLOAD_FOLDER is served to anyone under /static
+    source = None
+    upload = request.files.get('photos')
+    if upload is not None and upload.filename:
+        fd, path = tempfile.mkstemp(prefix='roster_', suffix='.zip')
+        os.close(fd)
+        upload.save(path)
+        try:
+            source = PhotoSource(path)
+        except (OSError, ValueError):
+            os.remove(path)
+            return jsonify({'error': 'Photos must be a .zip archive'}), 400
+    
+    def run_import():
+        conn = get_db_connection()
+        try:
+            summary = import_roster(conn, face_system.gallery, rows, photos=source, course_id=course_id,
+                                    instructor_id=instructor_id,
+                                    workers=app.config['IMPORT_WORKERS'],
+                                    flush_rows=app.config['IMPORT_FLUSH_ROWS'])
+        finally:
+            conn.close()
+        finish_roster_import(summary)
+        summary['errors'] = errors + summary['errors']
+        del summary['user_ids']
+        return summary
+    
+    def remove_upload():
+        if source is not None:
+            source.close()
+            os.remove(source.path)
+    
+    # New accounts' passwords are handed out by the first poll of the finished job only
+    job_id = import_jobs.submit(instructor_id, 'roster', run_import, cleanup=remove_upload, once=('credentials',))
+    return jsonify({'success': True, 'job_id': job_id, 'status': 'queued'}), 202
+
+@app.route('/api/import-jobs/<job_id>')
+def api_import_job(job_id):
+    if session.get('role') != 'instructor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    job = import_jobs.get(job_id, session['user_id'])
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
 
 @app.route('/api/course-stats/<int:course_id>')
 def api_course_stats(course_id):
@@ -642,6 +1600,13 @@ def api_course_stats(course_id):
     stats = get_course_stats(course_id)
     return jsonify(stats)
 
+@app.route('/api/cache-stats')
+def api_cache_stats():
+    if session.get('role') != 'instructor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    return jsonify(stats_cache.stats())
+
 # Student Routes
 @app.route('/student/dashboard')
 def student_dashboard():
@@ -652,15 +1617,7 @@ def student_dashboard():
     
     # Get student's courses and today's attendance
     today = datetime.now().strftime('%Y-%m-%d')
-    courses = conn.execute('''
-        SELECT c.id, c.code, c.name, c.schedule, c.room,
-               (SELECT status FROM attendance 
-                WHERE student_id = ? AND course_id = c.id AND date = ?) as status
-        FROM courses c
-        JOIN enrollments e ON c.id = e.course_id
-        WHERE e.student_id = ?
-        ORDER BY c.name
-    ''', (session['user_id'], today, session['user_id'])).fetchall()
+    courses = conn.execute(STUDENT_COURSES_SQL, (session['user_id'], today, session['user_id'])).fetchall()
     
     conn.close()
     
@@ -669,58 +1626,100 @@ def student_dashboard():
                          name=session.get('name'),
                          today=today)
 
+def load_student_attendance(conn, student_id, course_id, cursor, limit):
+    """One page of a student's records, newest first, keyed on (date, id)"""
+    before = STUDENT_ATTENDANCE_CURSOR if cursor else ''
+    return fetch_page(conn, STUDENT_ATTENDANCE_SQL.format(before=before),
+                      [student_id, course_id] + list(cursor or ()), limit,
+                      lambda row: (row['date'], row['id']))
+
+def load_student_attendance_totals(conn, student_id, course_id):
+    """Sessions held, sessions attended and the rate, over the whole course"""
+    totals = conn.execute(STUDENT_ATTENDANCE_TOTALS_SQL, (course_id, student_id, course_id)).fetchone()
+    total_classes, present_classes = totals['total_classes'], totals['present_classes']
+    attendance_rate = (present_classes / total_classes * 100) if total_classes > 0 else 0
+    return {
+        'total_classes': total_classes,
+        'present_classes': present_classes,
+        'attendance_rate': round(attendance_rate, 1)
+    }
+
 @app.route('/student/attendance/<int:course_id>')
 def student_course_attendance(course_id):
     if session.get('role') != 'student':
         return redirect('/')
     
+    try:
+        cursor, limit = page_args(2)
+    except ValueError:
+        return redirect(request.path)
+    
     conn = get_db_connection()
     
     # Verify student is enrolled
-    enrollment = conn.execute('''
-        SELECT e.*, c.name as course_name, c.code as course_code
-        FROM enrollments e
-        JOIN courses c ON e.course_id = c.id
-        WHERE e.student_id = ? AND e.course_id = ?
-    ''', (session['user_id'], course_id)).fetchone()
+    enrollment = conn.execute(STUDENT_ENROLLMENT_SQL, (session['user_id'], course_id)).fetchone()
     
     if not enrollment:
         conn.close()
         return redirect('/student/dashboard')
     
-    # Get attendance history
-    attendance_history = conn.execute('''
-        SELECT date, status, timestamp, recognized_confidence, method
-        FROM attendance 
-        WHERE student_id = ? AND course_id = ?
-        ORDER BY date DESC
-        LIMIT 50
-    ''', (session['user_id'], course_id)).fetchall()
-    
-    # Calculate statistics
-    total_classes = len(attendance_history)
-    present_classes = len([a for a in attendance_history if a['status'] == 'present'])
-    course_attendance_rate = (present_classes / total_classes * 100) if total_classes > 0 else 0
+    # Get one page of attendance history, totals over all of it
+    attendance_history, next_cursor = load_student_attendance(conn, session['user_id'], course_id,
+                                                              cursor, limit)
+    totals = load_student_attendance_totals(conn, session['user_id'], course_id)
     
     conn.close()
     
     return render_template('student/attendance-view.html',
                          course=enrollment,
                          attendance_history=attendance_history,
-                         present_classes=present_classes,
-                         total_classes=total_classes,
-                         attendance_rate=round(course_attendance_rate, 1))
+                         next_cursor=next_cursor,
+                         paged=cursor is not None,
+                         **totals)
+
+@app.route('/api/student/attendance/<int:course_id>')
+def api_student_course_attendance(course_id):
+    """JSON pages of the student's history for one course, with totals"""
+    if session.get('role') != 'student':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    try:
+        cursor, limit = page_args(2)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    conn = get_db_connection()
+    attendance_history, next_cursor = load_student_attendance(conn, session['user_id'], course_id,
+                                                              cursor, limit)
+    totals = load_student_attendance_totals(conn, session['user_id'], course_id)
+    conn.close()
+    
+    return jsonify({
+        'attendance': [{
+            'date': record['date'],
+            'status': record['status'],
+            'timestamp': record['timestamp'],
+            'recognized_confidence': record['recognized_confidence'],
+            'method': record['method']
+        } for record in attendance_history],
+        'totals': totals,
+        'next_cursor': next_cursor
+    })
 
 if __name__ == '__main__':
     # Create uploads directory if it doesn't exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
     print("🚀 Face Attendance System Starting...")
-    print("✅ Database initialized with fresh data!")
+    bootstrap()
+    start_background_work()
+    if seed_demo_data():
+        print("✅ Empty database seeded with demo data")
     print("👨‍🏫 Demo Instructor: professor / password")
     print("👨‍🎓 Demo Student: student1 / password") 
     print("🌐 Access: http://localhost:5000")
     print("-" * 50)
     
-    app.run(debug=True, port=5000)
-    
\ No newline at end of file
+    # The reloader would run bootstrap() again in a child process
+    app.run(debug=True, use_reloader=False, port=5000)
+    
\ No newline at end of file
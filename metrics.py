@@ -0,0 +1,185 @@
+"""In-process request, stage and SQL metrics in Prometheus text format.
+
+``Metrics.stage(name)`` times a block into a histogram and, while a
+request is being served on the thread, into that request's breakdown
+(used for the Server-Timing header). ``observe_query`` is the pool's
+per-statement hook. Gauges are callables read at scrape time. When
+disabled, ``stage`` hands back one shared no-op context manager and the
+request and query hooks return at once, so the cost is a method call.
+
+Counters are per process: with several worker processes each one
+reports its own figures.
+"""
+
+import bisect
+import contextlib
+import threading
+import time
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NO_TIMER = contextlib.nullcontext()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    # repr keeps full precision where :g would round large counters
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, seconds, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series.setdefault(label_values, [[0] * (len(self.buckets) + 1), 0.0])
+        series[0][bisect.bisect_left(self.buckets, seconds)] += 1
+        series[1] += seconds
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket'
+                             f'{_labels(self.labels + ("le",), label_values + (le,))} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, label_values)} {total:.6f}')
+            lines.append(f'{self.name}_count{_labels(self.labels, label_values)} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, amount, *label_values):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_labels(self.labels, label_values)} {_number(value)}')
+        return lines
+
+
+class _Stage:
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.metrics.observe_stage(self.name, time.perf_counter() - self.started)
+
+
+class Metrics:
+    def __init__(self, enabled=True, prefix='attendance'):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._gauges = []
+        self.requests = Histogram(f'{prefix}_request_seconds', 'Request latency by endpoint', ('endpoint',))
+        self.responses = Counter(f'{prefix}_responses_total', 'Responses by endpoint and status',
+                                 ('endpoint', 'status'))
+        self.stages = Histogram(f'{prefix}_stage_seconds', 'Time spent per pipeline stage', ('stage',))
+        self.queries = Counter(f'{prefix}_sql_queries_total', 'SQL statements executed by endpoint',
+                               ('endpoint',))
+        self.query_seconds = Counter(f'{prefix}_sql_seconds_total', 'Time spent executing SQL by endpoint',
+                                     ('endpoint',))
+
+    def gauge(self, name, help, read, labels=(), kind='gauge'):
+        """Register a value read at scrape time.
+
+        read() returns a number or a {label values: number} dict. Use
+        kind='counter' for totals kept elsewhere, e.g. cache hits.
+        """
+        self._gauges.append((name, help, read, labels, kind))
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NO_TIMER
+        return _Stage(self, name)
+
+    def observe_stage(self, name, seconds):
+        with self._lock:
+            self.stages.observe(seconds, name)
+        current = getattr(self._local, 'request', None)
+        if current is not None:
+            current['stages'][name] = current['stages'].get(name, 0.0) + seconds
+
+    def observe_query(self, seconds):
+        if not self.enabled:
+            return
+        current = getattr(self._local, 'request', None)
+        endpoint = current['endpoint'] if current is not None else 'background'
+        with self._lock:
+            self.queries.inc(1, endpoint)
+            self.query_seconds.inc(seconds, endpoint)
+        if current is not None:
+            current['sql_count'] += 1
+            current['sql_seconds'] += seconds
+
+    def begin_request(self, endpoint):
+        if self.enabled:
+            self._local.request = {'endpoint': endpoint or 'unmatched', 'started': time.perf_counter(),
+                                   'stages': {}, 'sql_count': 0, 'sql_seconds': 0.0}
+
+    def end_request(self, status):
+        """Record the finished request; returns its breakdown, or None if not tracked"""
+        current = getattr(self._local, 'request', None)
+        if current is None:
+            return None
+        self._local.request = None
+        current['total'] = time.perf_counter() - current['started']
+        with self._lock:
+            self.requests.observe(current['total'], current['endpoint'])
+            self.responses.inc(1, current['endpoint'], str(status))
+        return current
+
+    @staticmethod
+    def server_timing(breakdown):
+        """Server-Timing header value for a request breakdown"""
+        parts = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in breakdown['stages'].items()]
+        if breakdown['sql_count']:
+            parts.append(f'db;desc="{breakdown["sql_count"]} queries";dur={breakdown["sql_seconds"] * 1000:.2f}')
+        parts.append(f'total;dur={breakdown["total"] * 1000:.2f}')
+        return ', '.join(parts)
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.responses, self.stages, self.queries, self.query_seconds):
+                lines.extend(metric.render())
+        for name, help, read, labels, kind in self._gauges:
+            lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+            value = read()
+            values = value if isinstance(value, dict) else {(): value}
+            for label_values, number in values.items():
+                if not isinstance(label_values, tuple):
+                    label_values = (label_values,)
+                lines.append(f'{name}{_labels(labels, label_values)} {_number(number)}')
+        return '\n'.join(lines) + '\n'
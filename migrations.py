@@ -0,0 +1,242 @@
+"""Versioned schema migrations.
+
+Each migration runs once, in order, inside its own ``BEGIN IMMEDIATE``
+transaction, and is recorded in ``schema_version``. Startup against an
+up-to-date database is therefore a single SELECT and never touches data.
+Statements are idempotent (IF NOT EXISTS, de-duplicating before unique
+indexes) so databases created by earlier builds, which had no version
+table, migrate cleanly too.
+"""
+
+import sqlite3
+
+from cache import CREATE_CACHE_INVALIDATIONS_SQL
+from daily_stats import CREATE_DAILY_STATS_SQL, rebuild_daily_stats
+from import_jobs import CREATE_IMPORT_JOBS_SQL
+from live_events import CREATE_LIVE_EVENTS_SQL, CREATE_LIVE_LISTENERS_SQL
+
+CREATE_SCHEMA_VERSION_SQL = '''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def _base_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL,
+            name TEXT NOT NULL,
+            email TEXT,
+            student_id TEXT,
+            phone TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS courses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            instructor_id INTEGER,
+            schedule TEXT,
+            room TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (instructor_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS enrollments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER,
+            course_id INTEGER,
+            enrolled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (student_id) REFERENCES users (id),
+            FOREIGN KEY (course_id) REFERENCES courses (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER,
+            course_id INTEGER,
+            date TEXT NOT NULL,
+            status TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            recognized_confidence REAL,
+            method TEXT DEFAULT 'auto',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (student_id) REFERENCES users (id),
+            FOREIGN KEY (course_id) REFERENCES courses (id)
+        )
+    ''')
+
+
+def _unique_attendance(conn):
+    # Keep the latest mark where older builds recorded a day twice
+    conn.execute('''
+        DELETE FROM attendance WHERE id NOT IN (
+            SELECT MAX(id) FROM attendance GROUP BY student_id, course_id, date
+        )
+    ''')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_student_course_date
+        ON attendance (student_id, course_id, date)
+    ''')
+
+
+def _lookup_indexes(conn):
+    # See query_plans.HOT_QUERIES
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_attendance_course_date_student
+        ON attendance (course_id, date, student_id)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_enrollments_course_student
+        ON enrollments (course_id, student_id)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_courses_instructor
+        ON courses (instructor_id)
+    ''')
+
+
+def _daily_stats(conn):
+    conn.execute(CREATE_DAILY_STATS_SQL)
+    rebuild_daily_stats(conn)
+
+
+def _camera_regions(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS camera_regions (
+            camera_id TEXT PRIMARY KEY,
+            config TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _roster_names(conn):
+    # Walks students in (name, id) order for the keyset-paginated roster
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_role_name
+        ON users (role, name)
+    ''')
+
+
+def _roster_import(conn):
+    # Hash of the photo last embedded for each student (see gallery_import)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS face_photos (
+            user_id INTEGER PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            source TEXT,
+            has_face INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    # Unique so roster imports can enroll with INSERT OR IGNORE; the index
+    # may exist from older builds without the constraint
+    conn.execute('''
+        DELETE FROM enrollments WHERE id NOT IN (
+            SELECT MIN(id) FROM enrollments GROUP BY student_id, course_id
+        )
+    ''')
+    conn.execute('DROP INDEX IF EXISTS idx_enrollments_student_course')
+    conn.execute('''
+        CREATE UNIQUE INDEX idx_enrollments_student_course
+        ON enrollments (student_id, course_id)
+    ''')
+
+
+def _cache_invalidations(conn):
+    conn.execute(CREATE_CACHE_INVALIDATIONS_SQL)
+
+
+def _import_jobs(conn):
+    conn.execute(CREATE_IMPORT_JOBS_SQL)
+
+
+def _app_settings(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS app_settings (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _live_events(conn):
+    conn.execute(CREATE_LIVE_EVENTS_SQL)
+
+
+def _live_listeners(conn):
+    conn.execute(CREATE_LIVE_LISTENERS_SQL)
+
+
+def _import_job_secrets(conn):
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(import_jobs)')]
+    if 'secret' not in columns:
+        conn.execute('ALTER TABLE import_jobs ADD COLUMN secret TEXT')
+
+
+MIGRATIONS = (
+    (1, 'users, courses, enrollments and attendance', _base_tables),
+    (2, 'one attendance row per student, course and day', _unique_attendance),
+    (3, 'attendance, enrollment and course lookup indexes', _lookup_indexes),
+    (4, 'course_daily_stats summary table', _daily_stats),
+    (5, 'camera_regions table', _camera_regions),
+    (6, 'student roster name index', _roster_names),
+    (7, 'face_photos table and unique enrollments', _roster_import),
+    (8, 'cache_invalidations table', _cache_invalidations),
+    (9, 'import_jobs table', _import_jobs),
+    (10, 'app_settings table', _app_settings),
+    (11, 'live_events table', _live_events),
+    (12, 'live_listeners table', _live_listeners),
+    (13, 'import_jobs secret column', _import_job_secrets),
+)
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    try:
+        return conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        return 0
+
+
+def migrate(conn, target=LATEST_VERSION):
+    """Apply pending migrations up to target and return the versions applied.
+
+    BEGIN IMMEDIATE takes the write lock before the version is re-read,
+    so several processes starting at once apply each migration only once.
+    """
+    applied = []
+    if current_version(conn) >= target:
+        return applied
+    conn.execute(CREATE_SCHEMA_VERSION_SQL)
+    for version, description, apply in MIGRATIONS:
+        if version > target:
+            break
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if version <= current_version(conn):
+                conn.rollback()
+                continue
+            apply(conn)
+            conn.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                         (version, description))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
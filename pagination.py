@@ -0,0 +1,59 @@
+"""Keyset (cursor) pagination helpers.
+
+A page query orders by a unique key, e.g. (date, id) or (name, id), and
+asks for one row more than the page size. The key of the last row shown
+becomes an opaque cursor; the next page filters on ``key > cursor`` (or
+``<`` when descending) so it is an index seek no matter how deep it is,
+unlike OFFSET which reads and discards every earlier row.
+"""
+
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 30
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, width):
+    """Decode a cursor into a tuple of width values, or None for no cursor.
+
+    Raises ValueError if the token was not produced by encode_cursor.
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != width:
+        raise ValueError('Invalid cursor')
+    return tuple(values)
+
+
+def clamp_page_size(value, default=DEFAULT_PAGE_SIZE):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def fetch_page(conn, sql, params, limit, key):
+    """Run a keyset query and split off the cursor for the next page.
+
+    ``sql`` must end with ``LIMIT ?``; it is bound to limit + 1 so we
+    learn whether another page exists without a COUNT. ``key(row)``
+    returns the ordering values of a row. Returns (rows, next_cursor),
+    next_cursor being None on the last page.
+    """
+    rows = conn.execute(sql, list(params) + [limit + 1]).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key(rows[-1]))
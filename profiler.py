@@ -0,0 +1,134 @@
+"""Opt-in sampling profiler that keeps only slow requests.
+
+While enabled, every request registers its thread on start. One
+background thread wakes every ``interval`` seconds while requests are in
+flight, reads their stacks with ``sys._current_frames()`` and counts each
+collapsed stack against its request. When a request finishes under
+``threshold`` seconds its samples are dropped; otherwise they are
+written as a collapsed-stack (``.folded``) file that flamegraph.pl,
+speedscope or inferno read directly. The request's method and endpoint
+form the root frame, so files from many requests can be concatenated.
+
+The directory is rotated: after each write the oldest files are removed
+until the total is under ``max_bytes``.
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+
+class _Capture:
+    __slots__ = ('label', 'started', 'samples')
+
+    def __init__(self, label):
+        self.label = label
+        self.started = time.perf_counter()
+        self.samples = Counter()
+
+
+class SlowRequestProfiler:
+    def __init__(self, directory, threshold=0.5, interval=0.01, max_bytes=50 * 1024 * 1024,
+                 enabled=False):
+        self.directory = directory
+        self.threshold = threshold
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.captured = 0
+        self._active = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def start_request(self, label):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._active[threading.get_ident()] = _Capture(label)
+            # Threads do not survive fork; each worker starts its own sampler
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def end_request(self):
+        """Stop sampling this thread's request; returns the file written, if any"""
+        with self._lock:
+            capture = self._active.pop(threading.get_ident(), None)
+        if capture is None:
+            return None
+        elapsed = time.perf_counter() - capture.started
+        if elapsed < self.threshold or not capture.samples:
+            return None
+        return self._write(capture, elapsed)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                if not self._active:
+                    self._wake.clear()
+                    continue
+                active = list(self._active.items())
+            for ident, capture in active:
+                frame = frames.get(ident)
+                if frame is not None:
+                    capture.samples[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _write(self, capture, elapsed):
+        root = capture.label.replace(';', ':')
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', capture.label).strip('_')
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{slug}_{int(elapsed * 1000)}ms.folded"
+        path = os.path.join(self.directory, name)
+        with self._write_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as handle:
+                for stack, count in capture.samples.most_common():
+                    handle.write(f'{root};{stack} {count}\n')
+            self.captured += 1
+            self._rotate()
+        return path
+
+    def _rotate(self):
+        files = [entry for entry in os.scandir(self.directory)
+                 if entry.is_file() and entry.name.endswith('.folded')]
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        total = sum(entry.stat().st_size for entry in files)
+        for entry in files[:-1]:
+            if total <= self.max_bytes:
+                break
+            total -= entry.stat().st_size
+            os.remove(entry.path)
+
+    def stats(self):
+        files = []
+        if os.path.isdir(self.directory):
+            files = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.folded')]
+        return {
+            'enabled': self.enabled,
+            'threshold_ms': round(self.threshold * 1000, 1),
+            'interval_ms': round(self.interval * 1000, 1),
+            'captured': self.captured,
+            'files': len(files),
+            'bytes': sum(entry.stat().st_size for entry in files),
+            'max_bytes': self.max_bytes,
+        }
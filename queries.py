@@ -0,0 +1,146 @@
+"""SQL for the hot read paths of the web routes.
+
+main.py runs these statements and query_plans.py checks their plans, so
+the index checks always see the SQL that is actually served. Keyset
+pages take their cursor condition through a ``{before}``/``{after}``
+field, filled with the matching ``*_CURSOR`` clause or left empty on the
+first page.
+"""
+
+COURSE_ENROLLED_SQL = '''
+    SELECT COUNT(*) FROM enrollments WHERE course_id = ?
+'''
+
+COURSE_PRESENT_TODAY_SQL = '''
+    SELECT present_count FROM course_daily_stats
+    WHERE course_id = ? AND date = ?
+'''
+
+COURSE_HISTORY_SQL = '''
+    SELECT COUNT(*) AS total_classes, AVG(attendance_rate) AS avg_rate
+    FROM course_daily_stats WHERE course_id = ?
+'''
+
+# {placeholders}: one ? per course id
+COURSE_ROSTERS_SQL = '''
+    SELECT course_id, student_id FROM enrollments
+    WHERE course_id IN ({placeholders})
+'''
+
+PRESENT_STUDENTS_SQL = '''
+    SELECT student_id FROM attendance
+    WHERE course_id = ? AND date = ? AND status = 'present'
+'''
+
+INSTRUCTOR_COURSES_SQL = '''
+    SELECT c.*,
+           COUNT(DISTINCT e.student_id) as enrolled_count,
+           COALESCE(s.attendance_rate, 0) as today_rate
+    FROM courses c
+    LEFT JOIN enrollments e ON c.id = e.course_id
+    LEFT JOIN course_daily_stats s ON s.course_id = c.id AND s.date = ?
+    WHERE c.instructor_id = ?
+    GROUP BY c.id
+'''
+
+INSTRUCTOR_TOTAL_STUDENTS_SQL = '''
+    SELECT COUNT(DISTINCT student_id) FROM enrollments
+    WHERE course_id IN (SELECT id FROM courses WHERE instructor_id = ?)
+'''
+
+INSTRUCTOR_TODAY_ATTENDANCE_SQL = '''
+    SELECT COUNT(DISTINCT student_id) FROM attendance
+    WHERE date = ? AND course_id IN (
+        SELECT id FROM courses WHERE instructor_id = ?
+    )
+'''
+
+# Driven from the instructor's courses, so a page costs the instructor's
+# enrollments rather than every student on campus. CROSS JOIN pins that
+# loop order; otherwise SQLite may walk idx_users_role_name for the ORDER BY.
+INSTRUCTOR_STUDENTS_SQL = '''
+    SELECT u.*,
+           GROUP_CONCAT(c.name, ', ') as courses,
+           COUNT(*) as course_count
+    FROM courses c
+    CROSS JOIN enrollments e ON e.course_id = c.id
+    CROSS JOIN users u ON u.id = e.student_id
+    WHERE c.instructor_id = ? AND u.role = 'student' {after}
+    GROUP BY u.name, u.id
+    ORDER BY u.name, u.id
+    LIMIT ?
+'''
+INSTRUCTOR_STUDENTS_CURSOR = 'AND (u.name, u.id) > (?, ?)'
+
+INSTRUCTOR_STUDENT_TOTALS_SQL = '''
+    SELECT COUNT(*) as total,
+           COALESCE(SUM(course_count = 1), 0) as single_course,
+           COALESCE(SUM(course_count > 1), 0) as multiple_courses
+    FROM (
+        SELECT e.student_id, COUNT(*) as course_count
+        FROM courses c
+        JOIN enrollments e ON e.course_id = c.id
+        JOIN users u ON u.id = e.student_id
+        WHERE c.instructor_id = ? AND u.role = 'student'
+        GROUP BY e.student_id
+    )
+'''
+
+COURSE_STUDENTS_SQL = '''
+    SELECT u.id, u.name, u.student_id, u.email
+    FROM users u
+    JOIN enrollments e ON u.id = e.student_id
+    WHERE e.course_id = ? AND u.role = 'student'
+    ORDER BY u.name
+'''
+
+ATTENDANCE_HISTORY_SQL = '''
+    SELECT date, present_count, enrolled_count, absent_count, attendance_rate
+    FROM course_daily_stats
+    WHERE course_id = ? {before}
+    ORDER BY date DESC
+    LIMIT ?
+'''
+ATTENDANCE_HISTORY_CURSOR = 'AND date < ?'
+
+ATTENDANCE_RECORDS_SQL = '''
+    SELECT u.name, u.student_id, a.status, a.timestamp, a.recognized_confidence, a.method
+    FROM attendance a
+    JOIN users u ON a.student_id = u.id
+    WHERE a.course_id = ? AND a.date = ?
+    ORDER BY u.name
+'''
+
+STUDENT_COURSES_SQL = '''
+    SELECT c.id, c.code, c.name, c.schedule, c.room,
+           (SELECT status FROM attendance
+            WHERE student_id = ? AND course_id = c.id AND date = ?) as status
+    FROM courses c
+    JOIN enrollments e ON c.id = e.course_id
+    WHERE e.student_id = ?
+    ORDER BY c.name
+'''
+
+STUDENT_ENROLLMENT_SQL = '''
+    SELECT e.*, c.name as course_name, c.code as course_code
+    FROM enrollments e
+    JOIN courses c ON e.course_id = c.id
+    WHERE e.student_id = ? AND e.course_id = ?
+'''
+
+STUDENT_ATTENDANCE_SQL = '''
+    SELECT id, date, status, timestamp, recognized_confidence, method
+    FROM attendance
+    WHERE student_id = ? AND course_id = ? {before}
+    ORDER BY date DESC, id DESC
+    LIMIT ?
+'''
+STUDENT_ATTENDANCE_CURSOR = 'AND (date, id) < (?, ?)'
+
+# Only present marks are stored, so the sessions the course has held (the
+# same dates the reports use) are the denominator, not the student's rows
+STUDENT_ATTENDANCE_TOTALS_SQL = '''
+    SELECT (SELECT COUNT(*) FROM course_daily_stats WHERE course_id = ?) as total_classes,
+           (SELECT COUNT(*) FROM attendance
+            WHERE student_id = ? AND course_id = ? AND status = 'present') as present_classes
+'''
@@ -0,0 +1,60 @@
+"""Query-plan regression checks for the hot attendance lookups.
+
+Each entry pairs a statement the app runs (imported from queries,
+daily_stats, reports and cache, never copied) with sample parameters;
+keyset pages are checked with their cursor clause. ``find_table_scans`` runs
+EXPLAIN QUERY PLAN on every one of them and reports any step that falls
+back to a SCAN instead of an index SEARCH. Run it with
+``flask --app main check-query-plans``.
+"""
+
+import queries as q
+from cache import POLL_INVALIDATIONS_SQL
+from daily_stats import REFRESH_DAILY_STATS_SQL
+from reports import ENROLLMENTS_SQL, PRESENT_SQL, SESSIONS_SQL
+
+HOT_QUERIES = {
+    'course_stats.enrolled': (q.COURSE_ENROLLED_SQL, (1,)),
+    'course_stats.present_today': (q.COURSE_PRESENT_TODAY_SQL, (1, '2024-01-01')),
+    'course_stats.history': (q.COURSE_HISTORY_SQL, (1,)),
+    'course_roster': (q.COURSE_ROSTERS_SQL.format(placeholders='?, ?'), (1, 2)),
+    'instructor_dashboard.courses': (q.INSTRUCTOR_COURSES_SQL, ('2024-01-01', 1)),
+    'instructor_dashboard.total_students': (q.INSTRUCTOR_TOTAL_STUDENTS_SQL, (1,)),
+    'instructor_dashboard.today_attendance': (q.INSTRUCTOR_TODAY_ATTENDANCE_SQL, ('2024-01-01', 1)),
+    'live_attendance.students': (q.COURSE_STUDENTS_SQL, (1,)),
+    'live_attendance.present': (q.PRESENT_STUDENTS_SQL, (1, '2024-01-01')),
+    'attendance_history.dates': (q.ATTENDANCE_HISTORY_SQL.format(before=q.ATTENDANCE_HISTORY_CURSOR),
+                                 (1, '2024-01-01', 31)),
+    'daily_stats.refresh': (REFRESH_DAILY_STATS_SQL, (1, '2024-01-01')),
+    'attendance_stats.records': (q.ATTENDANCE_RECORDS_SQL, (1, '2024-01-01')),
+    'student_dashboard.courses': (q.STUDENT_COURSES_SQL, (2, '2024-01-01', 2)),
+    'student_attendance.enrollment': (q.STUDENT_ENROLLMENT_SQL, (2, 1)),
+    'student_attendance.history': (q.STUDENT_ATTENDANCE_SQL.format(before=q.STUDENT_ATTENDANCE_CURSOR),
+                                   (2, 1, '2024-01-01', 100, 31)),
+    'student_attendance.totals': (q.STUDENT_ATTENDANCE_TOTALS_SQL, (1, 2, 1)),
+    'instructor_students.page': (q.INSTRUCTOR_STUDENTS_SQL.format(after=q.INSTRUCTOR_STUDENTS_CURSOR),
+                                 (1, 'Alice Chen', 2, 31)),
+    'instructor_students.totals': (q.INSTRUCTOR_STUDENT_TOTALS_SQL, (1,)),
+    'reports.enrollments': (ENROLLMENTS_SQL, (1,)),
+    'reports.sessions': (SESSIONS_SQL.format(range=''), (1,)),
+    'reports.present': (PRESENT_SQL.format(range=''), (1,)),
+    'cache.poll_invalidations': (POLL_INVALIDATIONS_SQL, (100,)),
+}
+
+
+def explain(conn, sql, params):
+    return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()]
+
+
+def find_table_scans(conn, queries=HOT_QUERIES):
+    """Return [(query_name, plan_step)] for every plan step that is a SCAN.
+
+    Scans of an already-filtered subquery result or of a constant row are
+    not table scans and are not reported.
+    """
+    scans = []
+    for name, (sql, params) in queries.items():
+        for step in explain(conn, sql, params):
+            if step.startswith('SCAN') and not step.startswith(('SCAN (subquery', 'SCAN CONSTANT ROW')):
+                scans.append((name, step))
+    return scans
@@ -0,0 +1,223 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from ann_index import IVFIndex
+from embedding_store import EmbeddingStore
+from face_engine import DetectionRegions, FaceEngine, decode_image
+
+# Per-process state for pool workers, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(index_path, background_path, nlist, nprobe, min_rows):
+    engine = FaceEngine(background=EmbeddingStore(background_path))
+    store = EmbeddingStore(index_path)
+    _worker['engine'] = engine
+    _worker['index'] = IVFIndex(store, nlist=nlist, nprobe=nprobe, min_rows=min_rows)
+
+
+def _recognize_job(image_bytes, roster, regions=None):
+    """Runs inside a worker process: decode, detect, embed and match one frame"""
+    frame = decode_image(image_bytes)
+    if frame is None:
+        return []
+    index = _worker['index']
+    matcher = index if roster is None else index.for_candidates(roster)
+    engine = _worker['engine']
+    gray = engine.to_gray(frame)
+    boxes = engine.detect(gray, None if regions is None else DetectionRegions.from_dict(regions))
+    return engine.identify_batch([gray], [boxes], [matcher])[0]
+
+
+class RecognitionJob:
+    def __init__(self, camera_id, course_id, image_bytes, roster, regions=None, owner_id=None):
+        self.id = uuid.uuid4().hex
+        self.owner_id = owner_id
+        self.camera_id = camera_id
+        self.course_id = course_id
+        self.image_bytes = image_bytes
+        self.roster = roster
+        self.regions = regions
+        self.status = 'queued'
+        self.submitted_at = time.monotonic()
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'camera_id': self.camera_id,
+            'course_id': self.course_id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class RecognitionPool:
+    """Bounded, drop-stale job queue in front of a process pool.
+
+    Only the newest pending frame per camera is kept: a new frame from a
+    camera replaces (drops) the one still waiting. At most ``workers``
+    jobs are in flight, and frames older than ``max_age`` seconds are
+    expired instead of run, so overload shows up as skipped frames rather
+    than growing latency. ``on_result`` is called in the parent process
+    with (job, matches) for every finished job. If a worker process dies,
+    the jobs it took down fail and a fresh set of workers replaces them.
+    """
+
+    def __init__(self, index_path, background_path, workers=2, max_pending=32, max_age=5.0,
+                 keep_results=1024, on_result=None, nlist=0, nprobe=8, min_rows=20000):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self.keep_results = keep_results
+        self.on_result = on_result
+        self._executor_args = (index_path, background_path, nlist, nprobe, min_rows)
+        self._executor = None
+        self._pending = OrderedDict()
+        self._jobs = OrderedDict()
+        self._in_flight = 0
+        self._counters = {'submitted': 0, 'completed': 0, 'failed': 0,
+                          'dropped': 0, 'expired': 0, 'rejected': 0}
+        self._cond = threading.Condition()
+        self._dispatcher = None
+        self._stopping = False
+
+    def _start(self):
+        # The executor and dispatcher are created on first use so importing
+        # the app never forks worker processes.
+        if self._executor is None:
+            self._stopping = False
+            self._executor = self._new_executor()
+            self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+            self._dispatcher.start()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=self._executor_args)
+
+    def submit(self, camera_id, course_id, image_bytes, roster=None, regions=None, owner_id=None):
+        """Queue a frame; returns the job, or None if the queue is full.
+
+        ``regions`` is the camera's DetectionRegions.to_dict(), if it has one.
+        Frames without a camera_id never replace one another. Only
+        ``owner_id`` can read the job back with get().
+        """
+        job = RecognitionJob(camera_id, course_id, image_bytes, roster, regions, owner_id)
+        key = job.id if camera_id is None else camera_id
+        with self._cond:
+            self._start()
+            replaced = self._pending.pop(key, None)
+            if replaced is not None:
+                self._finish(replaced, 'dropped')
+            elif len(self._pending) >= self.max_pending:
+                self._counters['rejected'] += 1
+                return None
+            self._pending[key] = job
+            self._remember(job)
+            self._counters['submitted'] += 1
+            self._cond.notify()
+        return job
+
+    def get(self, job_id, owner_id):
+        """The job, or None if there is no such job for this owner"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+        if job is None or job.owner_id != owner_id:
+            return None
+        return job
+
+    def stats(self):
+        with self._cond:
+            return dict(self._counters, pending=len(self._pending),
+                        in_flight=self._in_flight, workers=self.workers)
+
+    def shutdown(self):
+        with self._cond:
+            if self._executor is None:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+            dispatcher, executor = self._dispatcher, self._executor
+            self._dispatcher = self._executor = None
+        dispatcher.join()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _remember(self, job):
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.keep_results:
+            self._jobs.popitem(last=False)
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.monotonic()
+        job.image_bytes = None
+        self._counters[status] += 1
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._stopping and (not self._pending or self._in_flight >= self.workers):
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                _, job = self._pending.popitem(last=False)
+                if time.monotonic() - job.submitted_at > self.max_age:
+                    self._finish(job, 'expired')
+                    continue
+                job.status = 'running'
+                self._in_flight += 1
+                image_bytes, job.image_bytes = job.image_bytes, None
+                executor = self._executor
+            try:
+                future = executor.submit(_recognize_job, image_bytes, job.roster, job.regions)
+            except Exception as e:
+                # A worker died (BrokenProcessPool): the executor takes no
+                # more jobs, so fail this one and start a fresh set of workers
+                with self._cond:
+                    self._in_flight -= 1
+                    self._finish(job, 'failed', error=str(e) or type(e).__name__)
+                self._replace_executor(executor)
+                continue
+            future.add_done_callback(lambda f, job=job, executor=executor: self._done(job, f, executor))
+
+    def _replace_executor(self, broken):
+        with self._cond:
+            # Every job the broken workers held reports it; replace them once
+            if self._executor is not broken or self._stopping:
+                return
+            self._executor = self._new_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _done(self, job, future, executor):
+        matches, error = None, None
+        try:
+            matches = future.result()
+        except BrokenProcessPool as e:
+            # Found out here, not on the next submit, so the next frame
+            # goes straight to fresh workers
+            error = str(e) or type(e).__name__
+            self._replace_executor(executor)
+        except Exception as e:
+            error = str(e)
+        result = None
+        if error is None and self.on_result is not None:
+            try:
+                result = self.on_result(job, matches)
+            except Exception as e:
+                error = str(e)
+        with self._cond:
+            self._in_flight -= 1
+            if error is None:
+                self._finish(job, 'completed', result=result)
+            else:
+                self._finish(job, 'failed', error=error)
+            self._cond.notify()
@@ -0,0 +1,232 @@
+"""Bulk attendance reports across all of an instructor's courses.
+
+``build_attendance_report`` pulls the instructor's enrollments, sessions
+(the dates in ``course_daily_stats``) and present marks with three
+set-based queries, then computes every per-student and per-course figure
+with NumPy over an enrollments x sessions presence matrix. The result is
+an ``AttendanceReport``: two dicts of equal-length column arrays that can
+be saved as a compressed ``.npz`` file and loaded back without pickle.
+"""
+
+import numpy as np
+
+REPORT_FORMAT = 1
+
+COURSES_SQL = '''
+    SELECT id, code, name FROM courses
+    WHERE instructor_id = ?
+    ORDER BY id
+'''
+
+ENROLLMENTS_SQL = '''
+    SELECT e.course_id, e.student_id, u.name, u.student_id AS student_number
+    FROM courses c
+    JOIN enrollments e ON e.course_id = c.id
+    JOIN users u ON u.id = e.student_id
+    WHERE c.instructor_id = ?
+    ORDER BY e.course_id, e.student_id
+'''
+
+SESSIONS_SQL = '''
+    SELECT s.course_id, s.date
+    FROM courses c
+    JOIN course_daily_stats s ON s.course_id = c.id
+    WHERE c.instructor_id = ?{range}
+    ORDER BY s.course_id, s.date
+'''
+
+PRESENT_SQL = '''
+    SELECT a.course_id, a.student_id, a.date
+    FROM courses c
+    JOIN attendance a ON a.course_id = c.id
+    WHERE c.instructor_id = ? AND a.status = 'present'{range}
+'''
+
+
+def _date_range(column, start, end):
+    clause, params = '', []
+    if start:
+        clause += f' AND {column} >= ?'
+        params.append(start)
+    if end:
+        clause += f' AND {column} <= ?'
+        params.append(end)
+    return clause, params
+
+
+def _columns(conn, sql, params, width):
+    """Run sql and return its result as a tuple of columns.
+
+    Plain tuples are fetched instead of sqlite3.Row objects, which
+    roughly halves the fetch time on large attendance tables.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    rows = cursor.execute(sql, params).fetchall()
+    return tuple(zip(*rows)) if rows else ((),) * width
+
+
+def _days(dates):
+    return np.array(dates, dtype='datetime64[D]').astype(np.int64)
+
+
+def _keys(high, low):
+    """Pack two non-negative int columns into one sortable int64 key"""
+    return (np.asarray(high, dtype=np.int64) << 32) | np.asarray(low, dtype=np.int64)
+
+
+def _lookup(sorted_keys, keys):
+    """Positions of keys in sorted_keys, plus a mask of the ones found"""
+    pos = np.searchsorted(sorted_keys, keys)
+    found = pos < len(sorted_keys)
+    found[found] = sorted_keys[pos[found]] == keys[found]
+    return pos, found
+
+
+def _longest_run(matrix):
+    """Longest run of True along each row"""
+    if matrix.shape[1] == 0:
+        return np.zeros(len(matrix), dtype=np.int64)
+    counts = np.cumsum(matrix, axis=1)
+    # Count at the last False before each cell, carried forward
+    resets = np.maximum.accumulate(np.where(matrix, 0, counts), axis=1)
+    return (counts - resets).max(axis=1)
+
+
+def _trailing_run(matrix):
+    """Length of the run of True that ends in the last column"""
+    return np.cumprod(matrix[:, ::-1], axis=1).sum(axis=1)
+
+
+class AttendanceReport:
+    """Columnar per-course and per-student attendance figures"""
+
+    def __init__(self, courses, students, meta=None):
+        self.courses = courses
+        self.students = students
+        self.meta = meta or {}
+
+    def save(self, file):
+        """Write all columns to a compressed .npz file or file object"""
+        arrays = {f'course.{name}': column for name, column in self.courses.items()}
+        arrays.update({f'student.{name}': column for name, column in self.students.items()})
+        arrays.update({f'meta.{name}': np.asarray(value) for name, value in self.meta.items()})
+        np.savez_compressed(file, **arrays)
+
+    @classmethod
+    def load(cls, file):
+        tables = {'course': {}, 'student': {}, 'meta': {}}
+        with np.load(file, allow_pickle=False) as data:
+            for key in data.files:
+                table, name = key.split('.', 1)
+                tables[table][name] = data[key]
+        meta = {name: value.item() for name, value in tables['meta'].items()}
+        return cls(tables['course'], tables['student'], meta)
+
+    @staticmethod
+    def _rows(columns, mask=None):
+        names = list(columns)
+        selected = {name: columns[name] if mask is None else columns[name][mask] for name in names}
+        count = len(selected[names[0]]) if names else 0
+        return [{name: selected[name][i].item() for name in names} for i in range(count)]
+
+    def course_rows(self):
+        return self._rows(self.courses)
+
+    def student_rows(self, at_risk_only=False):
+        return self._rows(self.students, self.students['at_risk'] if at_risk_only else None)
+
+
+def build_attendance_report(conn, instructor_id, start=None, end=None,
+                            risk_rate=75.0, risk_absences=3, min_sessions=3):
+    """Compute the report for every course taught by instructor_id.
+
+    A student is flagged at risk once their course has held min_sessions
+    sessions and either their rate is below risk_rate percent or they
+    missed the last risk_absences sessions in a row.
+    """
+    session_range, session_params = _date_range('s.date', start, end)
+    present_range, present_params = _date_range('a.date', start, end)
+
+    course_ids, course_codes, course_names = _columns(conn, COURSES_SQL, (instructor_id,), 3)
+    e_course, e_student, e_names, e_numbers = _columns(conn, ENROLLMENTS_SQL, (instructor_id,), 4)
+    s_course, s_dates = _columns(conn, SESSIONS_SQL.format(range=session_range),
+                                 [instructor_id] + session_params, 2)
+    p_course, p_student, p_dates = _columns(conn, PRESENT_SQL.format(range=present_range),
+                                            [instructor_id] + present_params, 3)
+
+    course_ids = np.array(course_ids, dtype=np.int64)
+    n_courses = len(course_ids)
+
+    # Enrollments, sorted by (course, student)
+    e_course = np.searchsorted(course_ids, np.array(e_course, dtype=np.int64))
+    e_student = np.array(e_student, dtype=np.int64)
+    e_keys = _keys(e_course, e_student)
+
+    # Sessions, sorted by (course, date); each course's run starts at offsets[c]
+    s_course = np.searchsorted(course_ids, np.array(s_course, dtype=np.int64))
+    s_keys = _keys(s_course, _days(s_dates))
+    n_sessions = np.bincount(s_course, minlength=n_courses)
+    offsets = np.cumsum(n_sessions) - n_sessions
+    width = int(n_sessions.max()) if n_courses else 0
+
+    # Presence matrix, right-aligned so the latest session is the last column
+    student_sessions = n_sessions[e_course]
+    first_column = width - student_sessions
+    held = np.arange(width) >= first_column[:, None]
+    attended = np.zeros((len(e_student), width), dtype=bool)
+    if p_course:
+        p_course = np.searchsorted(course_ids, np.array(p_course, dtype=np.int64))
+        s_pos, s_found = _lookup(s_keys, _keys(p_course, _days(p_dates)))
+        e_pos, e_found = _lookup(e_keys, _keys(p_course, p_student))
+        found = s_found & e_found
+        e_pos, s_pos = e_pos[found], s_pos[found]
+        columns = s_pos - offsets[s_course[s_pos]] + first_column[e_pos]
+        attended[e_pos, columns] = True
+
+    present_count = attended.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.where(student_sessions > 0, present_count * 100.0 / student_sessions, 0.0)
+    current_streak = _trailing_run(attended)
+    absence_streak = _trailing_run(held & ~attended)
+    at_risk = (student_sessions >= min_sessions) & (
+        (rate < risk_rate) | (absence_streak >= risk_absences))
+
+    enrolled = np.bincount(e_course, minlength=n_courses)
+    course_present = np.bincount(e_course, weights=present_count, minlength=n_courses)
+    possible = enrolled * n_sessions
+    with np.errstate(divide='ignore', invalid='ignore'):
+        course_rate = np.where(possible > 0, course_present * 100.0 / possible, 0.0)
+
+    course_columns = {
+        'course_id': course_ids,
+        'code': np.array(course_codes, dtype=str),
+        'name': np.array(course_names, dtype=str),
+        'enrolled': enrolled,
+        'sessions': n_sessions,
+        'attendance_rate': np.round(course_rate, 1),
+        'at_risk': np.bincount(e_course, weights=at_risk, minlength=n_courses).astype(np.int64),
+    }
+    student_columns = {
+        'course_id': course_ids[e_course],
+        'student_id': e_student,
+        'student_number': np.array([number or '' for number in e_numbers], dtype=str),
+        'name': np.array(e_names, dtype=str),
+        'sessions': student_sessions,
+        'present': present_count,
+        'attendance_rate': np.round(rate, 1),
+        'current_streak': current_streak,
+        'longest_streak': _longest_run(attended),
+        'absence_streak': absence_streak,
+        'at_risk': at_risk,
+    }
+    meta = {
+        'format': REPORT_FORMAT,
+        'instructor_id': int(instructor_id),
+        'start': start or '',
+        'end': end or '',
+        'risk_rate': float(risk_rate),
+        'risk_absences': int(risk_absences),
+        'min_sessions': int(min_sessions),
+    }
+    return AttendanceReport(course_columns, student_columns, meta)
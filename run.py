@@ -22,7 +22,14 @@ def main():
     
     # Start the application
     try:
-        from main import app
+        from main import app, bootstrap, seed_demo_data, start_background_work
+        
+        bootstrap()
+        start_background_work()
+        
+        # Demo accounts below only exist once seeded; a no-op on a database with users
+        if seed_demo_data():
+            print("✅ Empty database seeded with demo data")
         
         def open_browser():
             webbrowser.open_new('http://localhost:5000')
@@ -38,9 +45,11 @@ def main():
         print("👨‍🏫 Instructor: professor / password")
         print("👨‍🎓 Student: student1 / password")
         print("=" * 50)
+        print("Production: gunicorn -c gunicorn.conf.py wsgi:app")
         print("Press Ctrl+C to stop the server")
         
-        app.run(debug=True, host='0.0.0.0', port=5000)
+        # The reloader would run bootstrap() again in a child process
+        app.run(debug=True, use_reloader=False, host='0.0.0.0', port=5000)
         
     except Exception as e:
         print(f"❌ Error starting application: {e}")
@@ -0,0 +1,46 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# The app modules live at the repository root, which is not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import migrate  # noqa: E402
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """A migrated database in a temporary file"""
+    connection = sqlite3.connect(tmp_path / 'attendance.db')
+    connection.row_factory = sqlite3.Row
+    migrate(connection)
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    """main imported against a database and gallery in tmp_path"""
+    monkeypatch.setenv('ATTENDANCE_DB', str(tmp_path / 'attendance.db'))
+    monkeypatch.setenv('FACE_INDEX_PATH', str(tmp_path / 'face_index'))
+    monkeypatch.setenv('PROFILE_DIR', str(tmp_path / 'profiles'))
+    sys.modules.pop('main', None)
+    import main
+    yield main
+    main.live_events.close()
+    main.db_pool.close_all()
+    sys.modules.pop('main', None)
+
+
+@pytest.fixture
+def instructor_client(app_module):
+    """Test client logged in as the demo instructor of a seeded database"""
+    app_module.bootstrap()
+    app_module.seed_demo_data()
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['role'] = 'instructor'
+        session['user_id'] = 1
+    return client
@@ -0,0 +1,58 @@
+import numpy as np
+
+from ann_index import IVFIndex
+from embedding_store import EmbeddingStore
+from face_engine import EMBEDDING_DIM
+
+
+def unit(rows):
+    return (rows / np.linalg.norm(rows, axis=1, keepdims=True)).astype(np.float32)
+
+
+def clustered_gallery(users, per_user, seed=0):
+    """Several noisy samples around one centre per user, like enrolled photos"""
+    rng = np.random.default_rng(seed)
+    centres = unit(rng.standard_normal((users, EMBEDDING_DIM)))
+    samples = np.repeat(centres, per_user, axis=0) + 0.3 * rng.standard_normal(
+        (users * per_user, EMBEDDING_DIM)) / np.sqrt(EMBEDDING_DIM)
+    return centres, np.repeat(np.arange(1, users + 1), per_user), unit(samples)
+
+
+def recall(index, store, queries):
+    """Share of queries whose best match agrees with an exact scan"""
+    approx, _ = index.match(queries, 1)
+    exact, _ = store.match(queries, 1)
+    return np.mean(approx[:, 0] == exact[:, 0])
+
+
+def test_ivf_recall_against_brute_force(tmp_path):
+    centres, user_ids, samples = clustered_gallery(users=400, per_user=5)
+    store = EmbeddingStore(str(tmp_path / 'gallery'))
+    store.add_many(user_ids, samples)
+    index = IVFIndex(store, nprobe=8, min_rows=1000)
+    queries = unit(centres[:200] + 0.3 * np.random.default_rng(1).standard_normal(
+        (200, EMBEDDING_DIM)) / np.sqrt(EMBEDDING_DIM))
+
+    index.sync()
+    assert index.centroids is not None
+    assert recall(index, store, queries) >= 0.95
+    top, _ = index.match(queries, 1)
+    assert np.mean(top[:, 0] == np.arange(1, 201)) >= 0.95
+
+    # Rows appended after training and tombstones are honoured without retraining
+    centroids = index.centroids
+    store.add(401, queries[:1])
+    store.remove(2)
+    top, _ = index.match(queries[:2], 1)
+    assert index.centroids is centroids
+    assert top[0, 0] == 401 and top[1, 0] != 2
+
+
+def test_small_galleries_are_scanned_exactly(tmp_path):
+    _, user_ids, samples = clustered_gallery(users=20, per_user=3)
+    store = EmbeddingStore(str(tmp_path / 'gallery'))
+    store.add_many(user_ids, samples)
+    index = IVFIndex(store, min_rows=1000)
+
+    assert recall(index, store, samples[::3]) == 1.0
+    assert index.centroids is None
@@ -0,0 +1,81 @@
+import os
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from attendance_recorder import AttendanceRecorder, SessionPresence
+
+MORNING = datetime(2024, 3, 4, 9, 0, 0)
+LATER = datetime(2024, 3, 4, 9, 5, 0)
+NEXT_DAY = datetime(2024, 3, 5, 9, 0, 0)
+
+
+@pytest.fixture
+def connect(conn, tmp_path):
+    return lambda: sqlite3.connect(tmp_path / 'attendance.db')
+
+
+def attendance(conn):
+    return conn.execute('SELECT student_id, course_id, date, timestamp, recognized_confidence '
+                        'FROM attendance ORDER BY student_id').fetchall()
+
+
+def test_repeat_checkins_collapse_to_the_latest(conn, connect):
+    flushed = []
+    recorder = AttendanceRecorder(connect, on_flush=flushed.append)
+    recorder._pid = os.getpid()  # as if the flush thread ran; the test flushes by hand
+    recorder.record(3, 1, 0.80, when=MORNING)
+    recorder.record(3, 1, 0.90, when=LATER)
+    recorder.record(4, 1, 0.70, when=MORNING)
+
+    assert recorder.pending() == 2
+    assert recorder.flush() == 2
+    assert [tuple(row) for row in attendance(conn)] == [
+        (3, 1, '2024-03-04', '09:05:00', 0.90),
+        (4, 1, '2024-03-04', '09:00:00', 0.70),
+    ]
+    assert flushed == [{(1, '2024-03-04')}]
+    assert recorder.flush() == 0
+
+
+def test_failed_flush_keeps_the_checkins_buffered(conn, connect):
+    failures = [sqlite3.OperationalError('database is locked')]
+
+    def write_hook(conn, keys):
+        if failures:
+            # A newer sighting arrives while the failing batch is being written
+            recorder.record(3, 1, 0.95, when=LATER)
+            raise failures.pop()
+
+    recorder = AttendanceRecorder(connect, write_hook=write_hook)
+    recorder._pid = os.getpid()
+    recorder.record(3, 1, 0.80, when=MORNING)
+    recorder.record(4, 1, 0.70, when=MORNING)
+    with pytest.raises(sqlite3.OperationalError):
+        recorder.flush()
+    assert attendance(conn) == []
+
+    assert recorder.pending() == 2
+    assert recorder.flush() == 2
+    assert [tuple(row) for row in attendance(conn)] == [
+        (3, 1, '2024-03-04', '09:05:00', 0.95),
+        (4, 1, '2024-03-04', '09:00:00', 0.70),
+    ]
+
+
+def test_session_presence_starts_over_on_a_new_day():
+    loads = []
+
+    def load(course_id, date):
+        loads.append((course_id, date))
+        return [3] if date == '2024-03-04' else []
+
+    presence = SessionPresence(load)
+    assert presence.claim(1, [3, 4], MORNING) == [4]
+    assert presence.claim(1, [3, 4], LATER) == []
+    assert presence.skipped == 3
+
+    assert presence.claim(1, [3, 4], NEXT_DAY) == [3, 4]
+    assert presence.claim(1, [3], NEXT_DAY) == []
+    assert loads == [(1, '2024-03-04'), (1, '2024-03-05')]
@@ -0,0 +1,85 @@
+import json
+import sqlite3
+import time
+
+import pytest
+
+from cache import InvalidationLog, TTLCache
+
+
+@pytest.fixture
+def connect(conn, tmp_path):
+    """Fresh connections to the migrated database behind the conn fixture"""
+    return lambda: sqlite3.connect(tmp_path / 'attendance.db')
+
+
+def logged_tags(conn):
+    return [row[0] for row in conn.execute('SELECT tag FROM cache_invalidations ORDER BY id')]
+
+
+def test_generations_are_only_kept_while_a_value_is_computed():
+    cache = TTLCache()
+    for day in range(100):
+        cache.get_or_set(('stats', day), lambda: day, tags=[('course', 1, day)])
+        cache.invalidate_tags(('course', 1, day), ('course', 2, day))
+
+    assert cache._generations == {}
+    assert not cache._computing
+    assert cache.stats()['size'] == 0
+
+
+def test_value_invalidated_while_computing_is_not_stored():
+    cache = TTLCache()
+
+    def compute():
+        cache.invalidate_tags(('course', 1, 'today'))
+        return 'stale'
+
+    assert cache.get_or_set('stats', compute, tags=[('course', 1, 'today')]) == 'stale'
+    assert cache.get_or_set('stats', lambda: 'fresh', tags=[('course', 1, 'today')]) == 'fresh'
+    assert cache._generations == {}
+
+
+def test_failed_compute_releases_its_tags():
+    cache = TTLCache()
+
+    def compute():
+        raise RuntimeError('database is locked')
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_set('stats', compute, tags=[('course', 1, 'today')])
+    assert not cache._computing
+
+
+def test_remote_invalidations_are_polled_at_most_every_interval(conn, connect):
+    cache = TTLCache(sync=InvalidationLog(connect, interval=60.0))
+    cache.get_or_set('stats', lambda: 1, tags=[('course', 1, 'today')])
+    # Another worker (a different pid) invalidates the course
+    with conn:
+        conn.execute('INSERT INTO cache_invalidations (tag, pid, created_at) VALUES (?, ?, ?)',
+                     (json.dumps(['course', 1, 'today']), -1, time.time()))
+
+    assert cache.get_or_set('stats', lambda: 2, tags=[('course', 1, 'today')]) == 1
+    cache.sync._polled -= 60.0
+    assert cache.get_or_set('stats', lambda: 2, tags=[('course', 1, 'today')]) == 2
+
+
+def test_log_invalidations_joins_the_callers_transaction(connect):
+    cache = TTLCache(sync=InvalidationLog(connect))
+    conn = connect()
+    try:
+        with pytest.raises(sqlite3.IntegrityError):
+            with conn:
+                cache.log_invalidations(conn, [('course', 1, 'today')])
+                conn.execute('INSERT INTO users (username) VALUES (NULL)')
+        assert logged_tags(conn) == []
+
+        with conn:
+            cache.log_invalidations(conn, [('course', 1, 'today')])
+        assert logged_tags(conn) == [json.dumps(['course', 1, 'today'])]
+    finally:
+        conn.close()
+
+
+def test_default_sync_interval_is_not_zero(connect):
+    assert InvalidationLog(connect).interval >= 0.5
@@ -0,0 +1,68 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from embedding_store import EmbeddingStore
+from face_engine import EMBEDDING_DIM
+
+
+def embeddings(seed, count=1):
+    rows = np.random.default_rng(seed).standard_normal((count, EMBEDDING_DIM)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def test_tombstoned_rows_never_match(tmp_path):
+    store = EmbeddingStore(str(tmp_path / 'gallery'))
+    faces = {user_id: embeddings(user_id, 2) for user_id in (1, 2, 3)}
+    for user_id, rows in faces.items():
+        store.add(user_id, rows)
+
+    assert store.remove(2) == 2
+    assert store.remove(2) == 0
+    assert len(store) == 4 and store.rows == 6
+    user_ids, _ = store.match(faces[2], k=4)
+    assert 2 not in user_ids.tolist()
+
+    store.replace(1, embeddings(10))
+    user_ids, _ = store.match(embeddings(10), k=1)
+    assert user_ids.tolist() == [[1]]
+    assert len(store) == 3
+
+    store.compact()
+    assert store.rows == 3
+    assert sorted(store.user_ids.tolist()) == [1, 3, 3]
+
+
+def test_other_descriptor_version_is_refused(tmp_path):
+    path = tmp_path / 'gallery'
+    EmbeddingStore(str(path)).add(1, embeddings(1))
+    header = json.loads((path / 'header.json').read_text())
+    (path / 'header.json').write_text(json.dumps(dict(header, descriptor=1)))
+
+    with pytest.raises(ValueError, match='re-import'):
+        EmbeddingStore(str(path))
+
+
+def test_readers_pick_up_writes_from_other_instances(tmp_path):
+    path = str(tmp_path / 'gallery')
+    writer, reader = EmbeddingStore(path), EmbeddingStore(path)
+    assert not reader.refresh()
+
+    writer.add(1, embeddings(1))
+    stat = os.stat(os.path.join(path, 'header.json'))
+    assert reader.refresh()
+    assert reader.rows == 1 and reader.version == writer.version
+
+    # A second write within the same mtime tick still lands on a new inode
+    writer.add(2, embeddings(2))
+    os.utime(os.path.join(path, 'header.json'), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert reader.refresh()
+    assert reader.user_ids.tolist() == [1, 2]
+
+    # Growing past the mapped capacity remaps the reader
+    writer.add_many(np.full(1100, 3), embeddings(3, 1100))
+    user_ids, _ = reader.match(embeddings(2), k=1)
+    assert reader.rows == 1102
+    assert user_ids.tolist() == [[2]]
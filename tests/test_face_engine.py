@@ -0,0 +1,68 @@
+import numpy as np
+
+from benchmarks.recognition import (build_background, classroom, draw_face, enroll_faces, render_frame,
+                                    seat_identities)
+from embedding_store import EmbeddingStore
+from face_engine import MATCH_CANDIDATES, FaceEngine, decode_image
+
+
+class StubMatcher:
+    """Returns fixed (user_ids, scores) for every query"""
+
+    def __init__(self, ids, scores):
+        self.ids = np.array([ids], dtype=np.int64)
+        self.scores = np.array([scores], dtype=np.float32)
+
+    def match(self, embeddings, k=1):
+        return np.repeat(self.ids[:, :k], len(embeddings), 0), np.repeat(self.scores[:, :k], len(embeddings), 0)
+
+
+def best_match(engine, matcher):
+    ids, scores = engine.best_matches(matcher, np.zeros((1, 4), dtype=np.float32))
+    return int(ids[0]), float(scores[0])
+
+
+def test_short_roster_without_background_is_no_evidence():
+    engine = FaceEngine()
+    assert best_match(engine, StubMatcher([7, 7, 7], [0.9, 0.85, 0.8])) == (-1, np.float32(0.9))
+
+
+def test_padded_candidates_are_not_rivals():
+    engine = FaceEngine()
+    ids = [7, 7, 7] + [-1] * (MATCH_CANDIDATES - 3)
+    scores = [0.9, 0.85, 0.8] + [-np.inf] * (MATCH_CANDIDATES - 3)
+    assert best_match(engine, StubMatcher(ids, scores))[0] == -1
+
+
+def test_background_face_is_a_rival():
+    clear = FaceEngine(background=StubMatcher([0], [0.8]))
+    assert best_match(clear, StubMatcher([7, 7, 7], [0.9, 0.85, 0.8]))[0] == 7
+    close = FaceEngine(background=StubMatcher([0], [0.89]))
+    assert best_match(close, StubMatcher([7, 7, 7], [0.9, 0.85, 0.8]))[0] == -1
+
+
+def test_other_student_is_a_rival():
+    engine = FaceEngine()
+    assert best_match(engine, StubMatcher([7, 8], [0.9, 0.85]))[0] == 7
+    assert best_match(engine, StubMatcher([7, 8], [0.9, 0.89]))[0] == -1
+
+
+def test_strangers_in_a_one_student_course_are_rejected(tmp_path):
+    rng = np.random.default_rng(0)
+    background = build_background(str(tmp_path / 'background'), FaceEngine(), 60, seed=1)
+    engine = FaceEngine(background=background)
+    templates = [draw_face(rng, 160) for _ in range(3)]
+    gallery = EmbeddingStore(str(tmp_path / 'gallery'))
+    gallery.add(2, enroll_faces(engine, templates[:1])[0])
+    seats = classroom(rng, 640, 360, len(templates))
+
+    # (drawn identity, accepted user_id) for every face; None is a stranger
+    found = []
+    for _ in range(6):
+        frame = decode_image(render_frame(rng, 640, 360, seats, templates))
+        matches = engine.recognize(frame, gallery)
+        truth = seat_identities(seats, [match['location'] for match in matches], [2, None, None])
+        found.extend((identity, match['user_id']) for identity, match in zip(truth, matches))
+    assert sum(identity is None for identity, _ in found) >= 8
+    assert all(user_id is None for identity, user_id in found if identity is None)
+    assert sum(user_id == 2 for identity, user_id in found if identity == 2) >= 3
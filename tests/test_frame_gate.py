@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+
+from frame_gate import FrameGate
+
+
+def jpeg(image):
+    return cv2.imencode('.jpg', image)[1].tobytes()
+
+
+def room(seed):
+    """A textured 640x480 scene that passes the exposure and blur checks"""
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(60, 200, (30, 40), dtype=np.uint8)
+    return cv2.resize(blocks, (640, 480), interpolation=cv2.INTER_NEAREST)
+
+
+def test_static_frames_are_skipped_until_the_scene_changes():
+    gate = FrameGate()
+    scene = room(0)
+
+    assert gate.check('door', jpeg(scene)) is None
+    assert gate.check('door', jpeg(scene)) == 'static'
+    # Another camera keeps its own reference
+    assert gate.check('back', jpeg(scene)) is None
+
+    moved = scene.copy()
+    moved[160:320, 240:400] = room(1)[160:320, 240:400]
+    assert gate.check('door', jpeg(moved)) is None
+    assert gate.check('door', jpeg(moved)) == 'static'
+    assert gate.stats()['rejected']['static'] == 2
+
+
+def test_static_camera_is_let_through_after_max_static_age():
+    gate = FrameGate(max_static_age=0.0)
+    scene = room(0)
+
+    assert gate.check('door', jpeg(scene)) is None
+    assert gate.check('door', jpeg(scene)) is None
+
+
+def test_unusable_frames_are_rejected_before_motion():
+    gate = FrameGate()
+
+    assert gate.check('door', b'') == 'undecodable'
+    assert gate.check('door', b'not a jpeg') == 'undecodable'
+    assert gate.check('door', jpeg(np.full((480, 640), 10, np.uint8))) == 'dark'
+    assert gate.check('door', jpeg(np.full((480, 640), 240, np.uint8))) == 'bright'
+    assert gate.check('door', jpeg(np.full((480, 640), 128, np.uint8))) == 'blurred'
+    # None of them became the reference, so the first real frame is recognized
+    assert gate.check('door', jpeg(room(0))) is None
+    assert gate.stats()['passed'] == 1 and gate.stats()['checked'] == 6
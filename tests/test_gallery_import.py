@@ -0,0 +1,117 @@
+import io
+
+import cv2
+import numpy as np
+
+from benchmarks.recognition import draw_face
+from daily_stats import rebuild_daily_stats
+from embedding_store import EmbeddingStore
+from gallery_import import BACKGROUND_ID, PhotoSource, import_background, import_roster, read_roster
+
+
+def write_face(path, seed):
+    canvas = np.full((256, 256), 100, np.uint8)
+    canvas[64:192, 64:192] = cv2.resize(draw_face(np.random.default_rng(seed), 160), (128, 128))
+    cv2.imwrite(str(path), canvas)
+
+
+def test_import_background_replaces_the_set(tmp_path):
+    photos = tmp_path / 'photos'
+    photos.mkdir()
+    for seed in range(3):
+        write_face(photos / f'visitor{seed}.jpg', seed)
+    cv2.imwrite(str(photos / 'blank.png'), np.full((64, 64), 128, np.uint8))
+    store = EmbeddingStore(str(tmp_path / 'background'))
+
+    assert import_background(store, PhotoSource(str(photos)), workers=1) == (4, 3)
+    assert set(store.user_ids[store.valid].tolist()) == {BACKGROUND_ID}
+    rows = len(store)
+
+    (photos / 'visitor2.jpg').unlink()
+    assert import_background(store, PhotoSource(str(photos)), workers=1) == (3, 2)
+    assert len(store) == rows * 2 // 3
+
+
+ROSTER = '''name,student_id,email,course,photo
+Ann Lee,S1,ann@old.edu,,ann_portrait.jpg
+Ben Ode,S2,ben@school.edu,cs102,
+,S3,nobody@school.edu,,
+Cid Poe,,cid@school.edu,,
+Ann Lee,S1,ann@school.edu,XX101,ann_portrait.jpg
+Prof Roe,S9,prof@school.edu,,
+'''
+
+
+def roster_fixture(conn, tmp_path):
+    with conn:
+        conn.execute("INSERT INTO users (username, password, role, name) VALUES ('s9', 'x', 'instructor', 'Prof')")
+        conn.executemany('INSERT INTO courses (code, name, instructor_id) VALUES (?, ?, 1)',
+                         [('CS101', 'Intro'), ('CS102', 'Data')])
+    photos = tmp_path / 'photos'
+    photos.mkdir()
+    write_face(photos / 'ann_portrait.jpg', 1)
+    write_face(photos / 'S2.png', 2)
+    return read_roster(io.StringIO(ROSTER)), photos
+
+
+def test_roster_import_collapses_duplicates_and_reports_bad_rows(conn, tmp_path):
+    (rows, errors), photos = roster_fixture(conn, tmp_path)
+    store = EmbeddingStore(str(tmp_path / 'gallery'))
+    assert errors == ['line 4: name and student_id are required', 'line 5: name and student_id are required']
+    assert len(rows) == 4
+
+    summary = import_roster(conn, store, rows, PhotoSource(str(photos)), course_id=1, workers=1)
+
+    assert summary['errors'] == ['s1: unknown course XX101', 's9: username belongs to a non-student']
+    assert summary['students'] == 2 and summary['courses'] == [1, 2]
+    assert summary['enrollments'] == 3
+    assert [username for username, _ in summary['credentials']] == ['s1', 's2']
+    assert conn.execute("SELECT email FROM users WHERE username = 's1'").fetchone()[0] == 'ann@school.edu'
+    assert tuple(conn.execute("SELECT role, name FROM users WHERE username = 's9'").fetchone()) == (
+        'instructor', 'Prof')
+    # Ann's two rows embed her photo once
+    assert summary['photos_embedded'] == 2
+    ann, ben = summary['user_ids']
+    per_student = dict(zip(*np.unique(store.user_ids[store.valid], return_counts=True)))
+    assert per_student[ann] == per_student[ben]
+
+    again = import_roster(conn, store, read_roster(io.StringIO(ROSTER))[0], PhotoSource(str(photos)),
+                          course_id=1, workers=1)
+    assert again['enrollments'] == 0 and again['credentials'] == []
+    assert again['photos_embedded'] == 0 and again['photos_unchanged'] == again['photos_found']
+
+
+def test_roster_import_refreshes_enrolled_counts(conn, tmp_path):
+    (rows, _), _ = roster_fixture(conn, tmp_path)
+    with conn:
+        conn.execute("INSERT INTO attendance (student_id, course_id, date, timestamp, status) "
+                     "VALUES (1, 1, '2024-03-04', '09:00', 'present')")
+        rebuild_daily_stats(conn)
+
+    import_roster(conn, EmbeddingStore(str(tmp_path / 'gallery')), rows, course_id=1, workers=1)
+
+    refreshed = conn.execute('SELECT * FROM course_daily_stats').fetchall()
+    assert [(row['enrolled_count'], row['absent_count'], row['attendance_rate']) for row in refreshed] == [
+        (2, 1, 50.0)]
+    with conn:
+        rebuild_daily_stats(conn)
+    rebuilt = conn.execute('SELECT * FROM course_daily_stats').fetchall()
+    assert [tuple(row)[:6] for row in refreshed] == [tuple(row)[:6] for row in rebuilt]
+
+
+def test_changed_photo_without_a_face_is_reported_and_keeps_the_old_face(conn, tmp_path):
+    (rows, _), photos = roster_fixture(conn, tmp_path)
+    store = EmbeddingStore(str(tmp_path / 'gallery'))
+    ann = import_roster(conn, store, rows, PhotoSource(str(photos)), course_id=1, workers=1)['user_ids'][0]
+    samples = np.sort(store.user_ids[store.valid])
+    digest = conn.execute('SELECT sha256 FROM face_photos WHERE user_id = ?', (ann,)).fetchone()[0]
+
+    cv2.imwrite(str(photos / 'ann_portrait.jpg'), np.full((64, 64), 128, np.uint8))
+    for _ in range(2):
+        # Not recorded, so every import tries the photo again
+        summary = import_roster(conn, store, read_roster(io.StringIO(ROSTER))[0], PhotoSource(str(photos)),
+                                course_id=1, workers=1)
+        assert 'ann_portrait.jpg: no face found' in summary['errors']
+        assert summary['photos_without_face'] == 1 and summary['photos_embedded'] == 0
+    assert np.array_equal(np.sort(store.user_ids[store.valid]), samples)
+    assert conn.execute('SELECT sha256 FROM face_photos WHERE user_id = ?', (ann,)).fetchone()[0] == digest
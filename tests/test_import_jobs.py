@@ -0,0 +1,95 @@
+import io
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from import_jobs import ImportJobs
+
+
+@pytest.fixture
+def jobs(conn, tmp_path):
+    jobs = ImportJobs(lambda: sqlite3.connect(tmp_path / 'attendance.db'))
+    yield jobs
+    jobs.shutdown()
+
+
+def wait_for(jobs, job_id, owner_id=1, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get(job_id, owner_id)
+        if job['status'] in ('completed', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_result_and_errors_are_recorded(jobs):
+    cleaned = []
+    done = jobs.submit(1, 'roster', lambda: {'students': 3}, cleanup=lambda: cleaned.append('done'))
+
+    def bad_course():
+        raise ValueError('Unknown course 9')
+
+    def crash():
+        raise RuntimeError('disk full')
+
+    refused = jobs.submit(1, 'roster', bad_course, cleanup=lambda: cleaned.append('refused'))
+    crashed = jobs.submit(1, 'roster', crash)
+
+    assert wait_for(jobs, done) == {'job_id': done, 'kind': 'roster', 'status': 'completed',
+                                    'result': {'students': 3}, 'error': None}
+    assert wait_for(jobs, refused)['error'] == 'Unknown course 9'
+    assert wait_for(jobs, crashed)['error'] == 'Import failed'
+    assert cleaned == ['done', 'refused']
+    # Another instructor cannot see the job
+    assert jobs.get(done, 2) is None
+
+
+def test_once_keys_are_returned_by_the_first_read_only(jobs, tmp_path):
+    job_id = jobs.submit(1, 'roster', lambda: {'students': 1, 'credentials': [['zed', 'hunter2']]},
+                         once=('credentials',))
+
+    assert wait_for(jobs, job_id)['result'] == {'students': 1, 'credentials': [['zed', 'hunter2']]}
+    assert jobs.get(job_id, 1)['result'] == {'students': 1}
+    conn = sqlite3.connect(tmp_path / 'attendance.db')
+    assert conn.execute('SELECT result, secret FROM import_jobs').fetchall() == [('{"students": 1}', None)]
+    conn.close()
+
+
+def test_shutdown_fails_jobs_that_never_started(jobs):
+    release = threading.Event()
+    cleaned = []
+    running = jobs.submit(1, 'roster', lambda: release.wait(5) and {'students': 1})
+    waiting = jobs.submit(1, 'roster', lambda: {'students': 2}, cleanup=lambda: cleaned.append('waiting'))
+
+    threading.Timer(0.1, release.set).start()
+    jobs.shutdown()
+
+    assert jobs.get(running, 1)['status'] == 'completed'
+    assert jobs.get(waiting, 1)['status'] == 'failed'
+    assert cleaned == ['waiting']
+
+
+def test_roster_upload_is_imported_in_the_background(app_module, instructor_client):
+    roster = b'name,student_id,email\nZed Quinn,S2001,zed@school.edu\n,S2002,\n'
+    response = instructor_client.post('/api/import-roster', data={
+        'course_id': '2', 'roster': (io.BytesIO(roster), 'roster.csv')})
+
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    job = wait_for(app_module.import_jobs, job_id)
+    assert job['status'] == 'completed'
+    assert job['result']['students'] == 1 and job['result']['enrollments'] == 1
+    assert job['result']['errors'] == ['line 3: name and student_id are required']
+    [(username, password)] = job['result'].pop('credentials')
+    assert username and password
+    # The generated password is not kept for later polls
+    assert instructor_client.get(f'/api/import-jobs/{job_id}').get_json() == job
+    assert instructor_client.get('/api/import-jobs/nope').status_code == 404
+
+    refused = instructor_client.post('/api/import-roster', data={
+        'course_id': '99', 'roster': (io.BytesIO(roster), 'roster.csv')})
+    assert refused.status_code == 400
+    app_module.import_jobs.shutdown()
@@ -0,0 +1,90 @@
+import queue
+import sqlite3
+
+import pytest
+
+from live_events import EventLog, LiveBroadcaster
+
+
+@pytest.fixture
+def connect(conn, tmp_path):
+    return lambda: sqlite3.connect(tmp_path / 'attendance.db')
+
+
+@pytest.fixture
+def workers(connect):
+    """Two broadcasters relaying through one database, like two gunicorn workers"""
+    pair = [LiveBroadcaster(relay=EventLog(connect, listener_refresh=0), relay_interval=0.01) for _ in range(2)]
+    yield pair
+    for broadcaster in pair:
+        broadcaster.close()
+
+
+def test_events_reach_streams_in_other_processes(workers):
+    publisher, server = workers
+    local = publisher.subscribe([1])
+    remote = server.subscribe([1])
+    other_course = server.subscribe([2])
+    server._sync()  # the first read only marks where this listener starts
+
+    publisher.publish(1, 'recognition', {'course_id': 1})
+
+    assert local.get_nowait() == 'event: recognition\ndata: {"course_id": 1}\n\n'
+    assert remote.get(timeout=5) == 'event: recognition\ndata: {"course_id": 1}\n\n'
+    # Published once: the relay does not echo events back to their own process
+    publisher._sync()
+    with pytest.raises(queue.Empty):
+        local.get(timeout=0.1)
+    assert other_course.empty()
+
+
+def test_events_from_before_a_process_listened_are_not_replayed(workers):
+    publisher, server = workers
+    publisher.publish(1, 'stats', {'present': 3})
+    publisher._sync()
+
+    remote = server.subscribe([1])
+    server._sync()
+    with pytest.raises(queue.Empty):
+        remote.get(timeout=0.1)
+
+
+def test_nothing_is_relayed_while_no_other_process_listens(connect, workers):
+    publisher, server = workers
+    publisher.publish(1, 'stats', {'present': 3})
+
+    conn = connect()
+    assert conn.execute('SELECT COUNT(*) FROM live_events').fetchone()[0] == 0
+    assert not publisher.has_subscribers(1)
+    assert publisher._relay_pid is None
+
+    # A stream in the other process registers its course on the next sync
+    remote = server.subscribe([1])
+    server._sync()
+    assert publisher.has_subscribers(1) and not publisher.has_subscribers(2)
+    assert not server.has_subscribers(2)
+
+    server.unsubscribe([1], remote)
+    server._sync()
+    assert not publisher.has_subscribers(1)
+    # A process that died without withdrawing stops counting after listener_ttl
+    with conn:
+        conn.execute("INSERT INTO live_listeners (source, channel, seen_at) VALUES ('gone', 1, 0)")
+    conn.close()
+    assert not publisher.has_subscribers(1)
+
+
+def test_close_hands_pending_events_to_the_log(connect, workers):
+    _, server = workers
+    server.subscribe([1])
+    server._sync()
+    broadcaster = LiveBroadcaster(relay=EventLog(connect), relay_interval=60.0)
+    broadcaster.publish(1, 'stats', {'present': 3})
+    broadcaster.publish(2, 'stats', {'present': 1})
+    broadcaster.close()
+
+    conn = connect()
+    assert conn.execute('SELECT channel FROM live_events').fetchall() == [(1,)]
+    server.close()
+    assert conn.execute('SELECT COUNT(*) FROM live_listeners').fetchone()[0] == 0
+    conn.close()
@@ -0,0 +1,142 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+from daily_stats import rebuild_daily_stats
+from migrations import LATEST_VERSION, MIGRATIONS, migrate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Generous next to the ~0.5 s it takes on a laptop; see benchmarks/cold_start.py
+COLD_START_LIMIT = 10.0
+
+
+def snapshot(conn):
+    """Schema and every row of every table, in rowid order"""
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+    schema = conn.execute('SELECT type, name, sql FROM sqlite_master ORDER BY type, name').fetchall()
+    return [tuple(row) for row in schema], {
+        table: [tuple(row) for row in conn.execute(f'SELECT * FROM "{table}" ORDER BY rowid')]
+        for table in tables
+    }
+
+
+def populate(conn):
+    with conn:
+        conn.execute("INSERT INTO users (username, password, role, name) VALUES ('prof', 'x', 'instructor', 'Prof')")
+        conn.executemany(
+            "INSERT INTO users (username, password, role, name, student_id) VALUES (?, 'x', 'student', ?, ?)",
+            [(f's{i}', f'Student {i}', f'S{i}') for i in range(1, 6)])
+        conn.execute("INSERT INTO courses (code, name, instructor_id) VALUES ('CS101', 'Intro', 1)")
+        conn.executemany('INSERT INTO enrollments (student_id, course_id) VALUES (?, 1)',
+                         [(i,) for i in range(2, 7)])
+        conn.executemany(
+            "INSERT INTO attendance (student_id, course_id, date, timestamp, status) VALUES (?, 1, ?, ?, 'present')",
+            [(i, f'2024-01-0{day}', f'2024-01-0{day} 09:00') for i in range(2, 6) for day in (1, 2)])
+
+
+def applied_versions(conn):
+    return [row[0] for row in conn.execute('SELECT version FROM schema_version ORDER BY version')]
+
+
+def test_second_migrate_keeps_every_row(conn):
+    populate(conn)
+    rebuild_daily_stats(conn)
+    conn.commit()
+    before = snapshot(conn)
+
+    assert migrate(conn) == []
+    assert snapshot(conn) == before
+    assert applied_versions(conn) == [version for version, _, _ in MIGRATIONS]
+
+
+def test_pending_migrations_apply_once_over_existing_data(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'attendance.db')
+    assert migrate(conn, target=3) == [1, 2, 3]
+    populate(conn)
+    rows = {table: snapshot(conn)[1][table] for table in ('users', 'courses', 'enrollments', 'attendance')}
+
+    assert migrate(conn) == list(range(4, LATEST_VERSION + 1))
+    after = snapshot(conn)
+    assert {table: after[1][table] for table in rows} == rows
+    # The summary migration filled course_daily_stats from the existing attendance
+    assert conn.execute('SELECT date, present_count FROM course_daily_stats ORDER BY date').fetchall() == [
+        ('2024-01-01', 4), ('2024-01-02', 4)]
+
+    assert migrate(conn) == []
+    assert snapshot(conn) == after
+    assert applied_versions(conn) == list(range(1, LATEST_VERSION + 1))
+    conn.close()
+
+
+def test_startup_leaves_data_untouched(app_module, tmp_path):
+    app_module.bootstrap()
+    assert app_module.seed_demo_data()
+    app_module.db_pool.close_all()
+    conn = sqlite3.connect(tmp_path / 'attendance.db')
+    before = snapshot(conn)
+
+    app_module.bootstrap()
+    assert not app_module.seed_demo_data()
+    app_module.db_pool.close_all()
+    assert snapshot(conn) == before
+    conn.close()
+
+
+def test_bootstrap_on_a_migrated_database_applies_and_writes_nothing(app_module, tmp_path, monkeypatch):
+    app_module.bootstrap()
+    app_module.seed_demo_data()
+    app_module.db_pool.close_all()
+    applied = []
+
+    def recording_migrate(conn, target=LATEST_VERSION):
+        applied.extend(migrate(conn, target))
+        return applied
+
+    monkeypatch.setattr(app_module, 'migrate', recording_migrate)
+    conn = sqlite3.connect(tmp_path / 'attendance.db')
+    before = snapshot(conn)
+    # data_version moves whenever another connection commits, even an identical row
+    version = conn.execute('PRAGMA data_version').fetchone()[0]
+
+    app_module.bootstrap()
+    assert applied == []
+    assert conn.execute('PRAGMA data_version').fetchone()[0] == version
+    assert snapshot(conn) == before
+    conn.close()
+
+
+COLD_START_SNIPPET = '''
+import json, time
+started = time.perf_counter()
+import main
+applied = []
+migrate = main.migrate
+main.migrate = lambda conn, **kwargs: applied.extend(migrate(conn, **kwargs)) or applied
+main.bootstrap()
+print(json.dumps({'seconds': time.perf_counter() - started, 'applied': applied}))
+'''
+
+
+def test_cold_start_against_a_migrated_database(conn, tmp_path):
+    """A fresh interpreter imports and bootstraps the app quickly, without migrating or writing"""
+    populate(conn)
+    with conn:
+        rebuild_daily_stats(conn)
+    # As the app left it: switching to WAL is itself a write, made once
+    conn.execute('PRAGMA journal_mode = WAL')
+    before = snapshot(conn)
+    version = conn.execute('PRAGMA data_version').fetchone()[0]
+    env = dict(os.environ, ATTENDANCE_DB=str(tmp_path / 'attendance.db'),
+               FACE_INDEX_PATH=str(tmp_path / 'face_index'), PROFILE_DIR=str(tmp_path / 'profiles'))
+
+    result = subprocess.run([sys.executable, '-c', COLD_START_SNIPPET], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=60, check=True)
+    started = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert started['applied'] == []
+    assert started['seconds'] < COLD_START_LIMIT
+    assert conn.execute('PRAGMA data_version').fetchone()[0] == version
+    assert snapshot(conn) == before
@@ -0,0 +1,93 @@
+import sqlite3
+
+import pytest
+
+from daily_stats import rebuild_daily_stats
+from pagination import MAX_PAGE_SIZE, clamp_page_size, decode_cursor, encode_cursor, fetch_page
+
+
+def all_pages(client, url):
+    pages, cursor = [], None
+    while True:
+        response = client.get(url + (f'&cursor={cursor}' if cursor else ''))
+        assert response.status_code == 200
+        body = response.get_json()
+        pages.append(body)
+        cursor = body['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_instructor_students_pages_cover_the_roster_once(instructor_client):
+    pages = all_pages(instructor_client, '/api/students?limit=2')
+
+    students = [student for page in pages for student in page['students']]
+    assert [len(page['students']) for page in pages] == [2, 2, 1]
+    assert [student['name'] for student in students] == sorted(student['name'] for student in students)
+    assert len({student['id'] for student in students}) == 5
+    # Students 2-5 take both demo courses, student 6 only CAP5178
+    assert {student['id']: student['course_count'] for student in students} == {2: 2, 3: 2, 4: 2, 5: 2, 6: 1}
+    assert pages[0]['totals'] == {'total': 5, 'single_course': 1, 'multiple_courses': 4}
+
+
+def test_cursor_round_trip():
+    for key in [('2024-03-04', 17), ('Zoë Ångström', 3), (None, -1), (1.5,)]:
+        token = encode_cursor(key)
+        assert '=' not in token and '/' not in token and '+' not in token
+        assert decode_cursor(token, len(key)) == key
+    assert decode_cursor('', 2) is None
+    assert decode_cursor(None, 2) is None
+
+
+@pytest.mark.parametrize('token', ['not base64!', encode_cursor(['a']), 'e30', '_w'])
+def test_foreign_cursors_are_rejected(token):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor(token, 2)
+
+
+def test_page_size_is_clamped():
+    assert clamp_page_size(None) == 30
+    assert clamp_page_size('abc', default=5) == 5
+    assert clamp_page_size('0') == 1
+    assert clamp_page_size(10 ** 6) == MAX_PAGE_SIZE
+
+
+def test_fetch_page_walks_ties_in_the_first_key_once():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE visits (id INTEGER PRIMARY KEY, date TEXT)')
+    conn.executemany('INSERT INTO visits (date) VALUES (?)', [('2024-03-0%d' % (i % 3 + 1),) for i in range(10)])
+    sql = 'SELECT date, id FROM visits WHERE (date, id) > (?, ?) ORDER BY date, id LIMIT ?'
+
+    seen, cursor = [], ('', 0)
+    while cursor is not None:
+        rows, token = fetch_page(conn, sql, cursor, 3, key=lambda row: row)
+        seen.extend(rows)
+        cursor = decode_cursor(token, 2)
+    assert seen == sorted(conn.execute('SELECT date, id FROM visits').fetchall())
+    assert len(seen) == 10
+
+
+def test_route_rejects_a_tampered_cursor(instructor_client):
+    response = instructor_client.get('/api/students?cursor=' + encode_cursor(['Alice']))
+    assert response.status_code == 400
+
+
+def test_student_rate_counts_the_sessions_they_missed(app_module, instructor_client):
+    conn = app_module.get_db_connection()
+    with conn:
+        # Eva (student 6) attends three of CAP5178's five sessions
+        conn.execute('DELETE FROM attendance WHERE course_id = 1')
+        conn.executemany(
+            "INSERT INTO attendance (student_id, course_id, date, timestamp, status) VALUES (?, 1, ?, '09:00', 'present')",
+            [(2, f'2024-03-0{day}') for day in range(4, 9)] + [(6, f'2024-03-0{day}') for day in (4, 6, 8)])
+        rebuild_daily_stats(conn)
+    conn.close()
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['role'] = 'student'
+        session['user_id'] = 6
+
+    pages = all_pages(client, '/api/student/attendance/1?limit=2')
+
+    assert pages[0]['totals'] == {'total_classes': 5, 'present_classes': 3, 'attendance_rate': 60.0}
+    assert sum(len(page['attendance']) for page in pages) == 3
@@ -0,0 +1,46 @@
+import os
+
+
+def test_profiler_settings_reach_workers_that_did_not_handle_the_put(app_module, instructor_client):
+    app_module.app.config['PROFILE_SLOW_REQUESTS'] = True
+    profiler = app_module.profiler
+    response = instructor_client.put('/api/profiler', json={'enabled': True, 'threshold_ms': 250})
+
+    assert response.status_code == 200
+    assert response.get_json()['pid'] == os.getpid()
+    assert response.get_json()['enabled'] is True and response.get_json()['threshold_ms'] == 250.0
+
+    # Another worker: its own profiler state and an empty cache
+    profiler.enabled, profiler.threshold = False, 0.5
+    app_module.stats_cache.clear()
+    body = instructor_client.get('/api/profiler').get_json()
+    assert body['enabled'] is True and body['threshold_ms'] == 250.0
+
+    # A partial update keeps the saved threshold
+    body = instructor_client.put('/api/profiler', json={'enabled': False}).get_json()
+    assert body['enabled'] is False and body['threshold_ms'] == 250.0
+    profiler.enabled = True
+    app_module.stats_cache.clear()
+    assert instructor_client.get('/api/profiler').get_json()['enabled'] is False
+
+
+def test_saved_settings_do_nothing_while_the_deployment_has_profiling_off(app_module, instructor_client,
+                                                                         monkeypatch):
+    app_module.app.config['PROFILE_SLOW_REQUESTS'] = True
+    assert instructor_client.put('/api/profiler', json={'enabled': True}).status_code == 200
+    app_module.app.config['PROFILE_SLOW_REQUESTS'] = False
+    app_module.profiler.enabled = False
+    lookups = []
+    monkeypatch.setattr(app_module, 'get_profiler_settings', lambda: lookups.append(1))
+
+    # No settings lookup per request, and the saved row does not turn profiling on
+    body = instructor_client.get('/api/profiler').get_json()
+    assert body['enabled'] is False and lookups == []
+    assert instructor_client.put('/api/profiler', json={'enabled': True}).status_code == 409
+    assert app_module.profiler.enabled is False
+
+
+def test_invalid_threshold_is_rejected(app_module, instructor_client):
+    app_module.app.config['PROFILE_SLOW_REQUESTS'] = True
+    assert instructor_client.put('/api/profiler', json={'threshold_ms': -1}).status_code == 400
+    assert instructor_client.put('/api/profiler', json={'threshold_ms': 'fast'}).status_code == 400
@@ -0,0 +1,30 @@
+import pytest
+
+import queries as q
+from query_plans import HOT_QUERIES, explain, find_table_scans
+
+# The keyset pages in HOT_QUERIES carry a cursor; the first page has none
+FIRST_PAGES = {
+    'attendance_history.first_page': (q.ATTENDANCE_HISTORY_SQL.format(before=''), (1, 31)),
+    'student_attendance.first_page': (q.STUDENT_ATTENDANCE_SQL.format(before=''), (2, 1, 31)),
+    'instructor_students.first_page': (q.INSTRUCTOR_STUDENTS_SQL.format(after=''), (1, 31)),
+}
+
+
+@pytest.mark.parametrize('name', sorted({**HOT_QUERIES, **FIRST_PAGES}))
+def test_hot_query_uses_indexes(conn, name):
+    sql, params = {**HOT_QUERIES, **FIRST_PAGES}[name]
+    assert find_table_scans(conn, {name: (sql, params)}) == [], explain(conn, sql, params)
+
+
+def test_table_scans_are_reported(conn):
+    scans = find_table_scans(conn, {'unindexed': ('SELECT * FROM users WHERE phone = ?', ('1',))})
+    assert scans == [('unindexed', 'SCAN users')]
+
+
+def test_instructor_students_start_from_the_instructors_courses(conn):
+    for after, params in (('', (1, 31)), (q.INSTRUCTOR_STUDENTS_CURSOR, (1, 'Alice Chen', 2, 31))):
+        steps = [step for step in explain(conn, q.INSTRUCTOR_STUDENTS_SQL.format(after=after), params)
+                 if step.startswith(('SEARCH', 'SCAN'))]
+        assert steps[0].startswith('SEARCH c '), steps
+        assert not any(step.startswith(('SEARCH u ', 'SCAN u')) for step in steps[:-1]), steps
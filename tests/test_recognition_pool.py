@@ -0,0 +1,117 @@
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+from recognition_pool import RecognitionJob, RecognitionPool
+
+
+class FakeExecutor:
+    """Runs nothing; finishes every job at once with no matches, or fails like a broken pool.
+
+    ``broken`` pools refuse the job outright; ``dying`` ones accept it and
+    then lose the worker running it.
+    """
+
+    def __init__(self, broken=False, dying=False):
+        self.broken = broken
+        self.dying = dying
+        self.shut_down = False
+
+    def submit(self, function, *args):
+        if self.broken:
+            raise BrokenProcessPool('A child process terminated abruptly')
+        future = Future()
+        if self.dying:
+            future.set_exception(BrokenProcessPool('A child process terminated abruptly'))
+        else:
+            future.set_result([])
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+def wait_for(job, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while job.status in ('queued', 'running') and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job.status
+
+
+def make_pool(executors, **options):
+    pool = RecognitionPool('unused', 'unused', **options)
+    pool._new_executor = lambda: executors.pop(0)
+    return pool
+
+
+def test_broken_pool_fails_the_job_and_is_replaced():
+    broken, fresh = FakeExecutor(broken=True), FakeExecutor()
+    pool = make_pool([broken, fresh], workers=1)
+
+    failed = pool.submit('cam-1', 1, b'frame')
+    assert wait_for(failed) == 'failed'
+    assert 'terminated' in failed.error
+    assert broken.shut_down
+
+    completed = pool.submit('cam-1', 1, b'frame')
+    assert wait_for(completed) == 'completed'
+    stats = pool.stats()
+    assert (stats['in_flight'], stats['failed'], stats['completed']) == (0, 1, 1)
+    pool.shutdown()
+
+
+def test_worker_dying_mid_job_replaces_the_pool_at_once():
+    dying, fresh = FakeExecutor(dying=True), FakeExecutor()
+    pool = make_pool([dying, fresh], workers=1)
+
+    failed = pool.submit('cam-1', 1, b'frame')
+    assert wait_for(failed) == 'failed'
+    assert 'terminated' in failed.error
+    # Replaced as the job failed, not when the next frame hits the dead pool
+    assert dying.shut_down and pool._executor is fresh
+
+    assert wait_for(pool.submit('cam-1', 1, b'frame')) == 'completed'
+    assert pool.stats()['failed'] == 1
+    pool.shutdown()
+
+
+def test_jobs_are_only_visible_to_their_owner():
+    pool = make_pool([FakeExecutor()])
+    job = pool.submit('cam-1', 1, b'frame', owner_id=1)
+
+    assert pool.get(job.id, 1) is job
+    assert pool.get(job.id, 2) is None
+    assert pool.get('nope', 1) is None
+    pool.shutdown()
+
+
+def test_recognition_job_route_hides_other_users_jobs(app_module, instructor_client):
+    job = RecognitionJob('cam-1', 1, b'frame', None, owner_id=7)
+    with app_module.recognition_pool._cond:
+        app_module.recognition_pool._remember(job)
+
+    assert instructor_client.get(f'/api/recognition-jobs/{job.id}').status_code == 404
+    job.owner_id = 1
+    assert instructor_client.get(f'/api/recognition-jobs/{job.id}').get_json()['job_id'] == job.id
+
+
+def test_shutdown_joins_the_dispatcher():
+    executor = FakeExecutor()
+    pool = make_pool([executor])
+    assert wait_for(pool.submit('cam-1', 1, b'frame')) == 'completed'
+    dispatcher = pool._dispatcher
+
+    pool.shutdown()
+    assert not dispatcher.is_alive()
+    assert executor.shut_down
+
+
+def test_frames_without_camera_do_not_replace_each_other():
+    pool = make_pool([FakeExecutor()], workers=1)
+    with pool._cond:
+        # Hold the dispatcher back so both frames are still pending
+        first = pool.submit(None, 1, b'a')
+        second = pool.submit(None, 1, b'b')
+        assert pool.stats()['pending'] == 2
+    assert wait_for(first) == wait_for(second) == 'completed'
+    pool.shutdown()
@@ -0,0 +1,37 @@
+import base64
+
+import cv2
+import numpy as np
+
+
+def jpeg(seed=0):
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(60, 200, (120, 160, 3), dtype=np.uint8)
+    return cv2.imencode('.jpg', frame)[1].tobytes()
+
+
+def test_recognize_face_without_camera_id_skips_gate_and_tracker(app_module, instructor_client):
+    image = 'data:image/jpeg;base64,' + base64.b64encode(jpeg()).decode('ascii')
+    response = instructor_client.post('/api/recognize-face', json={'image': image, 'course_id': 1})
+
+    assert response.status_code == 200
+    assert response.get_json() == {'recognized_faces': []}
+    assert app_module.frame_gate.stats()['checked'] == 0
+    assert app_module.face_system.trackers.stats()['cameras'] == 0
+
+
+def test_recognize_frame_with_camera_id_is_gated_and_tracked(app_module, instructor_client):
+    response = instructor_client.post('/api/recognize-frame?course_id=1&camera_id=room-1', data=jpeg(),
+                                      content_type='image/jpeg')
+
+    assert response.status_code == 200
+    assert app_module.frame_gate.stats()['checked'] == 1
+    assert app_module.face_system.trackers.stats()['cameras'] == 1
+
+
+def test_recognize_frame_without_camera_id(app_module, instructor_client):
+    response = instructor_client.post('/api/recognize-frame?course_id=1', data=jpeg(),
+                                      content_type='image/jpeg')
+
+    assert response.status_code == 200
+    assert app_module.face_system.trackers.stats()['cameras'] == 0
@@ -0,0 +1,84 @@
+import io
+
+import numpy as np
+
+from daily_stats import rebuild_daily_stats
+from reports import REPORT_FORMAT, AttendanceReport, build_attendance_report
+
+DAYS = ['2024-03-04', '2024-03-05', '2024-03-06', '2024-03-07']
+
+
+def populate(conn):
+    """CS101 (course 1) with three students over four sessions, CS102 with one student and one session"""
+    with conn:
+        conn.execute("INSERT INTO users (username, password, role, name) VALUES ('prof', 'x', 'instructor', 'Prof')")
+        conn.executemany(
+            "INSERT INTO users (username, password, role, name, student_id) VALUES (?, 'x', 'student', ?, ?)",
+            [('ann', 'Ann', 'S1'), ('ben', 'Ben', None), ('cat', 'Cat', 'S3')])
+        conn.executemany("INSERT INTO courses (code, name, instructor_id) VALUES (?, ?, 1)",
+                         [('CS101', 'Intro'), ('CS102', 'Data')])
+        conn.executemany('INSERT INTO enrollments (student_id, course_id) VALUES (?, ?)',
+                         [(2, 1), (3, 1), (4, 1), (2, 2)])
+        present = [(2, 1, day) for day in DAYS] + [(3, 1, DAYS[0])] + \
+            [(4, 1, day) for day in (DAYS[0], DAYS[1], DAYS[3])] + [(2, 2, DAYS[0])]
+        conn.executemany(
+            "INSERT INTO attendance (student_id, course_id, date, timestamp, status) VALUES (?, ?, ?, '09:00', 'present')",
+            present)
+        rebuild_daily_stats(conn)
+
+
+def test_report_columns_survive_an_npz_round_trip(conn):
+    populate(conn)
+    buffer = io.BytesIO()
+    build_attendance_report(conn, 1).save(buffer)
+    buffer.seek(0)
+
+    # Plain typed arrays only: the file loads without pickle
+    with np.load(buffer, allow_pickle=False) as data:
+        assert sorted(data.files) == sorted(
+            [f'course.{name}' for name in ('course_id', 'code', 'name', 'enrolled', 'sessions',
+                                           'attendance_rate', 'at_risk')]
+            + [f'student.{name}' for name in ('course_id', 'student_id', 'student_number', 'name', 'sessions',
+                                              'present', 'attendance_rate', 'current_streak', 'longest_streak',
+                                              'absence_streak', 'at_risk')]
+            + [f'meta.{name}' for name in ('format', 'instructor_id', 'start', 'end', 'risk_rate',
+                                           'risk_absences', 'min_sessions')])
+        assert all(data[key].dtype != object for key in data.files)
+    buffer.seek(0)
+    report = AttendanceReport.load(buffer)
+
+    assert report.meta['format'] == REPORT_FORMAT and report.meta['instructor_id'] == 1
+    assert report.course_rows() == [
+        {'course_id': 1, 'code': 'CS101', 'name': 'Intro', 'enrolled': 3, 'sessions': 4,
+         'attendance_rate': 66.7, 'at_risk': 1},
+        {'course_id': 2, 'code': 'CS102', 'name': 'Data', 'enrolled': 1, 'sessions': 1,
+         'attendance_rate': 100.0, 'at_risk': 0},
+    ]
+    columns = ('course_id', 'student_id', 'student_number', 'present', 'attendance_rate',
+               'current_streak', 'longest_streak', 'absence_streak', 'at_risk')
+    assert [tuple(row[name] for name in columns) for row in report.student_rows()] == [
+        (1, 2, 'S1', 4, 100.0, 4, 4, 0, False),
+        (1, 3, '', 1, 25.0, 0, 1, 3, True),
+        (1, 4, 'S3', 3, 75.0, 1, 2, 0, False),
+        (2, 2, 'S1', 1, 100.0, 1, 1, 0, False),
+    ]
+    assert [row['student_id'] for row in report.student_rows(at_risk_only=True)] == [3]
+
+
+def test_date_range_limits_sessions_and_marks(conn):
+    populate(conn)
+    report = build_attendance_report(conn, 1, start=DAYS[1], end=DAYS[2])
+
+    assert report.courses['sessions'].tolist() == [2, 0]
+    assert report.students['present'].tolist() == [2, 0, 1, 0]
+    assert report.meta['start'] == DAYS[1]
+
+
+def test_report_export_route_returns_a_loadable_npz(instructor_client):
+    response = instructor_client.get('/api/reports/export')
+
+    assert response.status_code == 200
+    report = AttendanceReport.load(io.BytesIO(response.get_data()))
+    assert report.courses['code'].tolist() == ['CAP5178', 'CIS4930']
+    assert report.courses['enrolled'].tolist() == [5, 4]
+    assert len(report.students['student_id']) == 9
@@ -0,0 +1,77 @@
+from tracker import FaceTracker, TrackerRegistry
+
+
+def match(user_id, score=0.9):
+    return {'user_id': user_id, 'score': score, 'eyes_detected': True}
+
+
+def step(tracker, boxes, matches):
+    """One frame: associate, embed the tracks that need it, return the matches served"""
+    tracks = tracker.associate(boxes)
+    embedded = 0
+    for track in tracks:
+        if tracker.needs_embedding(track):
+            tracker.observe(track, matches[track.box])
+            embedded += 1
+    return [track.as_match() for track in tracks], embedded
+
+
+def test_confirmed_identity_carries_over_moving_boxes():
+    tracker = FaceTracker(confirm_hits=2, reverify_frames=3)
+    box = (100, 100, 50, 50)
+
+    served, embedded = step(tracker, [box], {box: match(7)})
+    assert embedded == 1 and served[0]['user_id'] == 7
+    track_id = served[0]['track_id']
+    served, embedded = step(tracker, [box], {box: match(7)})
+    assert embedded == 1
+
+    # Confirmed: small moves keep the track and its identity without embedding
+    for dx in (4, 8):
+        moved = (100 + dx, 100, 50, 50)
+        served, embedded = step(tracker, [moved], {})
+        assert embedded == 0
+        assert served[0]['user_id'] == 7 and served[0]['track_id'] == track_id
+        assert served[0]['location'] == moved
+
+    # Every reverify_frames frames the identity is checked again
+    moved = (112, 100, 50, 50)
+    served, embedded = step(tracker, [moved], {moved: match(7)})
+    assert embedded == 1 and served[0]['track_id'] == track_id
+
+
+def test_a_different_match_unconfirms_the_track():
+    tracker = FaceTracker(confirm_hits=2, reverify_frames=1)
+    box = (0, 0, 40, 40)
+    for _ in range(2):
+        step(tracker, [box], {box: match(7)})
+    served, _ = step(tracker, [box], {box: match(9)})
+
+    assert served[0]['user_id'] == 9
+    assert tracker.needs_embedding(tracker.tracks[0])
+    served, _ = step(tracker, [box], {box: match(None, 0.0)})
+    assert served[0]['user_id'] is None and tracker.tracks[0].hits == 0
+
+
+def test_far_boxes_start_new_tracks_and_lost_tracks_expire():
+    tracker = FaceTracker(confirm_hits=1, max_missed=1)
+    first, far = (0, 0, 40, 40), (300, 300, 40, 40)
+    served, _ = step(tracker, [first], {first: match(7)})
+    old_id = served[0]['track_id']
+
+    served, embedded = step(tracker, [far], {far: match(8)})
+    assert embedded == 1 and served[0]['track_id'] != old_id
+    assert len(tracker.tracks) == 2
+    step(tracker, [far], {})
+    assert [track.user_id for track in tracker.tracks] == [8]
+
+
+def test_registry_keeps_one_tracker_per_camera():
+    registry = TrackerRegistry(max_idle=60.0, confirm_hits=3)
+    assert registry.get('door') is registry.get('door')
+    assert registry.get('door') is not registry.get('back')
+    assert registry.get('door').confirm_hits == 3
+
+    registry.max_idle = -1.0
+    registry.get('door')
+    assert registry.stats()['cameras'] == 1
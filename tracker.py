@@ -0,0 +1,161 @@
+"""Per-camera face tracks that carry identities across frames.
+
+Detections in a new frame are associated with the camera's live tracks by
+box overlap (IoU). A track whose identity has been seen on
+``confirm_hits`` consecutive embeddings is confirmed: it reuses that
+identity and is only re-embedded every ``reverify_frames`` frames, so a
+seated student costs one detection per frame instead of a full embed and
+match. New and unconfirmed tracks are returned for embedding as before.
+"""
+
+import itertools
+import threading
+import time
+
+import numpy as np
+
+
+def iou_matrix(a, b):
+    """IoU between every (x, y, w, h) box in a and every box in b"""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    iw = np.clip(np.minimum(ax2[:, None], bx2) - np.maximum(a[:, None, 0], b[:, 0]), 0, None)
+    ih = np.clip(np.minimum(ay2[:, None], by2) - np.maximum(a[:, None, 1], b[:, 1]), 0, None)
+    inter = iw * ih
+    union = (a[:, 2] * a[:, 3])[:, None] + b[:, 2] * b[:, 3] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+class Track:
+    _ids = itertools.count(1)
+
+    def __init__(self, box):
+        self.id = next(self._ids)
+        self.box = box
+        self.user_id = None
+        self.score = 0.0
+        self.eyes_detected = False
+        self.hits = 0
+        self.missed = 0
+        self.since_check = 0
+        self.confirmed = False
+
+    def observe(self, match):
+        """Fold in a fresh embedding result for this track"""
+        if match['user_id'] is not None and match['user_id'] == self.user_id:
+            self.hits += 1
+        else:
+            self.hits = 1 if match['user_id'] is not None else 0
+            self.confirmed = False
+        self.user_id = match['user_id']
+        self.score = match['score']
+        self.eyes_detected = match['eyes_detected']
+        self.since_check = 0
+
+    def as_match(self):
+        return {
+            'location': tuple(int(v) for v in self.box),
+            'user_id': self.user_id,
+            'score': self.score,
+            'eyes_detected': self.eyes_detected,
+            'track_id': self.id,
+        }
+
+
+class FaceTracker:
+    """IoU tracker for one camera"""
+
+    def __init__(self, iou_threshold=0.3, confirm_hits=2, max_missed=3, reverify_frames=20):
+        self.iou_threshold = iou_threshold
+        self.confirm_hits = confirm_hits
+        self.max_missed = max_missed
+        self.reverify_frames = reverify_frames
+        self.tracks = []
+        self.last_seen = time.monotonic()
+        # Frames from one camera are associated one at a time
+        self.lock = threading.Lock()
+
+    def associate(self, boxes):
+        """Match boxes to live tracks, returning one Track per box"""
+        self.last_seen = time.monotonic()
+        assigned = [None] * len(boxes)
+        matched = set()
+        if len(boxes) and self.tracks:
+            overlap = iou_matrix([t.box for t in self.tracks], boxes)
+            # Greedy: best-overlapping pairs first, each side used once
+            for flat in np.argsort(overlap, axis=None)[::-1]:
+                t, b = divmod(int(flat), overlap.shape[1])
+                if overlap[t, b] < self.iou_threshold:
+                    break
+                if assigned[b] is None and t not in matched:
+                    assigned[b] = self.tracks[t]
+                    matched.add(t)
+
+        survivors = []
+        for t, track in enumerate(self.tracks):
+            if t in matched:
+                track.missed = 0
+            else:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    continue
+            survivors.append(track)
+        for b, box in enumerate(boxes):
+            if assigned[b] is None:
+                assigned[b] = Track(box)
+                survivors.append(assigned[b])
+            else:
+                assigned[b].box = box
+                assigned[b].since_check += 1
+        self.tracks = survivors
+        return assigned
+
+    def needs_embedding(self, track):
+        return not track.confirmed or track.since_check >= self.reverify_frames
+
+    def observe(self, track, match):
+        track.observe(match)
+        if track.user_id is not None and track.hits >= self.confirm_hits:
+            track.confirmed = True
+
+
+class TrackerRegistry:
+    """Trackers keyed by camera id; cameras idle for ``max_idle`` seconds are dropped"""
+
+    def __init__(self, max_idle=300.0, **tracker_options):
+        self.max_idle = max_idle
+        self.tracker_options = tracker_options
+        self._trackers = {}
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.faces = 0
+        self.embedded = 0
+
+    def get(self, camera_id):
+        now = time.monotonic()
+        with self._lock:
+            for key in [k for k, t in self._trackers.items() if now - t.last_seen > self.max_idle]:
+                del self._trackers[key]
+            tracker = self._trackers.get(camera_id)
+            if tracker is None:
+                tracker = self._trackers[camera_id] = FaceTracker(**self.tracker_options)
+            return tracker
+
+    def count(self, faces, embedded):
+        with self._lock:
+            self.frames += 1
+            self.faces += faces
+            self.embedded += embedded
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cameras': len(self._trackers),
+                'tracks': sum(len(t.tracks) for t in self._trackers.values()),
+                'frames': self.frames,
+                'faces': self.faces,
+                'embedded': self.embedded,
+                'reused': self.faces - self.embedded,
+            }
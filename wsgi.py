@@ -0,0 +1,17 @@
+"""WSGI entry point for production serving.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing this module migrates the schema and loads the face model, ANN
+index and gallery. Under gunicorn's preload_app that happens once in the
+master and every forked worker shares the result copy-on-write; each
+worker then starts its own check-in flush thread in the post_fork hook.
+Servers without such a hook must call main.start_background_work() once
+in every worker process.
+"""
+
+from main import app, bootstrap
+
+__all__ = ['app']
+
+bootstrap()